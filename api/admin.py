@@ -4,4 +4,9 @@ from .models import *
 admin.site.register(Clinic)
 admin.site.register(ClinicSpreadsheet)
 admin.site.register(SiteSettings)
-admin.site.register(PayrollRecords)
\ No newline at end of file
+admin.site.register(PayrollRecords)
+admin.site.register(PendingSheetWrite)
+admin.site.register(PayrollDraft)
+admin.site.register(PayrollLedgerEntry)
+admin.site.register(PayrollYearToDate)
+admin.site.register(SheetRegistry)
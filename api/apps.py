@@ -1,6 +1,17 @@
+import os
+import sys
 from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # In write-behind mode every server process runs the flusher from the start (not management commands,
+        # except runserver), see services/write_behind.py
+        from django.conf import settings
+        is_management_command = os.path.basename(sys.argv[0]) == 'manage.py' if sys.argv else False
+        if settings.SHEET_WRITE_BEHIND and (not is_management_command or 'runserver' in sys.argv):
+            from .services.write_behind import start_flusher
+            start_flusher()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from api.services.write_behind import flush_pending_sheet_writes
+
+#PUSHES UPLOADS WAITING IN WRITE-BEHIND MODE TO GOOGLE NOW, FOR CRON OR BEFORE A DEPLOY
+class Command(BaseCommand):
+    help = "Flush pending write-behind uploads to their Google sheets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sheet', help="Only flush this sheet id")
+
+    def handle(self, *args, **options):
+        flushed = flush_pending_sheet_writes(options.get('sheet'))
+        for sheet_id, uploads in flushed.items():
+            self.stdout.write(f"{sheet_id}: {uploads} uploads written")
+        self.stdout.write(self.style.SUCCESS(f"Flushed {len(flushed)} sheets"))
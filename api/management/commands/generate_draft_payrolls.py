@@ -0,0 +1,90 @@
+import json
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from registration.models import UserProfile
+from api.models import ClinicSpreadsheet, SiteSettings, PayrollDraft
+from api.renderers import ORJSONRenderer
+from api.payroll_generation.payroll_views import PayrollViewSet
+from api.payroll_generation.pay_periods import DEFAULT_FREQUENCY, last_completed_period
+from api.payroll_generation.preview_cache import source_sheet_versions
+from api.services.google_quota import GoogleSheetsUnavailable
+
+#PRECOMPUTES DRAFT PAYROLLS OVERNIGHT (CRON) FOR EVERY CLINIC AND EVERY USER WITH A PAYMENT ROLE, FOR THE LAST PAY PERIOD
+#OF THEIR PAYMENT FREQUENCY THAT HAS ENDED. staff opening that payroll then get the draft instead of a live calculation.
+#users sharing a period share one viewset, so each clinic's sheets are read once per period and not once per user.
+#drafts are calculated without writing any PayrollRecords: the revenue share targets' base records a live preview
+#saves are only calculated. a user only gets a draft at a clinic where they have hours or invoices in the period
+class Command(BaseCommand):
+    help = "Calculate draft payrolls for the last completed pay period of every user, for every clinic"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Run as of this day (YYYY-MM-DD) instead of today")
+        parser.add_argument('--clinic', type=int, help="Only this clinic id")
+
+    def handle(self, *args, **options):
+        today = date.fromisoformat(options['date']) if options.get('date') else timezone.localdate()
+        site_settings = SiteSettings.objects.first()
+        if not site_settings:
+            raise CommandError("Site settings not configured.")
+
+        clinic_spreadsheets = ClinicSpreadsheet.objects.select_related('clinic')
+        if options.get('clinic'):
+            clinic_spreadsheets = clinic_spreadsheets.filter(clinic_id=options['clinic'])
+
+        # Group users by the pay period their frequency ends on
+        periods = {}
+        for user_profile in UserProfile.objects.select_related('user'):
+            payment_detail = getattr(user_profile, 'payment_detail', None)
+            if payment_detail:
+                period = last_completed_period(payment_detail.payment_frequency or DEFAULT_FREQUENCY, today)
+                periods.setdefault(period, []).append((user_profile, payment_detail))
+
+        drafted = skipped = failed = 0
+        for clinic_spreadsheet in clinic_spreadsheets:
+            clinic = clinic_spreadsheet.clinic
+            try:
+                sheet_versions = source_sheet_versions(clinic_spreadsheet)
+            except GoogleSheetsUnavailable as e:
+                self.stderr.write(f"{clinic}: Google Sheets unavailable, skipped: {e}")
+                continue
+
+            for (start_date, end_date), members in sorted(periods.items()):
+                viewset = PayrollViewSet()  # one per clinic and period, so the sheet reads are shared
+                viewset.writes_payroll_records = False  # a draft never creates or changes payroll records
+                try:
+                    staff_names = viewset._clinic_staff_names(clinic_spreadsheet, start_date, end_date)
+                except Exception as e:
+                    self.stderr.write(f"{clinic}: could not read who worked {start_date} to {end_date}, skipped: {e}")
+                    continue
+
+                for user_profile, payment_detail in members:
+                    user = user_profile.user
+                    if f"{user.first_name} {user.last_name}".strip().lower() not in staff_names:
+                        skipped += 1  # rent or revenue sharing alone would draft them at clinics they don't work at
+                        continue
+                    try:
+                        payroll_data, cache_key = viewset._cached_payroll_preview(
+                            user, user_profile, payment_detail, clinic, clinic_spreadsheet, start_date, end_date,
+                            site_settings, sheet_versions)
+                    except ValueError as e:
+                        skipped += 1  # nothing to pay for this period
+                        self.stdout.write(f"No draft for {user.username} at {clinic}: {e}")
+                        continue
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Draft for {user.username} at {clinic} failed: {e}")
+                        continue
+
+                    PayrollDraft.objects.update_or_create(
+                        user=user, clinic=clinic, period_start=start_date, period_end=end_date,
+                        defaults={
+                            # the same json the api answers with (Decimals as numbers)
+                            'payroll_data': json.loads(ORJSONRenderer().render(payroll_data)),
+                            'source_key': cache_key or '',
+                        }
+                    )
+                    drafted += 1
+                    self.stdout.write(f"{clinic}: drafted {user.username} for {start_date} to {end_date}")
+
+        self.stdout.write(self.style.SUCCESS(f"{drafted} drafts, {skipped} with nothing to pay, {failed} failed"))
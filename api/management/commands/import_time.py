@@ -0,0 +1,60 @@
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+#MEASURES HOW LONG A FRESH PYTHON PROCESS TAKES TO SET UP DJANGO AND IMPORT THE URL CONF, LIKE A WORKER BOOT
+#each run is a new interpreter with python -X importtime, so nothing is already imported
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'googleapiclient.discovery', 'google.oauth2.service_account', 'httplib2']
+
+
+class Command(BaseCommand):
+    help = "Benchmark worker startup: import time of django.setup() plus the url conf, with the slowest imports"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.ROOT_URLCONF, help="Module to import after django.setup()")
+        parser.add_argument('--runs', type=int, default=5, help="Number of fresh processes to time")
+        parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to list")
+
+    def _run_once(self, module):
+        script = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import django\n"
+            "django.setup()\n"
+            f"import {module}\n"
+            "print(time.perf_counter() - start)\n"
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules) or 'none')\n"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'clinic_help_desk.settings')}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+        seconds, heavy = result.stdout.strip().splitlines()[-2:]
+        # importtime lines look like "import time:  self [us] | cumulative | module"
+        imports = []
+        for line in result.stderr.splitlines():
+            parts = line.split('|')
+            if line.startswith('import time:') and len(parts) == 3 and parts[1].strip().isdigit():
+                imports.append((int(parts[1]), parts[2].rstrip()))
+        return float(seconds), heavy, imports
+
+    def handle(self, *args, **options):
+        timings = []
+        for _ in range(max(options['runs'], 1)):
+            seconds, heavy, imports = self._run_once(options['module'])
+            timings.append(seconds)
+
+        self.stdout.write("Slowest imports (cumulative) of the last run:")
+        for cumulative_us, name in sorted(imports, reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms {name}")
+
+        self.stdout.write(f"Heavy modules loaded at startup: {heavy}")
+        self.stdout.write(self.style.SUCCESS(
+            f"django.setup() + import {options['module']}: median {statistics.median(timings):.3f}s, "
+            f"min {min(timings):.3f}s over {len(timings)} runs"
+        ))
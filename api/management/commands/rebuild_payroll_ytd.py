@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.payroll_generation.ledger import rebuild_year_to_date
+
+#RECOMPUTES THE YEAR TO DATE TOTALS (PayrollYearToDate) FROM THE PAYROLL LEDGER AND FIXES THE ROWS THAT DRIFTED.
+#with --check nothing is written, the differences are only listed (exit code 1 when there are any, for cron alerts)
+class Command(BaseCommand):
+    help = "Rebuild the payroll year to date totals from the payroll ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help="Only this year")
+        parser.add_argument('--check', action='store_true', help="Only report differences, do not fix them")
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_year_to_date(year=options.get('year'), fix=not options['check'])
+        for user_id, year, differences in mismatches:
+            details = ', '.join(f"{field} {stored} -> {ledger}" for field, (stored, ledger) in differences.items())
+            self.stdout.write(f"user {user_id}, {year}: {details}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Year to date totals match the ledger"))
+        elif options['check']:
+            raise CommandError(f"{len(mismatches)} year to date totals differ from the ledger")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} year to date totals"))
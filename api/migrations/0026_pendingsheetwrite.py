@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_payrollrecords_cpp_er_payrollrecords_ei_er'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSheetWrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_id', models.CharField(db_index=True, max_length=255)),
+                ('sheet_type', models.CharField(max_length=50)),
+                ('payload', models.BinaryField()),
+                ('row_count', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_pendingsheetwrite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinicspreadsheet',
+            name='date_formats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_clinicspreadsheet_date_formats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetRegistry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_id', models.CharField(max_length=255, unique=True)),
+                ('report_type', models.CharField(max_length=50)),
+                ('schema', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('clinic_spreadsheet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registered_sheets', to='api.clinicspreadsheet')),
+            ],
+            options={
+                'verbose_name_plural': 'Sheet Registry',
+            },
+        ),
+    ]
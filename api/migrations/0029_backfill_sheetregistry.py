@@ -0,0 +1,29 @@
+from django.db import migrations
+
+REPORT_TYPES = ('compensation_sales', 'daily_transaction', 'transaction_report', 'payment_transaction', 'time_hour')
+
+
+def backfill_sheet_registry(apps, schema_editor):
+    ClinicSpreadsheet = apps.get_model('api', 'ClinicSpreadsheet')
+    SheetRegistry = apps.get_model('api', 'SheetRegistry')
+
+    entries = {}
+    for clinic_spreadsheet in ClinicSpreadsheet.objects.all():
+        for report_type in REPORT_TYPES:
+            sheet_id = getattr(clinic_spreadsheet, f'{report_type}_sheet_id')
+            if sheet_id and sheet_id not in entries:
+                entries[sheet_id] = SheetRegistry(
+                    sheet_id=sheet_id, clinic_spreadsheet=clinic_spreadsheet, report_type=report_type)
+
+    SheetRegistry.objects.bulk_create(entries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_sheetregistry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sheet_registry, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_payrolldraft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrecords',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
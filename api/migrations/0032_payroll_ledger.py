@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_payrollrecords_sent_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening balance'), ('payroll', 'Payroll sent'), ('adjustment', 'Payroll sent again')], max_length=20)),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('deductions', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cpp', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ei', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payroll_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.payrollrecords')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'year'], name='api_payroll_user_id_2c2260_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PayrollYearToDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('deductions', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cpp', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ei', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_year_to_date', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'year'), name='unique_payroll_year_to_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def seed_payroll_ledger(apps, schema_editor):
+    """Carries the YTD totals kept on UserProfile over as opening balances, in the year they were counted for"""
+    UserProfile = apps.get_model('registration', 'UserProfile')
+    PayrollLedgerEntry = apps.get_model('api', 'PayrollLedgerEntry')
+    PayrollYearToDate = apps.get_model('api', 'PayrollYearToDate')
+
+    entries, totals = [], []
+    for user_profile in UserProfile.objects.all():
+        amounts = {
+            'earnings': user_profile.ytd_pay,
+            'deductions': user_profile.ytd_deduction,
+            'cpp': user_profile.cpp_contrib,
+            'ei': user_profile.ei_contrib,
+        }
+        if not any(amounts.values()):
+            continue
+        entries.append(PayrollLedgerEntry(user_id=user_profile.user_id, year=user_profile.contrib_year,
+                                          entry_type='opening', **amounts))
+        totals.append(PayrollYearToDate(user_id=user_profile.user_id, year=user_profile.contrib_year, **amounts))
+
+    PayrollLedgerEntry.objects.bulk_create(entries)
+    PayrollYearToDate.objects.bulk_create(totals)
+
+
+def unseed_payroll_ledger(apps, schema_editor):
+    apps.get_model('api', 'PayrollLedgerEntry').objects.filter(entry_type='opening').delete()
+    apps.get_model('api', 'PayrollYearToDate').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_payroll_ledger'),
+        ('registration', '0017_userprofile_money_decimal'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_payroll_ledger, unseed_payroll_ledger),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count
+
+GENERATED_NOTES = ['AUTO-generated payroll record', 'STU-generated payroll record']
+
+
+def _keep_rank(record):
+    """Sent records first, then PAY- numbered ones, then ones whose generated notes were replaced, then the latest"""
+    return (record.sent_at is not None, record.payroll_number.startswith('PAY-'),
+            record.notes not in GENERATED_NOTES, record.id)
+
+
+def remove_duplicate_payroll_records(apps, schema_editor):
+    """
+    Keeps one record per user and period, the one that was sent when there is one. The ledger entries of the
+    others are moved onto it, and their revenue share contributions too when it has none of its own.
+    """
+    PayrollRecords = apps.get_model('api', 'PayrollRecords')
+    PayrollLedgerEntry = apps.get_model('api', 'PayrollLedgerEntry')
+    RevenueShareContribution = apps.get_model('api', 'RevenueShareContribution')
+
+    duplicates = (PayrollRecords.objects.values('user_id', 'period_start', 'period_end')
+                  .annotate(records=Count('id')).filter(records__gt=1))
+    for group in duplicates:
+        records = sorted(PayrollRecords.objects.filter(
+            user_id=group['user_id'], period_start=group['period_start'], period_end=group['period_end']
+        ), key=_keep_rank, reverse=True)
+        kept, stale_ids = records[0], [record.id for record in records[1:]]
+
+        PayrollLedgerEntry.objects.filter(payroll_record_id__in=stale_ids).update(payroll_record_id=kept.id)
+        if not RevenueShareContribution.objects.filter(payroll_record_id=kept.id).exists():
+            # from the best ranked record that has any, the others would only repeat them
+            for record in records[1:]:
+                if RevenueShareContribution.objects.filter(payroll_record_id=record.id).update(
+                        payroll_record_id=kept.id):
+                    break
+        PayrollRecords.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_seed_payroll_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_payroll_records, migrations.RunPython.noop),
+    ]
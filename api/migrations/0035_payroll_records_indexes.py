@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_dedupe_payroll_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payrollrecords',
+            index=models.Index(fields=['clinic', 'period_start'], name='payroll_clinic_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollrecords',
+            index=models.Index(fields=['-period_start', '-id'], name='payroll_history_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrecords',
+            constraint=models.UniqueConstraint(fields=('user', 'period_start', 'period_end'), name='unique_payroll_record_period'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import F, Q
+
+# Notes the payroll preview gives the records it generates for revenue share targets and students,
+# sending a payroll replaced them with the payroll's own notes
+GENERATED_NOTES = ['AUTO-generated payroll record', 'STU-generated payroll record']
+
+
+def backfill_sent_at(apps, schema_editor):
+    """
+    Records sent before sent_at existed already had their YTD applied (carried over as the opening balance),
+    so they are marked sent, at the time they were created.
+    """
+    PayrollRecords = apps.get_model('api', 'PayrollRecords')
+    PayrollRecords.objects.filter(sent_at__isnull=True).filter(
+        Q(payroll_number__startswith='PAY-') | ~Q(notes__in=GENERATED_NOTES)
+    ).update(sent_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_payroll_records_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sent_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations
+
+AMOUNT_FIELDS = ('earnings', 'deductions', 'cpp', 'ei')
+
+
+def _cent(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def link_sent_payrolls(apps, schema_editor):
+    """
+    Payrolls sent before the ledger existed are part of the opening balances. Each gets its own opening entry
+    for its amounts, offset against the user's opening balance of that year (or added to the year's totals when the
+    opening balance is of another year), so sending one again only posts the difference.
+    """
+    PayrollRecords = apps.get_model('api', 'PayrollRecords')
+    PayrollLedgerEntry = apps.get_model('api', 'PayrollLedgerEntry')
+    PayrollYearToDate = apps.get_model('api', 'PayrollYearToDate')
+
+    openings = set(PayrollLedgerEntry.objects.filter(entry_type='opening', payroll_record__isnull=True)
+                   .values_list('user_id', 'year'))
+    for record in PayrollRecords.objects.filter(sent_at__isnull=False, payrollledgerentry__isnull=True):
+        year = record.period_end.year
+        amounts = {
+            'earnings': _cent(record.total_income),
+            'deductions': _cent(record.total_deductions),
+            'cpp': _cent(record.cpp_contrib),
+            'ei': _cent(record.ei_contrib),
+        }
+        PayrollLedgerEntry.objects.create(user_id=record.user_id, year=year, payroll_record=record,
+                                          entry_type='opening', **amounts)
+
+        if (record.user_id, year) in openings:
+            # the ledger is append-only, an unlinked opening entry of the opposite amounts keeps the year's total
+            PayrollLedgerEntry.objects.create(user_id=record.user_id, year=year, entry_type='opening',
+                                              **{field: -amount for field, amount in amounts.items()})
+        else:
+            totals, _ = PayrollYearToDate.objects.get_or_create(user_id=record.user_id, year=year)
+            for field in AMOUNT_FIELDS:
+                setattr(totals, field, getattr(totals, field) + amounts[field])
+            totals.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_backfill_payroll_sent_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_sent_payrolls, migrations.RunPython.noop),
+    ]
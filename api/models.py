@@ -25,6 +25,9 @@ class ClinicSpreadsheet(models.Model):
     # For the compensation_sales_sheet merge
     merge_column = models.CharField(max_length=100, null=True, blank=True)
 
+    # Date format of each sheet's date columns, detected at upload: {sheet_type: {column: strftime format}}
+    date_formats = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -51,6 +54,21 @@ class ClinicSpreadsheet(models.Model):
             self.time_hour_sheet_id,
         ])
 
+
+class SheetRegistry(models.Model):
+    """Which clinic spreadsheet and report type own a google sheet id, so ownership is one indexed lookup"""
+    sheet_id = models.CharField(max_length=255, unique=True)
+    clinic_spreadsheet = models.ForeignKey(ClinicSpreadsheet, on_delete=models.CASCADE, related_name='registered_sheets')
+    report_type = models.CharField(max_length=50)
+    schema = models.JSONField(default=list, blank=True)  # header row as of our last write
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Sheet Registry"
+
+    def __str__(self):
+        return f"{self.report_type} - {self.sheet_id}"
+
 class SiteSettings(models.Model):
     federal_tax_brackets = models.JSONField(default=list, help_text="Federal income tax brackets")
     provincial_tax_brackets = models.JSONField(default=list, help_text="Provincial income tax brackets")
@@ -104,6 +122,18 @@ class PayrollRecords(models.Model):
     net_payment = models.DecimalField(max_digits=10, decimal_places=3)
     notes = models.TextField(blank=True)
     payroll_number = models.CharField(max_length=50, unique=True)
+    # Set when the payroll was sent (YTD applied and payslip emailed), sending the same period again only applies the difference
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # One record per user and period: the existence checks and upserts are a single index lookup
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period_start', 'period_end'], name='unique_payroll_record_period'),
+        ]
+        indexes = [
+            models.Index(fields=['clinic', 'period_start'], name='payroll_clinic_period_idx'),
+            models.Index(fields=['-period_start', '-id'], name='payroll_history_idx'),
+        ]
 
 class RevenueShareContribution(models.Model):
     payroll_record = models.ForeignKey('PayrollRecords', on_delete=models.CASCADE)
@@ -112,4 +142,83 @@ class RevenueShareContribution(models.Model):
     contribution_type = models.CharField(max_length=50, choices=[
         ('specific_user', 'From Specific User'),
         ('student_share', 'From Student Revenue Share'),
-    ])
\ No newline at end of file
+    ])
+class PayrollLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a user's year to date totals: the opening balances carried over
+    from UserProfile, each payroll sent and the difference when a payroll is sent again. Never updated or deleted.
+    """
+    ENTRY_TYPES = [
+        ('opening', 'Opening balance'),
+        ('payroll', 'Payroll sent'),
+        ('adjustment', 'Payroll sent again'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payroll_ledger_entries')
+    year = models.IntegerField()
+    payroll_record = models.ForeignKey('PayrollRecords', on_delete=models.SET_NULL, null=True, blank=True)
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    deductions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cpp = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ei = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'year'])]
+
+    def __str__(self):
+        return f"{self.user} {self.year} {self.entry_type} {self.earnings}"
+
+class PayrollYearToDate(models.Model):
+    """A user's year to date totals, the sum of their ledger entries for the year kept up to date on each posting"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payroll_year_to_date')
+    year = models.IntegerField()
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    deductions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cpp = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ei = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'year'], name='unique_payroll_year_to_date')]
+
+    def __str__(self):
+        return f"{self.user} {self.year} year to date"
+
+class PayrollDraft(models.Model):
+    """
+    Payroll preview precomputed overnight (generate_draft_payrolls) for a user's last completed pay period.
+    source_key is the preview cache key it was calculated under, it is only served while that key still matches.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payroll_drafts')
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name='payroll_drafts')
+    period_start = models.DateField()
+    period_end = models.DateField()
+    payroll_data = models.JSONField(default=dict)
+    source_key = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'clinic', 'period_start', 'period_end'], name='unique_payroll_draft'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.period_start} to {self.period_end} draft"
+
+class PendingSheetWrite(models.Model):
+    """Rows accepted in write-behind mode that the flusher has not pushed to their google sheet yet"""
+    sheet_id = models.CharField(max_length=255, db_index=True)
+    sheet_type = models.CharField(max_length=50)
+    payload = models.BinaryField()  # parquet bytes of the uploaded rows
+    row_count = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.sheet_type} ({self.row_count} rows) for {self.sheet_id}"
@@ -0,0 +1,93 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from ..models import PayrollLedgerEntry, PayrollYearToDate
+from .money import money
+
+#THIS FILE POSTS YEAR TO DATE CHANGES TO THE PAYROLL LEDGER AND KEEPS THE PER USER, PER YEAR TOTALS IN STEP WITH IT
+#every posting appends ledger entries and adds them to PayrollYearToDate with F() in the same transaction, so YTD reads
+#are one row and a new year simply starts without a row. rebuild_year_to_date sums the ledger again to check/fix the rows
+AMOUNT_FIELDS = ('earnings', 'deductions', 'cpp', 'ei')
+
+
+def year_to_date(user_id, year):
+    """The user's totals for the year, an unsaved row of zeros when nothing was posted yet"""
+    return (PayrollYearToDate.objects.filter(user_id=user_id, year=year).first()
+            or PayrollYearToDate(user_id=user_id, year=year))
+
+
+def posted_amounts(payroll_record_ids):
+    """{payroll record id: {field: amount}} of everything the ledger holds for those records"""
+    return {
+        row['payroll_record_id']: {field: money(row[field] or 0) for field in AMOUNT_FIELDS}
+        for row in PayrollLedgerEntry.objects.filter(payroll_record_id__in=payroll_record_ids)
+        .values('payroll_record_id').annotate(**{field: Sum(field) for field in AMOUNT_FIELDS})
+    }
+
+
+def post_entries(entries):
+    """
+    Appends PayrollLedgerEntry objects (unsaved) and adds their amounts to the users' year to date rows.
+    Runs in the caller's transaction when there is one.
+    """
+    entries = [entry for entry in entries if any(getattr(entry, field) for field in AMOUNT_FIELDS)]
+    if not entries:
+        return
+
+    changes = {}
+    for entry in entries:
+        change = changes.setdefault((entry.user_id, entry.year), dict.fromkeys(AMOUNT_FIELDS, Decimal('0')))
+        for field in AMOUNT_FIELDS:
+            change[field] += Decimal(getattr(entry, field))
+
+    with transaction.atomic():
+        PayrollLedgerEntry.objects.bulk_create(entries)
+        PayrollYearToDate.objects.bulk_create(
+            [PayrollYearToDate(user_id=user_id, year=year) for user_id, year in changes], ignore_conflicts=True)
+        now = timezone.now()
+        for (user_id, year), change in changes.items():
+            PayrollYearToDate.objects.filter(user_id=user_id, year=year).update(
+                updated_at=now, **{field: F(field) + amount for field, amount in change.items()})
+
+
+def rebuild_year_to_date(year=None, fix=True):
+    """
+    Sums the ledger per user and year and compares it with the year to date rows.
+    Returns [(user id, year, {field: (stored, ledger)})] for the rows that differ, corrected when fix.
+    """
+    ledger = PayrollLedgerEntry.objects.all()
+    stored_rows = PayrollYearToDate.objects.all()
+    if year is not None:
+        ledger = ledger.filter(year=year)
+        stored_rows = stored_rows.filter(year=year)
+
+    expected = {
+        (row['user_id'], row['year']): {field: money(row[field] or 0) for field in AMOUNT_FIELDS}
+        for row in ledger.values('user_id', 'year').annotate(**{field: Sum(field) for field in AMOUNT_FIELDS})
+    }
+    stored = {(row.user_id, row.year): row for row in stored_rows}
+
+    mismatches, to_update, to_create = [], [], []
+    for key in expected.keys() | stored.keys():
+        amounts = expected.get(key, dict.fromkeys(AMOUNT_FIELDS, Decimal('0')))
+        row = stored.get(key)
+        differences = {
+            field: (getattr(row, field) if row else None, amounts[field])
+            for field in AMOUNT_FIELDS if row is None or getattr(row, field) != amounts[field]
+        }
+        if not differences:
+            continue
+        mismatches.append((key[0], key[1], differences))
+        if row is None:
+            to_create.append(PayrollYearToDate(user_id=key[0], year=key[1], **amounts))
+        else:
+            for field, amount in amounts.items():
+                setattr(row, field, amount)
+            to_update.append(row)
+
+    if fix and mismatches:
+        with transaction.atomic():
+            PayrollYearToDate.objects.bulk_create(to_create)
+            PayrollYearToDate.objects.bulk_update(to_update, list(AMOUNT_FIELDS), batch_size=500)
+    return mismatches
@@ -0,0 +1,105 @@
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from ..utils import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+#THIS FILE HOLDS THE PAYROLL'S MONEY REPRESENTATION: WHOLE CENTS IN PYTHON/NUMPY INTEGERS
+#amounts are turned into cents once where they come in (sheet cells, request data, model fields) and back into
+#Decimal/float only where they go out (PayrollRecords, the payroll ledger, json), so sums never pick up float drift.
+#rounding is always half up to the cent, like the Decimal quantize calls in the payroll calculations
+CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    """
+    Whole cents of a money value (int, float, Decimal, or sheet text like "$1,234.50" / "(12.00)").
+    Blank or unreadable values are 0. Rounds half up.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return int(value) * 100
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return 0
+        value = repr(value)  # shortest text of the float, so 1.005 stays 1.005 and rounds to 101
+
+    if isinstance(value, str):
+        text = value.strip().replace('$', '').replace(',', '')
+        negative = text.startswith('(') and text.endswith(')')
+        text = text.strip('()')
+        if not text:
+            return 0
+        try:
+            value = Decimal(text)
+        except InvalidOperation:
+            return 0
+        if negative:
+            value = -value
+
+    try:
+        return int((Decimal(value) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, TypeError, ValueError):
+        return 0
+
+
+def from_cents(cents):
+    """Decimal with two places, for model fields"""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def cents_to_float(cents):
+    """Float for json payloads, exact to the cent"""
+    return int(cents) / 100
+
+
+def money(value):
+    """Any money value rounded half up to the cent, as a Decimal"""
+    return from_cents(to_cents(value))
+
+
+def series_to_cents(values):
+    """
+    Vectorized to_cents for a column of sheet values: an int64 numpy array of cents.
+    Sheet amounts have at most two decimals, for which rounding value * 100 to the nearest integer is exact.
+    """
+    series = pd.Series(values)
+    if series.dtype == object:
+        text = series.astype(str).str.strip()
+        negative = text.str.startswith('(') & text.str.endswith(')')
+        text = text.str.replace(r'[$,()]', '', regex=True)
+        numbers = pd.to_numeric(text, errors='coerce').where(~negative, lambda n: -n)
+    else:
+        numbers = pd.to_numeric(series, errors='coerce')
+
+    numbers = numbers.fillna(0).to_numpy(dtype='float64')
+    # half up, not numpy's round half to even: floor(|x| * 100 + 0.5) with the sign put back
+    return (np.sign(numbers) * np.floor(np.abs(numbers) * 100 + 0.5 + 1e-9)).astype('int64')
+
+
+def sum_cents(values):
+    """Total of a column of sheet values in cents"""
+    return int(series_to_cents(values).sum())
+
+
+def percent_of(cents, percent):
+    """percent (e.g. 5.95 for 5.95%) of an amount in cents, rounded half up to the cent"""
+    share = Decimal(int(cents)) * Decimal(str(percent)) / 100
+    return int(share.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def split_cents(cents, weights):
+    """
+    Splits an amount in cents in proportion to weights (e.g. cents). The shares always add up to the amount:
+    the rounding remainder goes to the largest share. All zeros when the weights don't add up to more than 0.
+    """
+    weights = [int(weight) for weight in weights]
+    total = sum(weights)
+    if total <= 0:
+        return [0] * len(weights)
+    shares = [int(cents) * weight // total for weight in weights]
+    shares[shares.index(max(shares))] += int(cents) - sum(shares)
+    return shares
@@ -0,0 +1,38 @@
+import calendar
+from datetime import date, timedelta
+from django.conf import settings
+
+#THIS FILE DERIVES PAY PERIODS FROM A PAYMENT FREQUENCY (PrimaryPaymentRole.payment_frequency)
+#weekly and bi-weekly periods run Monday to Sunday, bi-weekly ones counted from settings.PAY_PERIOD_BIWEEKLY_ANCHOR
+#so every day belongs to exactly one period. semi-monthly is the 1st-15th and 16th-end of month, monthly the month.
+#the frontend's PayrollIntervalSelector uses the same calendar
+FREQUENCIES = ('weekly', 'bi-weekly', 'semi-monthly', 'monthly')
+DEFAULT_FREQUENCY = 'semi-monthly'
+
+
+def period_containing(frequency, day):
+    """(start, end) of the pay period of the given frequency that day falls in"""
+    if frequency == 'weekly':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+
+    if frequency == 'bi-weekly':
+        anchor = date.fromisoformat(settings.PAY_PERIOD_BIWEEKLY_ANCHOR)
+        start = day - timedelta(days=(day - anchor).days % 14)
+        return start, start + timedelta(days=13)
+
+    month_end = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    if frequency == 'monthly':
+        return day.replace(day=1), month_end
+
+    # semi-monthly, also the fallback like everywhere else a role has no frequency
+    if day.day <= 15:
+        return day.replace(day=1), day.replace(day=15)
+    return day.replace(day=16), month_end
+
+
+def last_completed_period(frequency, today):
+    """The most recent pay period that ended before today"""
+    current_start = period_containing(frequency, today)[0]
+    return period_containing(frequency, current_start - timedelta(days=1))
+
@@ -1,4 +1,5 @@
-
+from decimal import Decimal
+from .money import to_cents, from_cents, cents_to_float
 
 
 class BasePayrollCalculator:
@@ -50,17 +51,19 @@ class HourlyEmployeeCalculator(BasePayrollCalculator):
             sheet_id=timesheet_sheet_id
         )
 
-        regular_pay = overtime_vacation_result['regular_pay']
-        overtime_pay = overtime_vacation_result['overtime_pay']
-        vacation_pay = overtime_vacation_result['vacation_pay']
+        # Each pay amount is rounded to the cent on its own and the total is their sum
+        regular_pay = to_cents(overtime_vacation_result['regular_pay'])
+        overtime_pay = to_cents(overtime_vacation_result['overtime_pay'])
+        vacation_pay = to_cents(overtime_vacation_result['vacation_pay'])
         total_earnings_before_tax = regular_pay + overtime_pay + vacation_pay
 
         period_days = (self.end_date - self.start_date).days + 1
         deductions_result = self.viewset.calculate_deductions(
-            total_taxable_income=total_earnings_before_tax,
+            total_taxable_income=from_cents(total_earnings_before_tax),
             period_days=period_days,
             user_profile=self.user_profile,
-            site_settings=self.site_settings
+            site_settings=self.site_settings,
+            year=self.end_date.year
         )
 
         return {
@@ -68,16 +71,16 @@ class HourlyEmployeeCalculator(BasePayrollCalculator):
             'total_hours': round(total_hours, 2),
             'hourly_wage': float(self.payment_detail.hourly_wage),
             'earnings': {
-                'salary': float(regular_pay),
-                'regular_pay': float(regular_pay),
-                'overtime_pay': float(overtime_pay),
-                'vacation_pay': float(vacation_pay),
+                'salary': cents_to_float(regular_pay),
+                'regular_pay': cents_to_float(regular_pay),
+                'overtime_pay': cents_to_float(overtime_pay),
+                'vacation_pay': cents_to_float(vacation_pay),
             },
             'deductions': deductions_result['deductions'],
             'totals': {
-                'total_earnings': float(total_earnings_before_tax),
+                'total_earnings': cents_to_float(total_earnings_before_tax),
                 'total_deductions': deductions_result['total_deductions'],
-                'net_payment': float(total_earnings_before_tax) - deductions_result['total_deductions'],
+                'net_payment': cents_to_float(total_earnings_before_tax - to_cents(deductions_result['total_deductions'])),
             },
             'breakdown': {
                 'overtime_hours': overtime_vacation_result['overtime_hours'],
@@ -105,7 +108,7 @@ class HourlyContractorCalculator(BasePayrollCalculator):
             if not (has_rev_share or has_rent):
                 raise ValueError(f'No timesheet data for {self.user.username} and no other items to process.')
 
-        total_pay = float(self.payment_detail.hourly_wage) * total_hours
+        total_pay = cents_to_float(to_cents(self.payment_detail.hourly_wage * Decimal(str(total_hours))))
 
         return {
             'role_type': 'Hourly Contractor',
@@ -6,15 +6,51 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from registration.models import *
 from ..services.google_sheets import *
-import pandas as pd
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 from ..models import *
 from .payroll_calculators import *
+from .revenue_sharing import RevenueShareResolver
+from .timesheet_matrix import TimesheetMatrix
+from .preview_cache import source_sheet_versions, preview_key, get_preview, store_preview
+from .money import to_cents, from_cents, cents_to_float, money, percent_of, sum_cents, series_to_cents, split_cents
+from .ledger import AMOUNT_FIELDS, year_to_date, post_entries, posted_amounts
+from ..services.google_quota import GoogleSheetsUnavailable
+from ..services.sheet_registry import REPORT_TITLES
+from ..services.write_behind import flush_before_read
+from ..services.date_formats import detect_date_format, parse_dates, sheet_date_formats
+from ..utils import lazy_import
+from ..serializers import PayrollRecordSerializer
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 import traceback
+import uuid
+import base64
+import binascii
+
+pd = lazy_import('pandas')
+
+
+def encode_history_cursor(record):
+    """Opaque keyset cursor of the last record of a history page"""
+    return base64.urlsafe_b64encode(f"{record.period_start.isoformat()}:{record.id}".encode()).decode()
+
+
+def decode_history_cursor(cursor):
+    """(period_start, id) of encode_history_cursor, ValueError when it is not one"""
+    try:
+        period_start, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f'bad cursor {cursor}') from e
+    return datetime.strptime(period_start, '%Y-%m-%d').date(), int(record_id)
+
 
 class PayrollViewSet(viewsets.ModelViewSet):
-    permission_classes = [IsAuthenticated]
+    # Previews save the base payroll records of the revenue share targets they calculate.
+    # Previews save the base payroll records of revenue share targets and students they calculate.
+    # generate_draft_payrolls turns this off, its drafts must not write anything
+    writes_payroll_records = True
 
     def get_permissions(self):
         """Only allow staff/superusers"""
@@ -72,11 +108,15 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 'email': user.email,
                 'primaryRole': primary_role,
                 'payment_frequency': payment_frequency,  # Changed from payroll_dates
-                'ytd_pay': user_profile.ytd_pay,
-                'ytd_deduction': user_profile.ytd_deduction,
-                'cpp_contrib': user_profile.cpp_contrib,
-                'ei_contrib': user_profile.ei_contrib,
+                'biweekly_anchor': settings.PAY_PERIOD_BIWEEKLY_ANCHOR,  # Monday bi-weekly periods are counted from
             }
+            ytd = year_to_date(user.id, timezone.localdate().year)
+            user_data.update({
+                'ytd_pay': float(ytd.earnings),
+                'ytd_deduction': float(ytd.deductions),
+                'cpp_contrib': float(ytd.cpp),
+                'ei_contrib': float(ytd.ei),
+            })
 
             return Response(user_data, status=status.HTTP_200_OK)
 
@@ -86,6 +126,67 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'])
+    def drafts(self, request):
+        """Draft payrolls made overnight by generate_draft_payrolls, optionally for one clinic (?clinic_id=)"""
+        drafts = PayrollDraft.objects.select_related('user', 'clinic').order_by('-period_end', 'user__username')
+        if request.query_params.get('clinic_id'):
+            drafts = drafts.filter(clinic_id=request.query_params['clinic_id'])
+
+        return Response([{
+            'user_id': draft.user_id,
+            'user_name': f"{draft.user.first_name} {draft.user.last_name}".strip() or draft.user.username,
+            'clinic_id': draft.clinic_id,
+            'clinic_name': draft.clinic.name,
+            'pay_period_start': draft.period_start.strftime('%Y-%m-%d'),
+            'pay_period_end': draft.period_end.strftime('%Y-%m-%d'),
+            'role_type': draft.payroll_data.get('role_type', ''),
+            'net_payment': draft.payroll_data.get('totals', {}).get('net_payment', 0),
+            'updated_at': draft.updated_at.isoformat(),
+        } for draft in drafts], status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Sent and generated payroll records, newest period first, with the sums of everything the filters match.
+        Filters: ?clinic_id=, ?user_id=, ?role= (role type), ?start= and ?end= (YYYY-MM-DD, on the period start).
+        Pages by keyset: pass the returned next_cursor as ?cursor= for the following page_size records.
+        """
+        try:
+            records = PayrollRecords.objects.all()
+            params = request.query_params
+            if params.get('clinic_id'):
+                records = records.filter(clinic_id=int(params['clinic_id']))
+            if params.get('user_id'):
+                records = records.filter(user_id=int(params['user_id']))
+            if params.get('role'):
+                records = records.filter(role_type=params['role'])
+            if params.get('start'):
+                records = records.filter(period_start__gte=datetime.strptime(params['start'], '%Y-%m-%d').date())
+            if params.get('end'):
+                records = records.filter(period_start__lte=datetime.strptime(params['end'], '%Y-%m-%d').date())
+            page_size = min(max(int(params.get('page_size', 50)), 1), 500)
+            cursor = decode_history_cursor(params['cursor']) if params.get('cursor') else None
+        except (ValueError, TypeError) as e:
+            return Response({'error': f'Invalid filter: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        totals = records.aggregate(
+            count=Count('id'), total_income=Sum('total_income'), total_deductions=Sum('total_deductions'),
+            net_payment=Sum('net_payment'), cpp_er=Sum('cpp_er'), ei_er=Sum('ei_er'))
+
+        page = records.select_related('user', 'clinic').order_by('-period_start', '-id')
+        if cursor:
+            period_start, record_id = cursor
+            page = page.filter(Q(period_start__lt=period_start) | Q(period_start=period_start, id__lt=record_id))
+        page = list(page[:page_size + 1])
+        next_cursor = encode_history_cursor(page[page_size - 1]) if len(page) > page_size else None
+
+        return Response({
+            'results': PayrollRecordSerializer(page[:page_size], many=True).data,
+            'next_cursor': next_cursor,
+            'totals': {key: (value if key == 'count' else float(money(value or 0))) for key, value in totals.items()},
+        }, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def generate_payroll(self, request, pk=None):
         """Generate payroll for a specific user using a strategy pattern."""
@@ -95,71 +196,265 @@ class PayrollViewSet(viewsets.ModelViewSet):
         try:
             user = get_object_or_404(User, id=pk)
             user_profile = get_object_or_404(UserProfile, user=user)
-            user_profile.reset_annual_contributions_if_needed()
             site_settings = SiteSettings.objects.first()
             if not site_settings:
                 return Response({'error': 'Site settings not configured.'}, status=status.HTTP_400_BAD_REQUEST)
             start_date = datetime.strptime(request.data['startDate'], '%Y-%m-%d').date()
             end_date = datetime.strptime(request.data['endDate'], '%Y-%m-%d').date()
-            period_days = (end_date - start_date).days + 1
             clinic = get_object_or_404(Clinic, id=request.data['clinic_id'])
             clinic_spreadsheet = get_object_or_404(ClinicSpreadsheet, clinic=clinic)
             payment_detail = getattr(user_profile, 'payment_detail', None)
             if not payment_detail:
                 return Response({'error': 'User does not have a payment role configured.'},
                                 status=status.HTTP_400_BAD_REQUEST)
+
+            # Uploads still waiting in write-behind mode are not on the sheets yet, the payroll would miss them
+            pending_sheets = flush_before_read(
+                [getattr(clinic_spreadsheet, f'{report_type}_sheet_id') for report_type in REPORT_TITLES])
+            if pending_sheets:
+                return Response({'error': 'Uploads to this clinic\'s sheets are still being written to Google, '
+                                          'please try again shortly.', 'pending_sheets': pending_sheets},
+                                status=status.HTTP_409_CONFLICT)
+
             try:
-                calculator = self._get_payroll_calculator(user, user_profile, payment_detail, clinic_spreadsheet,
-                                                          start_date, end_date, site_settings)
-                payroll_data = calculator.calculate_base_earnings()
+                payroll_data, _ = self._cached_payroll_preview(
+                    user, user_profile, payment_detail, clinic, clinic_spreadsheet, start_date, end_date,
+                    site_settings, source_sheet_versions(clinic_spreadsheet))
             except (ValueError, TypeError) as e:
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-            earnings = payroll_data.get('earnings', {})
-            is_commission = 'Commission' in payroll_data.get('role_type', '')
-            base_gross_income = Decimal(str(earnings.get('gross_income', 0))) if is_commission else \
-                (Decimal(str(earnings.get('regular_pay', 0))) + Decimal(str(earnings.get('overtime_pay', 0))))
-            rent_deduction, rent_description = self._calculate_rent_deduction(user_profile, start_date, end_date)
-            rev_share_deduction, rev_deduction_details = self._calculate_revenue_sharing_deductions(user, user_profile,
-                                                                                                    base_gross_income)
-            rev_share_income_users, rev_income_user_details = self._calculate_revenue_sharing_income_from_user(
-                user_profile, start_date, end_date, clinic_spreadsheet, site_settings)
-            rev_share_income_students, rev_income_student_details = self._calculate_revenue_sharing_income_from_students(
-                user_profile, start_date, end_date, clinic_spreadsheet)
-            total_revenue_share_income = rev_share_income_users + rev_share_income_students
-            payroll_data = self._apply_final_adjustments(payroll_data, payment_detail, period_days, user_profile,
-                                                         site_settings, rent_deduction, rev_share_deduction,
-                                                         total_revenue_share_income)
-            payroll_data['deductions']['rent_description'] = rent_description
-            payroll_data['revenue_sharing_details'] = {
-                'rent_deduction': float(rent_deduction), 'revenue_share_deduction': float(rev_share_deduction),
-                'revenue_share_income_users': float(rev_share_income_users),
-                'revenue_share_income_students': float(rev_share_income_students),
-                'revenue_deduction_details': rev_deduction_details,
-                'revenue_income_user_details': rev_income_user_details,
-                'revenue_income_student_details': rev_income_student_details,
-            }
-            revenue_sharing_contributions = {'income_contributors': [], 'deduction_recipients': []}
-            if rev_income_user_details:
-                for detail in rev_income_user_details:
-                    revenue_sharing_contributions['income_contributors'].append(
-                        {'user_name': detail['from_user'], 'amount': detail['amount'], 'type': 'specific_user'})
-            if rev_income_student_details:
-                total_student_contribution = float(total_revenue_share_income - rev_share_income_users)
-                if total_student_contribution > 0:
-                    revenue_sharing_contributions['income_contributors'].append(
-                        {'user_name': 'All Students Combined', 'amount': total_student_contribution,
-                         'type': 'student_share', 'student_breakdown': rev_income_student_details})
-            if rev_deduction_details:
-                for detail in rev_deduction_details:
-                    revenue_sharing_contributions['deduction_recipients'].append(
-                        {'user_name': detail['payee'], 'amount': detail['amount'], 'type': 'specific_user'})
-            payroll_data['revenue_sharing_contributions'] = revenue_sharing_contributions
             return Response(payroll_data, status=status.HTTP_200_OK)
+        except GoogleSheetsUnavailable as e:
+            # Never fall back to empty sheet data here, that would produce a zero payroll
+            return Response({'error': f'Google Sheets is unavailable, please try again shortly: {str(e)}'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             traceback.print_exc()
             return Response({'error': f'Failed to generate payroll: {str(e)}'},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _cached_payroll_preview(self, user, user_profile, payment_detail, clinic, clinic_spreadsheet, start_date,
+                                end_date, site_settings, sheet_versions):
+        """
+        Same inputs and unchanged sheets give the same payroll: serves it from the preview cache or a matching
+        overnight draft, and only calculates it when neither has it.
+        Returns (payroll_data, cache key), the key is None when the sheet versions are unknown and nothing was cached.
+        """
+        cache_key = preview_key(user, clinic, start_date, end_date, sheet_versions) if sheet_versions else None
+        if cache_key:
+            cached = get_preview(cache_key)
+            if cached is None:
+                draft = PayrollDraft.objects.filter(user=user, clinic=clinic, period_start=start_date,
+                                                    period_end=end_date, source_key=cache_key).first()
+                if draft:
+                    cached = draft.payroll_data
+                    store_preview(cache_key, cached)
+            if cached is not None:
+                print(f"Serving cached payroll preview for {user.username} {start_date} to {end_date}")
+                return cached, cache_key
+
+        payroll_data = self._build_payroll_preview(user, user_profile, payment_detail, clinic_spreadsheet,
+                                                   start_date, end_date, site_settings)
+        if cache_key:
+            # Keyed after the run: it can create the base payroll records of revenue share targets,
+            # which the next identical request will see
+            cache_key = preview_key(user, clinic, start_date, end_date, sheet_versions)
+            store_preview(cache_key, payroll_data)
+        return payroll_data, cache_key
+
+    def _build_payroll_preview(self, user, user_profile, payment_detail, clinic_spreadsheet, start_date, end_date,
+                               site_settings):
+        """
+        Calculates the payroll of user for the period: base earnings, rent, revenue sharing and the final totals.
+        Raises ValueError when there is nothing to pay.
+        """
+        period_days = (end_date - start_date).days + 1
+        self._prefetch_payroll_sheets(user_profile, payment_detail, clinic_spreadsheet, start_date, end_date)
+        calculator = self._get_payroll_calculator(user, user_profile, payment_detail, clinic_spreadsheet,
+                                                  start_date, end_date, site_settings)
+        payroll_data = calculator.calculate_base_earnings()
+        earnings = payroll_data.get('earnings', {})
+        is_commission = 'Commission' in payroll_data.get('role_type', '')
+        base_gross_income = Decimal(str(earnings.get('gross_income', 0))) if is_commission else \
+            (Decimal(str(earnings.get('regular_pay', 0))) + Decimal(str(earnings.get('overtime_pay', 0))))
+        rent_deduction, rent_description = self._calculate_rent_deduction(user_profile, start_date, end_date)
+        rev_share_deduction, rev_deduction_details = self._calculate_revenue_sharing_deductions(user, user_profile,
+                                                                                                base_gross_income)
+        rev_share_income_users, rev_income_user_details = self._calculate_revenue_sharing_income_from_user(
+            user_profile, start_date, end_date, clinic_spreadsheet, site_settings)
+        rev_share_income_students, rev_income_student_details = self._calculate_revenue_sharing_income_from_students(
+            user_profile, start_date, end_date, clinic_spreadsheet)
+        total_revenue_share_income = rev_share_income_users + rev_share_income_students
+        payroll_data = self._apply_final_adjustments(payroll_data, payment_detail, period_days, user_profile,
+                                                     site_settings, rent_deduction, rev_share_deduction,
+                                                     total_revenue_share_income, end_date.year)
+        payroll_data['deductions']['rent_description'] = rent_description
+        payroll_data['revenue_sharing_details'] = {
+            'rent_deduction': float(rent_deduction), 'revenue_share_deduction': float(rev_share_deduction),
+            'revenue_share_income_users': float(rev_share_income_users),
+            'revenue_share_income_students': float(rev_share_income_students),
+            'revenue_deduction_details': rev_deduction_details,
+            'revenue_income_user_details': rev_income_user_details,
+            'revenue_income_student_details': rev_income_student_details,
+        }
+        revenue_sharing_contributions = {'income_contributors': [], 'deduction_recipients': []}
+        if rev_income_user_details:
+            for detail in rev_income_user_details:
+                revenue_sharing_contributions['income_contributors'].append(
+                    {'user_name': detail['from_user'], 'amount': detail['amount'], 'type': 'specific_user'})
+        if rev_income_student_details:
+            total_student_contribution = float(total_revenue_share_income - rev_share_income_users)
+            if total_student_contribution > 0:
+                revenue_sharing_contributions['income_contributors'].append(
+                    {'user_name': 'All Students Combined', 'amount': total_student_contribution,
+                     'type': 'student_share', 'student_breakdown': rev_income_student_details})
+        if rev_deduction_details:
+            for detail in rev_deduction_details:
+                revenue_sharing_contributions['deduction_recipients'].append(
+                    {'user_name': detail['payee'], 'amount': detail['amount'], 'type': 'specific_user'})
+        payroll_data['revenue_sharing_contributions'] = revenue_sharing_contributions
+        return payroll_data
+
+    def _prefetch_payroll_sheets(self, user_profile, payment_detail, clinic_spreadsheet, start_date, end_date):
+        """
+        Reads every source sheet this payroll needs for the period concurrently and keeps the
+        DataFrames for the rest of the request. Revenue sharing can pull in any role, so it reads everything.
+        Sheets already read for the same period are kept, so several payrolls on one viewset share the reads.
+        """
+        has_revenue_sharing = RevenueSharing.objects.filter(user_profile=user_profile).exists()
+        needs_timesheet = has_revenue_sharing or isinstance(payment_detail, (HourlyEmployee, HourlyContractor))
+        needs_commission = has_revenue_sharing or isinstance(payment_detail, (CommissionEmployee, CommissionContractor))
+
+        self._prefetch_clinic_sheets(clinic_spreadsheet, start_date, end_date, needs_timesheet, needs_commission)
+
+    def _prefetch_clinic_sheets(self, clinic_spreadsheet, start_date, end_date, timesheet=True, commission=True):
+        """Reads the clinic's timesheet and/or commission sheets for the period concurrently, skipping the ones kept"""
+        sheet_reads = []
+        if timesheet:
+            # From the Monday of the first week, weekly overtime of a partial first week needs the days before the period
+            sheet_reads.append((clinic_spreadsheet.time_hour_sheet_id, 'Date', self._week_start(start_date)))
+        if commission:
+            sheet_reads += [
+                (clinic_spreadsheet.compensation_sales_sheet_id, 'Invoice Date', start_date),
+                (clinic_spreadsheet.transaction_report_sheet_id, 'Payment Date', start_date),
+                (clinic_spreadsheet.payment_transaction_sheet_id, 'Date', start_date),
+            ]
+
+        fetch_plan = {
+            (sheet_id, date_column_name): {
+                'sheet_id': sheet_id,
+                'date_column_name': date_column_name,
+                'start_date': read_start,
+                'end_date': end_date,
+                'date_format': self._date_format_for(sheet_id, date_column_name),
+            }
+            for sheet_id, date_column_name, read_start in sheet_reads
+            if sheet_id and self._prefetched_range(sheet_id, date_column_name) != (read_start, end_date)
+        }
+        frames = fetch_sheets_by_date_range(fetch_plan)
+        if not hasattr(self, '_prefetched_sheets'):
+            self._prefetched_sheets = {}
+        self._prefetched_sheets.update(
+            {key: (fetch_plan[key]['start_date'], end_date, df) for key, df in frames.items()})
+
+    def _clinic_staff_names(self, clinic_spreadsheet, start_date, end_date):
+        """
+        Lowercased full names of everyone with hours on the clinic's timesheet or invoices on its compensation sheet
+        in the period, from the sheets kept on the viewset
+        """
+        self._prefetch_clinic_sheets(clinic_spreadsheet, start_date, end_date)
+        names = set()
+        if clinic_spreadsheet.time_hour_sheet_id:
+            matrix = self._timesheet_matrix(clinic_spreadsheet.time_hour_sheet_id, start_date, end_date)
+            names.update(name.lower() for name in matrix.staff_rows
+                         if matrix.total_minutes(name, start_date, end_date))
+        if clinic_spreadsheet.compensation_sales_sheet_id:
+            df = self._read_sheet_by_date_range(clinic_spreadsheet.compensation_sales_sheet_id, 'Invoice Date',
+                                                start_date, end_date)
+            if not df.empty:
+                names.update(df['Practitioner'].map(self._normalize_practitioner_name).str.lower())
+        return names
+
+    def _prefetched_range(self, sheet_id, date_column_name):
+        prefetched = getattr(self, '_prefetched_sheets', {}).get((sheet_id, date_column_name))
+        return prefetched[:2] if prefetched else None
+
+    def _read_sheet_by_date_range(self, sheet_id, date_column_name, start_date, end_date):
+        """
+        read_sheet_by_date_range that serves from the sheets prefetched for this request when they cover the range,
+        and only goes to Google otherwise.
+        """
+        prefetched = getattr(self, '_prefetched_sheets', {}).get((sheet_id, date_column_name))
+        if prefetched:
+            fetched_start, fetched_end, df = prefetched
+            if fetched_start <= start_date and end_date <= fetched_end:
+                if df.empty or (fetched_start, fetched_end) == (start_date, end_date):
+                    return df.copy()
+                # Narrower range than what was fetched, filter the same way read_sheet_by_date_range does
+                dates = self._parse_sheet_dates(sheet_id, date_column_name, df[date_column_name]).dt.date
+                return df[(dates >= start_date) & (dates <= end_date)].reset_index(drop=True)
+
+        return read_sheet_by_date_range(
+            sheet_id=sheet_id,
+            date_column_name=date_column_name,
+            start_date=start_date,
+            end_date=end_date,
+            date_format=self._date_format_for(sheet_id, date_column_name)
+        )
+
+    def _date_format_for(self, sheet_id, column):
+        """Stored date format of a sheet's column (see services/date_formats.py), looked up once per request"""
+        if not hasattr(self, '_sheet_date_formats'):
+            self._sheet_date_formats = {}
+        if sheet_id not in self._sheet_date_formats:
+            self._sheet_date_formats[sheet_id] = sheet_date_formats(sheet_id)
+        return self._sheet_date_formats[sheet_id].get(column)
+
+    def _revenue_share_resolver(self, clinic_spreadsheet, period_start, period_end, site_settings):
+        """
+        RevenueShareResolver of the clinic and period, kept for the request (or the whole draft run) so a target's
+        base earnings are made once however many users share from them
+        """
+        if not hasattr(self, '_revenue_share_resolvers'):
+            self._revenue_share_resolvers = {}
+        key = (clinic_spreadsheet.id, period_start, period_end)
+        if key not in self._revenue_share_resolvers:
+            self._revenue_share_resolvers[key] = RevenueShareResolver(self, clinic_spreadsheet, period_start,
+                                                                      period_end, site_settings)
+        return self._revenue_share_resolvers[key]
+
+    def _week_start(self, day):
+        return day - timedelta(days=day.weekday())
+
+    def _timesheet_matrix(self, sheet_id, start_date, end_date):
+        """
+        TimesheetMatrix of the hours sheet covering start_date..end_date, built once per request and shared by
+        every user's hours. It starts on the Monday of start_date's week for the weekly overtime.
+        """
+        if not hasattr(self, '_timesheet_matrices'):
+            self._timesheet_matrices = {}
+        for (matrix_sheet_id, first_day, last_day), matrix in self._timesheet_matrices.items():
+            if matrix_sheet_id == sheet_id and matrix.covers(start_date, end_date):
+                return matrix
+
+        first_day = self._week_start(start_date)
+        df = self._read_sheet_by_date_range(sheet_id=sheet_id, date_column_name="Date",
+                                            start_date=first_day, end_date=end_date)
+        dates = self._parse_sheet_dates(sheet_id, 'Date', df['Date']) if not df.empty else None
+        matrix = TimesheetMatrix.from_rows(df, dates, first_day, end_date)
+        self._timesheet_matrices[(sheet_id, first_day, end_date)] = matrix
+        print(f"Built timesheet matrix {matrix.minutes.shape} for {first_day} to {end_date}")
+        return matrix
+
+    def _parse_sheet_dates(self, sheet_id, column, values, detect=False):
+        """
+        Parses a date column with the sheet's stored format. With detect=True a sheet uploaded before
+        formats were stored gets its format detected from the values instead of being guessed row by row.
+        """
+        date_format = self._date_format_for(sheet_id, column)
+        if date_format is None and detect:
+            date_format = detect_date_format(values)
+        return parse_dates(values, date_format)
+
     def _has_revenue_sharing_or_rent_for_period(self, user_profile, period_start, period_end):
         """
         Check if user has any revenue sharing roles or rent that would apply for this period
@@ -283,11 +578,21 @@ class PayrollViewSet(viewsets.ModelViewSet):
             'vacation_pay': vacation_pay,
         }
 
-    def calculate_deductions(self, total_taxable_income, period_days, user_profile, site_settings):
+    def _year_to_date(self, user_id, year):
+        """PayrollYearToDate of the user for the year, read once per request"""
+        if not hasattr(self, '_year_to_date_rows'):
+            self._year_to_date_rows = {}
+        if (user_id, year) not in self._year_to_date_rows:
+            self._year_to_date_rows[(user_id, year)] = year_to_date(user_id, year)
+        return self._year_to_date_rows[(user_id, year)]
+
+    def calculate_deductions(self, total_taxable_income, period_days, user_profile, site_settings, year):
         """
         Calculate all deductions: federal tax, provincial tax, CPP, and EI
+        The CPP and EI caps are applied against the user's year to date totals of `year` (the pay period's year)
         """
-        total_taxable_income = Decimal(str(total_taxable_income))
+        ytd = self._year_to_date(user_profile.user_id, year)
+        total_taxable_income = money(total_taxable_income)
         period_days = Decimal(str(period_days))
 
         # Annualize income for tax calculation
@@ -323,7 +628,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
         # Apply CPP cap
         cpp_cap = Decimal(str(site_settings.cpp_cap))
-        current_cpp_ytd = Decimal(str(user_profile.cpp_contrib))
+        current_cpp_ytd = ytd.cpp
         cpp_remaining_room = max(Decimal('0'), cpp_cap - current_cpp_ytd)
         cpp_deduction_final = min(cpp_deduction_calculated, cpp_remaining_room)
 
@@ -334,7 +639,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
         # Apply EI cap
         ei_cap = Decimal(str(site_settings.ei_cap))
-        current_ei_ytd = Decimal(str(user_profile.ei_contrib))
+        current_ei_ytd = ytd.ei
         ei_remaining_room = max(Decimal('0'), ei_cap - current_ei_ytd)
         ei_deduction_final = min(ei_deduction_calculated, ei_remaining_room)
 
@@ -351,9 +656,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 'ei': float(ei_deduction_final),
             },
             'total_deductions': total_deductions,
-            'projected_ytd_earnings': float(Decimal(str(user_profile.ytd_pay)) + total_taxable_income),
-            'projected_ytd_deductions': float(
-                Decimal(str(user_profile.ytd_deduction)) + Decimal(str(total_deductions))),
+            'projected_ytd_earnings': float(ytd.earnings + total_taxable_income),
+            'projected_ytd_deductions': float(ytd.deductions + Decimal(str(total_deductions))),
             'cpp_ytd_after': float(current_cpp_ytd + cpp_deduction_final),
             'ei_ytd_after': float(current_ei_ytd + ei_deduction_final),
         }
@@ -416,148 +720,53 @@ class PayrollViewSet(viewsets.ModelViewSet):
     def _get_full_week_hours(self, daily_hours, week_start, week_end, period_start, period_end, user, sheet_id):
         """
         Get total hours for a full calendar week, including days outside the pay period
-        For partial weeks at the start, this fetches additional timesheet data
-        """
-        total_hours = Decimal('0')
-
-        # Add hours from within the pay period (already have this data)
-        for check_date in [period_start + timedelta(days=x) for x in range((period_end - period_start).days + 1)]:
-            if week_start <= check_date <= week_end:
-                total_hours += Decimal(str(daily_hours.get(check_date, 0)))
-
-        # For dates outside the period but within the week, fetch additional data
-        dates_to_fetch = []
-        for day_offset in range(7):
-            check_date = week_start + timedelta(days=day_offset)
-            if check_date < period_start or check_date > period_end:
-                dates_to_fetch.append(check_date)
-
-        if dates_to_fetch:
-            # Fetch hours for dates outside the pay period
-            additional_hours = self._get_hours_for_specific_dates(sheet_id, user, dates_to_fetch)
-            for date, hours in additional_hours.items():
-                total_hours += Decimal(str(hours))
-
-        return total_hours
-
-    def _get_hours_for_specific_dates(self, sheet_id, user, dates_list):
+        For partial weeks at the start, the timesheet matrix already holds the days before the period
         """
-        Fetch user hours from Google Sheet for specific dates
-        Returns: dict with date as key and hours as value
-        """
-        try:
-            if not dates_list:
-                return {}
-
-            sheet_data = read_google_sheets(sheet_id, "A:I")
-
-            if not sheet_data or len(sheet_data) < 2:
-                return {date: 0 for date in dates_list}
-
-            headers = sheet_data[0]
-            data_rows = sheet_data[1:]
-            df = pd.DataFrame(data_rows, columns=headers)
-
-            user_full_name = f"{user.first_name} {user.last_name}".strip()
-            user_rows = df[df['Staff member'].str.strip() == user_full_name]
-
-            if user_rows.empty:
-                return {date: 0 for date in dates_list}
-
-            user_rows = user_rows.copy()
-            user_rows['Date'] = pd.to_datetime(user_rows['Date'], errors='coerce')
-            user_rows = user_rows.dropna(subset=['Date'])
-
-            # Filter for the specific dates
-            target_dates = [pd.Timestamp(date) for date in dates_list]
-            filtered_rows = user_rows[user_rows['Date'].isin(target_dates)]
-
-            # Build hours dictionary
-            hours_dict = {date: 0.0 for date in dates_list}  # Initialize with 0
-
-            for _, row in filtered_rows.iterrows():
-                try:
-                    date = row['Date'].date()
-                    minutes_value = row['Payable time (mins)']
-
-                    if pd.isna(minutes_value) or minutes_value == '':
-                        continue
-
-                    hours = float(minutes_value) / 60.0
-                    hours_dict[date] = hours_dict.get(date, 0.0) + hours
-
-                except (ValueError, TypeError) as e:
-                    print(f"Error converting minutes value '{minutes_value}' to float: {e}")
-                    continue
-
-            return hours_dict
-
-        except Exception as e:
-            print(f"Error fetching specific dates data: {str(e)}")
-            return {date: 0 for date in dates_list}
+        user_full_name = f"{user.first_name} {user.last_name}".strip()
+        matrix = self._timesheet_matrix(sheet_id, week_start, max(week_end, period_end))
+        return Decimal(matrix.total_minutes(user_full_name, week_start, week_end)) / 60
 
     def _get_user_hours_from_sheet(self, sheet_id, user, start_date, end_date):
-        # UPDATED: Switched to the efficient date range query.
         """
         Fetch total user hours from Google Sheet for the specified period.
         """
         try:
-            df = read_sheet_by_date_range(
-                sheet_id=sheet_id,
-                date_column_name="Date",
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if df.empty:
+            matrix = self._timesheet_matrix(sheet_id, start_date, end_date)
+            if not matrix.staff_rows:
                 print(f"No timesheet entries found for period {start_date} to {end_date}")
                 return 0.0
 
             user_full_name = f"{user.first_name} {user.last_name}".strip()
-            user_rows = df[df['Staff member'].str.strip() == user_full_name]
-
-            if user_rows.empty:
+            if not matrix.has_staff(user_full_name):
                 print(f"No timesheet entries found for user: {user_full_name} in the period.")
                 return 0.0
 
-            total_minutes = pd.to_numeric(user_rows['Payable time (mins)'], errors='coerce').fillna(0).sum()
-            total_hours = total_minutes / 60.0
-            print(f"Found {len(user_rows)} entries for {user_full_name}: {total_hours:.2f} hours")
+            total_hours = matrix.total_minutes(user_full_name, start_date, end_date) / 60.0
+            print(f"Found {total_hours:.2f} hours for {user_full_name}")
             return round(total_hours, 2)
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error fetching sheet data: {str(e)}")
             return 0.0
 
     def _get_user_daily_hours_from_sheet(self, sheet_id, user, start_date, end_date):
-        # UPDATED: Switched to the efficient date range query.
         """
         Fetch user hours from Google Sheet broken down by day.
         """
         try:
-            df = read_sheet_by_date_range(
-                sheet_id=sheet_id,
-                date_column_name="Date",
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if df.empty:
-                return {}
-
+            matrix = self._timesheet_matrix(sheet_id, start_date, end_date)
             user_full_name = f"{user.first_name} {user.last_name}".strip()
-            user_rows = df[df['Staff member'].str.strip() == user_full_name].copy()
 
-            if user_rows.empty:
-                return {}
-
-            user_rows['DateOnly'] = pd.to_datetime(user_rows['Date']).dt.date
-            user_rows['PayableMinutes'] = pd.to_numeric(user_rows['Payable time (mins)'], errors='coerce').fillna(0)
-
-            daily_minutes = user_rows.groupby('DateOnly')['PayableMinutes'].sum()
-            daily_hours = (daily_minutes / 60.0).round(2).to_dict()
-
-            print(f"Found daily hours for {user_full_name}: {daily_hours}")
+            daily_hours = {
+                date: round(minutes / 60.0, 2)
+                for date, minutes in matrix.daily_minutes(user_full_name, start_date, end_date).items()
+            }
+            if daily_hours:
+                print(f"Found daily hours for {user_full_name}: {daily_hours}")
             return daily_hours
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error fetching sheet data: {str(e)}")
             return {}
@@ -592,7 +801,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
         Extract commission data for a specific practitioner from compensation sheet.
         """
         try:
-            df = read_sheet_by_date_range(
+            df = self._read_sheet_by_date_range(
                 sheet_id=compensation_sheet_id,
                 date_column_name="Invoice Date",
                 start_date=start_date,
@@ -612,200 +821,182 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 print(f"No compensation data found for {user_full_name} in period.")
                 return None
 
-            adjusted_total = pd.to_numeric(period_rows['Adjusted Total'], errors='coerce').fillna(0).sum()
-            tax_gst = pd.to_numeric(period_rows['Tax'], errors='coerce').fillna(0).sum()
-
-            invoice_data = []
-            for _, row in period_rows.iterrows():
-                invoice_data.append({
-                    'invoice_date': pd.to_datetime(row['Invoice Date']).date() if pd.notna(
-                        row['Invoice Date']) else None,
-                    'invoice_number': self._extract_base_invoice_number(row.get('Invoice #', '')),
-                    'patient_name': str(row.get('Patient', '')).strip(),
-                    'adjusted_total': pd.to_numeric(row.get('Adjusted Total', 0), errors='coerce') or 0
-                })
-
-            return {
-                'adjusted_total': float(adjusted_total),
-                'tax_gst': float(tax_gst),
-                'invoice_data': invoice_data
-            }
+            return self._commission_data_from_rows(compensation_sheet_id, period_rows)
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error fetching commission data: {str(e)}")
             return None
 
-    def _calculate_pos_fees_for_practitioner(self, invoice_data, clinic_spreadsheet):
+    def _commission_data_from_rows(self, compensation_sheet_id, period_rows):
+        """Totals and per invoice details of one practitioner's compensation sheet rows"""
+        adjusted_total_cents = series_to_cents(period_rows['Adjusted Total'])
+        tax_gst_cents = sum_cents(period_rows['Tax'])
+
+        invoice_dates = self._parse_sheet_dates(compensation_sheet_id, 'Invoice Date', period_rows['Invoice Date'])
+
+        invoice_data = []
+        for position, (index, row) in enumerate(period_rows.iterrows()):
+            invoice_data.append({
+                'invoice_date': invoice_dates[index].date() if pd.notna(invoice_dates[index]) else None,
+                'invoice_number': self._extract_base_invoice_number(row.get('Invoice #', '')),
+                'patient_name': str(row.get('Patient', '')).strip(),
+                'adjusted_total': cents_to_float(adjusted_total_cents[position])
+            })
+
+        return {
+            'adjusted_total': cents_to_float(adjusted_total_cents.sum()),
+            'tax_gst': cents_to_float(tax_gst_cents),
+            'invoice_data': invoice_data
+        }
+
+    def _calculate_pos_fees_for_practitioner(self, invoice_data, clinic_spreadsheet, pos_fee_index=None):
         """
         Calculate total POS fees for a practitioner using the matching algorithm.
-        UPDATED: Fixed date parsing warnings and improved matching logic
+        Pass pos_fee_index (_build_pos_fee_index) to match several practitioners against one read of the sheets.
         """
         try:
             if not invoice_data:
                 print("No invoice data provided for POS fee calculation")
                 return 0.0
 
-            transaction_sheet_id = clinic_spreadsheet.transaction_report_sheet_id
-            payment_sheet_id = clinic_spreadsheet.payment_transaction_sheet_id
-
-            if not all([transaction_sheet_id, payment_sheet_id]):
-                print("Missing required sheet IDs for POS fee calculation")
+            if pos_fee_index is None:
+                invoice_dates = [item['invoice_date'] for item in invoice_data if item['invoice_date']]
+                pos_fee_index = self._build_pos_fee_index(clinic_spreadsheet, invoice_dates)
+            if not pos_fee_index:
                 return 0.0
 
-            # Find the date range needed for the query
-            invoice_dates = {item['invoice_date'] for item in invoice_data if item['invoice_date']}
-            if not invoice_dates:
-                print("No valid invoice dates found in invoice data")
-                return 0.0
-            min_date, max_date = min(invoice_dates), max(invoice_dates)
-
-            print(f"Searching for POS fees in date range: {min_date} to {max_date}")
             print(f"Processing {len(invoice_data)} invoices for POS fee matching")
+            return self._match_pos_fees(invoice_data, pos_fee_index)
 
-            # Make one efficient call for each sheet to get all potentially relevant data
-            transaction_df = read_sheet_by_date_range(transaction_sheet_id, "Payment Date", min_date, max_date)
-            payment_df = read_sheet_by_date_range(payment_sheet_id, "Date", min_date, max_date)
+        except GoogleSheetsUnavailable:
+            raise
+        except Exception as e:
+            print(f"❌ Error calculating POS fees: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return 0.0
 
-            if transaction_df.empty:
-                print("No transaction data found in the specified date range")
-                return 0.0
-            if payment_df.empty:
-                print("No payment data found in the specified date range")
-                return 0.0
+    def _build_pos_fee_index(self, clinic_spreadsheet, invoice_dates):
+        """
+        Reads the transaction and payment sheets once for the range of invoice_dates and keys their rows by date:
+        {date: (Jane Payments transactions of that day, payments of that day)}. Empty when there is nothing to match.
+        """
+        transaction_sheet_id = clinic_spreadsheet.transaction_report_sheet_id
+        payment_sheet_id = clinic_spreadsheet.payment_transaction_sheet_id
 
-            print(f"Found {len(transaction_df)} transaction records and {len(payment_df)} payment records")
+        if not all([transaction_sheet_id, payment_sheet_id]):
+            print("Missing required sheet IDs for POS fee calculation")
+            return {}
 
-            # UPDATED: More robust date parsing with multiple format attempts
-            def safe_date_parse(df, column_name):
-                print(f"Parsing dates in column '{column_name}'...")
+        # Find the date range needed for the query
+        if not invoice_dates:
+            print("No valid invoice dates found in invoice data")
+            return {}
+        min_date, max_date = min(invoice_dates), max(invoice_dates)
 
-                # First, try to detect if dates are already datetime objects
-                if pd.api.types.is_datetime64_any_dtype(df[column_name]):
-                    return df[column_name]
+        print(f"Searching for POS fees in date range: {min_date} to {max_date}")
 
-                # Try multiple date formats in order of likelihood
-                date_formats = ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%m-%d-%Y', '%d-%m-%Y']
+        # Make one efficient call for each sheet to get all potentially relevant data
+        transaction_df = self._read_sheet_by_date_range(transaction_sheet_id, "Payment Date", min_date, max_date)
+        payment_df = self._read_sheet_by_date_range(payment_sheet_id, "Date", min_date, max_date)
 
-                for fmt in date_formats:
-                    try:
-                        parsed_dates = pd.to_datetime(df[column_name], format=fmt, errors='coerce')
-                        valid_count = parsed_dates.notna().sum()
-                        if valid_count > len(df) * 0.5:  # If more than 50% parse successfully
-                            print(f"Successfully parsed {valid_count}/{len(df)} dates using format {fmt}")
-                            return parsed_dates
-                    except Exception as e:
-                        continue
+        if transaction_df.empty:
+            print("No transaction data found in the specified date range")
+            return {}
+        if payment_df.empty:
+            print("No payment data found in the specified date range")
+            return {}
 
-                # Fallback to pandas auto-inference
-                print("Falling back to pandas auto-inference for date parsing...")
-                try:
-                    return pd.to_datetime(df[column_name], infer_datetime_format=True, errors='coerce')
-                except Exception as e:
-                    print(f"Date parsing failed: {e}")
-                    return pd.to_datetime(df[column_name], errors='coerce')
+        print(f"Found {len(transaction_df)} transaction records and {len(payment_df)} payment records")
 
-            # Parse dates with improved logic
-            transaction_df['Payment Date'] = safe_date_parse(transaction_df, 'Payment Date')
-            payment_df['Date'] = safe_date_parse(payment_df, 'Date')
+        # Parse dates with the formats detected when the sheets were uploaded, or detect them now for older sheets
+        transaction_df['Payment Date'] = self._parse_sheet_dates(transaction_sheet_id, 'Payment Date', transaction_df['Payment Date'], detect=True)
+        payment_df['Date'] = self._parse_sheet_dates(payment_sheet_id, 'Date', payment_df['Date'], detect=True)
 
-            total_pos_fees = 0.0
-            matched_invoices = 0
+        # Only card payments through Jane carry a POS fee, and the charge is compared rounded to the cent
+        transaction_df = transaction_df[
+            transaction_df['Payment Method'].str.contains('Jane Payments', case=False, na=False)]
+        payment_df = payment_df.assign(_charge=series_to_cents(payment_df['Customer Charge']))
 
-            for invoice_info in invoice_data:
-                invoice_date = invoice_info['invoice_date']
-                base_invoice_number = invoice_info['invoice_number']
-                patient_name = invoice_info['patient_name']
-                invoice_amount = invoice_info.get('adjusted_total', 0)
+        payments_by_date = dict(tuple(payment_df.groupby(payment_df['Date'].dt.date)))
+        return {
+            date: (day_transactions, payments_by_date[date])
+            for date, day_transactions in transaction_df.groupby(transaction_df['Payment Date'].dt.date)
+            if date in payments_by_date
+        }
 
-                if not all([invoice_date, base_invoice_number, patient_name]):
-                    print(
-                        f"Skipping invoice with missing data: date={invoice_date}, number={base_invoice_number}, patient={patient_name}")
-                    continue
+    def _match_pos_fees(self, invoice_data, pos_fee_index):
+        """Sums the Jane Payments fees of the payments matching each invoice, only looking at the invoice's day"""
+        total_pos_fees = 0  # cents
+        matched_invoices = 0
 
-                print(
-                    f"Searching POS fees for: {patient_name}, Invoice {base_invoice_number}, Date {invoice_date}, Amount ${invoice_amount}")
-
-                # Find matching transactions
-                matching_transactions = transaction_df[
-                    (transaction_df['Payment Date'].dt.date == invoice_date) &
-                    (transaction_df['Payer'].str.contains(patient_name, case=False, na=False)) &
-                    (transaction_df['Payment Method'].str.contains('Jane Payments', case=False, na=False)) &
-                    (transaction_df['Applied To'].str.contains(base_invoice_number, na=False))
-                    ]
-
-                if matching_transactions.empty:
-                    print(f"No matching transactions found for {patient_name} - {base_invoice_number}")
-                    continue
+        for invoice_info in invoice_data:
+            invoice_date = invoice_info['invoice_date']
+            base_invoice_number = invoice_info['invoice_number']
+            patient_name = invoice_info['patient_name']
 
-                print(f"Found {len(matching_transactions)} matching transaction(s)")
+            if not all([invoice_date, base_invoice_number, patient_name]):
+                print(
+                    f"Skipping invoice with missing data: date={invoice_date}, number={base_invoice_number}, patient={patient_name}")
+                continue
 
-                for _, transaction in matching_transactions.iterrows():
-                    transaction_amount = pd.to_numeric(transaction.get('Amount', 0), errors='coerce') or 0
-                    print(f"  Transaction amount: ${transaction_amount}")
+            if invoice_date not in pos_fee_index:
+                continue
+            day_transactions, day_payments = pos_fee_index[invoice_date]
 
-                    # Find matching payments
-                    matching_payments = payment_df[
-                        (payment_df['Date'].dt.date == invoice_date) &
-                        (payment_df['Customer'].str.contains(patient_name, case=False, na=False)) &
-                        (pd.to_numeric(payment_df['Customer Charge'], errors='coerce').fillna(0).round(2) == round(
-                            float(transaction_amount), 2))
-                        ]
+            # Find matching transactions
+            matching_transactions = day_transactions[
+                (day_transactions['Payer'].str.contains(patient_name, case=False, na=False)) &
+                (day_transactions['Applied To'].str.contains(base_invoice_number, na=False))
+                ]
 
-                    if matching_payments.empty:
-                        print(f"  No matching payments found for transaction amount ${transaction_amount}")
-                        continue
+            if matching_transactions.empty:
+                continue
 
-                    print(f"  Found {len(matching_payments)} matching payment(s)")
+            patient_payments = day_payments[day_payments['Customer'].str.contains(patient_name, case=False, na=False)]
 
-                    for _, payment in matching_payments.iterrows():
-                        jane_fee = pd.to_numeric(payment.get('Jane Payments Fee', 0), errors='coerce') or 0
-                        if jane_fee > 0:
-                            total_pos_fees += float(jane_fee)
-                            matched_invoices += 1
-                            print(f"  ✅ POS Fee found: ${jane_fee}")
-                        else:
-                            print(f"  No POS fee in this payment record")
+            for transaction_amount in series_to_cents(matching_transactions.get('Amount', pd.Series(dtype=float))):
+                # Find matching payments
+                matching_payments = patient_payments[patient_payments['_charge'] == transaction_amount]
 
-            print(f"✅ Total POS fees calculated: ${total_pos_fees} from {matched_invoices} matched invoices")
-            return total_pos_fees
+                for jane_fee in series_to_cents(matching_payments.get('Jane Payments Fee', pd.Series(dtype=float))):
+                    if jane_fee > 0:
+                        total_pos_fees += int(jane_fee)
+                        matched_invoices += 1
 
-        except Exception as e:
-            print(f"❌ Error calculating POS fees: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return 0.0
+        print(f"✅ Total POS fees calculated: ${cents_to_float(total_pos_fees)} from {matched_invoices} matched invoices")
+        return cents_to_float(total_pos_fees)
 
-    def _calculate_vacation_pay_only(self, gross_income, site_settings):
+    def _calculate_vacation_pay_only(self, gross_cents, site_settings):
         """
-        Calculate vacation pay only (no overtime for commission employees)
+        Calculate vacation pay only (no overtime for commission employees), in cents
         """
         try:
-            gross_income = Decimal(str(gross_income))
-            vacation_rate = Decimal(str(site_settings.vacation_pay_rate)) / 100
-            vacation_pay = gross_income * vacation_rate
-            return float(vacation_pay)
+            return percent_of(gross_cents, site_settings.vacation_pay_rate)
         except Exception as e:
             print(f"Error calculating vacation pay: {str(e)}")
-            return 0.0
+            return 0
 
     def _calculate_commission_payroll(self, user, user_profile, commission_data, pos_fees, site_settings, start_date,
                                       end_date, period_days):
         """
         Calculate payroll for commission-based roles
         Updated to apply commission rate before GST and treat GST as deduction
+        All amounts are whole cents until they go into payroll_data
         """
         try:
             payment_detail = user_profile.payment_detail
 
             # Base calculations
-            adjusted_total = Decimal(str(commission_data['adjusted_total']))
-            tax_gst = Decimal(str(commission_data['tax_gst']))
-            pos_fees_decimal = Decimal(str(pos_fees))
+            adjusted_total = to_cents(commission_data['adjusted_total'])
+            tax_gst = to_cents(commission_data['tax_gst'])
+            pos_fees_cents = to_cents(pos_fees)
 
             # UPDATED: Apply commission rate to adjusted_total (before GST)
-            commission_rate_decimal = Decimal(str(payment_detail.commission_rate))  # Already a decimal
-            commission_income = adjusted_total * commission_rate_decimal  # What practitioner keeps from pre-GST amount
-            commission_deduction = adjusted_total * (
-                        Decimal('1') - commission_rate_decimal)  # What company keeps from pre-GST amount
+            # What practitioner keeps from pre-GST amount, the company keeps the rest so the two add up to the cent
+            commission_income = percent_of(adjusted_total, Decimal(str(payment_detail.commission_rate)) * 100)
+            commission_deduction = adjusted_total - commission_income
 
             # Total gross income still includes GST for reporting purposes
             gross_income = adjusted_total + tax_gst
@@ -813,7 +1004,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
             if isinstance(payment_detail, CommissionContractor):
                 # Contractor: Simple calculation, no tax deductions
                 # UPDATED: Net payment = commission income - POS fees - GST
-                net_payment = commission_income - pos_fees_decimal - tax_gst
+                net_payment = commission_income - pos_fees_cents - tax_gst
+                ytd = self._year_to_date(user.id, end_date.year)
 
                 payroll_data = {
                     'user_id': user.id,
@@ -823,12 +1015,12 @@ class PayrollViewSet(viewsets.ModelViewSet):
                     'role_type': 'Commission Contractor',
                     'commission_rate': float(payment_detail.commission_rate),
                     'earnings': {
-                        'gross_income': float(gross_income),
-                        'adjusted_total': float(adjusted_total),
-                        'tax_gst': float(tax_gst),
-                        'commission_earned': float(commission_income),
-                        'pos_fees': float(pos_fees_decimal),
-                        'salary': float(commission_income),
+                        'gross_income': cents_to_float(gross_income),
+                        'adjusted_total': cents_to_float(adjusted_total),
+                        'tax_gst': cents_to_float(tax_gst),
+                        'commission_earned': cents_to_float(commission_income),
+                        'pos_fees': cents_to_float(pos_fees_cents),
+                        'salary': cents_to_float(commission_income),
                         # For template compatibility - commission income before deductions
                     },
                     'deductions': {
@@ -836,47 +1028,48 @@ class PayrollViewSet(viewsets.ModelViewSet):
                         'provincial_tax': 0.0,
                         'cpp': 0.0,
                         'ei': 0.0,
-                        'commission_deduction': float(commission_deduction),  # Company's share from pre-GST
-                        'pos_fees': float(pos_fees_decimal),
-                        'gst_deduction': float(tax_gst),  # UPDATED: GST as separate deduction
+                        'commission_deduction': cents_to_float(commission_deduction),  # Company's share from pre-GST
+                        'pos_fees': cents_to_float(pos_fees_cents),
+                        'gst_deduction': cents_to_float(tax_gst),  # UPDATED: GST as separate deduction
                     },
                     'totals': {
-                        'total_earnings': float(gross_income),  # UPDATED: Show gross income in totals
-                        'total_deductions': float(commission_deduction + pos_fees_decimal + tax_gst),
+                        'total_earnings': cents_to_float(gross_income),  # UPDATED: Show gross income in totals
+                        'total_deductions': cents_to_float(commission_deduction + pos_fees_cents + tax_gst),
                         # UPDATED: Include commission deduction
-                        'net_payment': float(net_payment),
+                        'net_payment': cents_to_float(net_payment),
                     },
                     'ytd_amounts': {
-                        'earnings': float(user_profile.ytd_pay) + float(net_payment),
-                        'deductions': float(user_profile.ytd_deduction),
+                        'earnings': cents_to_float(to_cents(ytd.earnings) + net_payment),
+                        'deductions': float(ytd.deductions),
                     },
                     'breakdown': {
                         'commission_rate': float(payment_detail.commission_rate),
-                        'gross_before_fees': float(gross_income),
-                        'commission_income': float(commission_income),
-                        'commission_deduction': float(commission_deduction),
-                        'gst_amount': float(tax_gst),  # UPDATED: Track GST separately
+                        'gross_before_fees': cents_to_float(gross_income),
+                        'commission_income': cents_to_float(commission_income),
+                        'commission_deduction': cents_to_float(commission_deduction),
+                        'gst_amount': cents_to_float(tax_gst),  # UPDATED: Track GST separately
                     }
                 }
 
             elif isinstance(payment_detail, CommissionEmployee):
                 # Employee: Add vacation pay and calculate tax deductions
                 # UPDATED: Calculate vacation pay on commission income (not gross)
-                vacation_pay = self._calculate_vacation_pay_only(float(commission_income), site_settings)
-                vacation_pay_decimal = Decimal(str(vacation_pay))
+                vacation_pay = self._calculate_vacation_pay_only(commission_income, site_settings)
 
                 # UPDATED: Total taxable income = commission income + vacation pay - pos fees - GST
-                total_before_tax_deductions = commission_income + vacation_pay_decimal - pos_fees_decimal - tax_gst
+                total_before_tax_deductions = commission_income + vacation_pay - pos_fees_cents - tax_gst
 
                 # Calculate tax deductions on the taxable amount
                 deductions_result = self.calculate_deductions(
-                    total_taxable_income=float(total_before_tax_deductions),
+                    total_taxable_income=cents_to_float(total_before_tax_deductions),
                     period_days=period_days,
                     user_profile=user_profile,
-                    site_settings=site_settings
+                    site_settings=site_settings,
+                    year=end_date.year
                 )
+                tax_deductions = to_cents(deductions_result['total_deductions'])
 
-                net_payment = total_before_tax_deductions - Decimal(str(deductions_result['total_deductions']))
+                net_payment = total_before_tax_deductions - tax_deductions
 
                 payroll_data = {
                     'user_id': user.id,
@@ -886,29 +1079,31 @@ class PayrollViewSet(viewsets.ModelViewSet):
                     'role_type': 'Commission Employee',
                     'commission_rate': float(payment_detail.commission_rate),
                     'earnings': {
-                        'gross_income': float(gross_income),
-                        'adjusted_total': float(adjusted_total),
-                        'tax_gst': float(tax_gst),
-                        'commission_earned': float(commission_income),
-                        'vacation_pay': vacation_pay,
-                        'pos_fees': float(pos_fees_decimal),
-                        'salary': float(commission_income + vacation_pay_decimal),  # Commission + vacation for template
+                        'gross_income': cents_to_float(gross_income),
+                        'adjusted_total': cents_to_float(adjusted_total),
+                        'tax_gst': cents_to_float(tax_gst),
+                        'commission_earned': cents_to_float(commission_income),
+                        'vacation_pay': cents_to_float(vacation_pay),
+                        'pos_fees': cents_to_float(pos_fees_cents),
+                        # Commission + vacation for template
+                        'salary': cents_to_float(commission_income + vacation_pay),
                     },
                     'deductions': {
                         'federal_tax': deductions_result['deductions']['federal_tax'],
                         'provincial_tax': deductions_result['deductions']['provincial_tax'],
                         'cpp': deductions_result['deductions']['cpp'],
                         'ei': deductions_result['deductions']['ei'],
-                        'commission_deduction': float(commission_deduction),  # Company's share from pre-GST
-                        'pos_fees': float(pos_fees_decimal),
-                        'gst_deduction': float(tax_gst),  # UPDATED: GST as separate deduction
+                        'commission_deduction': cents_to_float(commission_deduction),  # Company's share from pre-GST
+                        'pos_fees': cents_to_float(pos_fees_cents),
+                        'gst_deduction': cents_to_float(tax_gst),  # UPDATED: GST as separate deduction
                     },
                     'totals': {
-                        'total_earnings': float(gross_income + vacation_pay_decimal),  # UPDATED: Gross + vacation
-                        'total_deductions': float(commission_deduction + pos_fees_decimal + tax_gst) +
-                                            deductions_result['total_deductions'],
+                        # UPDATED: Gross + vacation
+                        'total_earnings': cents_to_float(gross_income + vacation_pay),
+                        'total_deductions': cents_to_float(
+                            commission_deduction + pos_fees_cents + tax_gst + tax_deductions),
                         # UPDATED: Include commission deduction
-                        'net_payment': float(net_payment),
+                        'net_payment': cents_to_float(net_payment),
                     },
                     'ytd_amounts': {
                         'earnings': deductions_result['projected_ytd_earnings'],
@@ -916,13 +1111,13 @@ class PayrollViewSet(viewsets.ModelViewSet):
                     },
                     'breakdown': {
                         'commission_rate': float(payment_detail.commission_rate),
-                        'gross_before_fees': float(gross_income),
-                        'vacation_pay': vacation_pay,
+                        'gross_before_fees': cents_to_float(gross_income),
+                        'vacation_pay': cents_to_float(vacation_pay),
                         'cpp_ytd_after': deductions_result['cpp_ytd_after'],
                         'ei_ytd_after': deductions_result['ei_ytd_after'],
-                        'commission_income': float(commission_income),
-                        'commission_deduction': float(commission_deduction),
-                        'gst_amount': float(tax_gst),  # UPDATED: Track GST separately
+                        'commission_income': cents_to_float(commission_income),
+                        'commission_deduction': cents_to_float(commission_deduction),
+                        'gst_amount': cents_to_float(tax_gst),  # UPDATED: Track GST separately
                     }
                 }
 
@@ -1024,6 +1219,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 target_user, period_start, period_end, clinic_spreadsheet, site_settings, payroll_type='AUTO'
             )
 
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error ensuring payroll record exists for {target_user.username}: {str(e)}")
             return None
@@ -1032,8 +1229,12 @@ class PayrollViewSet(viewsets.ModelViewSet):
                                                     site_settings):
         """
         Calculate revenue sharing income from specific users (money coming IN)
+        The target users' payroll records come from the period's resolver, which makes each of them at most once.
         """
         try:
+            base_records = self._revenue_share_resolver(clinic_spreadsheet, period_start, period_end,
+                                                        site_settings).resolve(user_profile.user)
+
             # Query RevenueSharing directly instead of filtering additional_roles
             user_revenue_roles = RevenueSharing.objects.filter(
                 user_profile=user_profile,
@@ -1045,10 +1246,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
             for revenue_role in user_revenue_roles:
                 if revenue_role.target_user:
-                    # Ensure payroll record exists for target user
-                    payroll_record = self._ensure_payroll_record_exists(
-                        revenue_role.target_user, period_start, period_end, clinic_spreadsheet, site_settings
-                    )
+                    # Payroll record of the target user, made from their base earnings if there was none
+                    payroll_record = base_records.get(revenue_role.target_user_id)
 
                     if payroll_record:
                         # Calculate revenue sharing based on their gross income
@@ -1067,7 +1266,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
                         payroll_record.revenue_share_deduction = float(income_amount)
                         payroll_record.total_deductions = float(
                             Decimal(str(payroll_record.total_deductions)) + income_amount)
-                        payroll_record.save()
+                        if self.writes_payroll_records:
+                            payroll_record.save()
 
                         income_details.append({
                             'from_user': revenue_role.target_user.username,
@@ -1081,6 +1281,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
             return total_income, income_details
 
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error calculating revenue sharing income from users: {str(e)}")
             return Decimal('0'), []
@@ -1092,54 +1294,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
         Finds a record based on user, period_start, and period_end.
         """
         try:
-            import uuid
-
-            # Extract data from payroll_data
-            earnings = payroll_data.get('earnings', {})
-            deductions = payroll_data.get('deductions', {})
-            totals = payroll_data.get('totals', {})
-            role_type = payroll_data.get('role_type', '')
-
-            # Calculate net payment and employer contributions
-            net_payment = float(totals.get('net_payment', 0))
-            cpp_er = float(deductions.get('cpp', 0))
-            ei_er = float(deductions.get('ei', 0)) * 1.4 if 'Employee' in role_type else 0.0
-
-            # Determine subtotal_income based on role type
-            is_commission = 'Commission' in role_type or role_type == 'Student'
-            if is_commission:
-                subtotal_income = float(earnings.get('adjusted_total', 0) or earnings.get('gross_income', 0))
-                if earnings.get('tax_gst'):
-                    subtotal_income = float(earnings.get('gross_income', 0)) - float(earnings.get('tax_gst', 0))
-            else:
-                subtotal_income = float(earnings.get('regular_pay', 0) or earnings.get('salary', 0))
-
-            # Prepare the data for the record
-            record_data = {
-                'email': user.email,
-                'clinic': clinic,
-                'role_type': role_type,
-                'subtotal_income': subtotal_income,
-                'hours_worked': float(payroll_data.get('total_hours', 0)),
-                'vacation_pay': float(earnings.get('vacation_pay', 0)),
-                'overtime_pay': float(earnings.get('overtime_pay', 0)),
-                'revenue_share_income': float(earnings.get('revenue_share_income', 0)),
-                'gst': float(earnings.get('tax_gst', 0)),
-                'total_income': float(totals.get('total_earnings', 0)),
-                'commission_deduction': float(deductions.get('commission_deduction', 0)),
-                'pos_fees': float(deductions.get('pos_fees', 0) or earnings.get('pos_fees', 0)),
-                'provincial_income_tax': float(deductions.get('provincial_tax', 0)),
-                'federal_income_tax': float(deductions.get('federal_tax', 0)),
-                'cpp_contrib': float(deductions.get('cpp', 0)),
-                'cpp_er': cpp_er,
-                'ei_contrib': float(deductions.get('ei', 0)),
-                'ei_er': ei_er,
-                'rent': float(deductions.get('rent', 0)),
-                'revenue_share_deduction': float(deductions.get('revenue_share_deduction', 0)),
-                'total_deductions': float(totals.get('total_deductions', 0)),
-                'net_payment': net_payment,
-                'notes': notes,
-            }
+            record_data = self._payroll_record_fields(user, payroll_data, clinic, notes)
 
             # Use update_or_create to find a match or create a new record
             record, created = PayrollRecords.objects.update_or_create(
@@ -1151,7 +1306,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
             # If a new record is created, assign it a unique payroll number
             if created:
-                payroll_number = f"{payroll_type}-{timezone.now().strftime('%Y%m%d')}-{user.id:04d}-{uuid.uuid4().hex[:6].upper()}"
+                payroll_number = self._new_payroll_number(user, payroll_type)
                 record.payroll_number = payroll_number
                 record.save()
                 print(f"Created new PayrollRecords entry: {payroll_number} for {user.username}")
@@ -1164,60 +1319,151 @@ class PayrollViewSet(viewsets.ModelViewSet):
             print(f"Error creating or updating PayrollRecords entry for {user.username}: {str(e)}")
             return None
 
-    def _create_revenue_share_contributions(self, payroll_record, payroll_data):
-        """Helper to create revenue share contribution records"""
-        try:
+    def _payroll_record_fields(self, user, payroll_data, clinic, notes):
+        """PayrollRecords field values for calculated payroll data"""
+        # Extract data from payroll_data
+        earnings = payroll_data.get('earnings', {})
+        deductions = payroll_data.get('deductions', {})
+        totals = payroll_data.get('totals', {})
+        role_type = payroll_data.get('role_type', '')
+
+        # Calculate net payment and employer contributions, money is stored rounded to the cent
+        net_payment = money(totals.get('net_payment', 0))
+        cpp_er = money(deductions.get('cpp', 0))
+        ei_er = from_cents(percent_of(to_cents(deductions.get('ei', 0)), 140)) if 'Employee' in role_type else money(0)
+
+        # Determine subtotal_income based on role type
+        is_commission = 'Commission' in role_type or role_type == 'Student'
+        if is_commission:
+            subtotal_income = money(earnings.get('adjusted_total', 0) or earnings.get('gross_income', 0))
+            if earnings.get('tax_gst'):
+                subtotal_income = from_cents(to_cents(earnings.get('gross_income', 0)) - to_cents(earnings.get('tax_gst', 0)))
+        else:
+            subtotal_income = money(earnings.get('regular_pay', 0) or earnings.get('salary', 0))
+
+        # Prepare the data for the record
+        record_data = {
+            'email': user.email,
+            'clinic': clinic,
+            'role_type': role_type,
+            'subtotal_income': subtotal_income,
+            'hours_worked': float(payroll_data.get('total_hours', 0)),
+            'vacation_pay': money(earnings.get('vacation_pay', 0)),
+            'overtime_pay': money(earnings.get('overtime_pay', 0)),
+            'revenue_share_income': money(earnings.get('revenue_share_income', 0)),
+            'gst': money(earnings.get('tax_gst', 0)),
+            'total_income': money(totals.get('total_earnings', 0)),
+            'commission_deduction': money(deductions.get('commission_deduction', 0)),
+            'pos_fees': money(deductions.get('pos_fees', 0) or earnings.get('pos_fees', 0)),
+            'provincial_income_tax': money(deductions.get('provincial_tax', 0)),
+            'federal_income_tax': money(deductions.get('federal_tax', 0)),
+            'cpp_contrib': money(deductions.get('cpp', 0)),
+            'cpp_er': cpp_er,
+            'ei_contrib': money(deductions.get('ei', 0)),
+            'ei_er': ei_er,
+            'rent': money(deductions.get('rent', 0)),
+            'revenue_share_deduction': money(deductions.get('revenue_share_deduction', 0)),
+            'total_deductions': money(totals.get('total_deductions', 0)),
+            'net_payment': net_payment,
+            'notes': notes,
+        }
+        return record_data
+
+    def _new_payroll_number(self, user, payroll_type):
+        return f"{payroll_type}-{timezone.now().strftime('%Y%m%d')}-{user.id:04d}-{uuid.uuid4().hex[:6].upper()}"
+
+    def _bulk_upsert_payroll_records(self, payroll_rows, period_start, period_end, clinic, payroll_type, notes='',
+                                     sent_at=None):
+        """
+        Creates or updates the PayrollRecords of many users for one period in a few queries.
+        payroll_rows is a list of (user, payroll_data). notes=None takes each payroll's own notes.
+        Returns {user id: record}.
+        """
+        existing = {
+            record.user_id: record
+            for record in PayrollRecords.objects.filter(
+                user__in=[user for user, _ in payroll_rows], period_start=period_start, period_end=period_end)
+        }
+
+        to_create, to_update = [], []
+        for user, payroll_data in payroll_rows:
+            record_data = self._payroll_record_fields(
+                user, payroll_data, clinic, payroll_data.get('notes', '') if notes is None else notes)
+            if sent_at:
+                record_data['sent_at'] = sent_at
+            record = existing.get(user.id)
+            if record is None:
+                to_create.append(PayrollRecords(
+                    user=user, period_start=period_start, period_end=period_end,
+                    payroll_number=self._new_payroll_number(user, payroll_type), **record_data
+                ))
+            else:
+                for field, value in record_data.items():
+                    setattr(record, field, value)
+                to_update.append(record)
+
+        with transaction.atomic():
+            PayrollRecords.objects.bulk_create(to_create)
+            if to_update:
+                PayrollRecords.objects.bulk_update(to_update, list(record_data.keys()))
+
+        print(f"{payroll_type} payroll records: {len(to_create)} created, {len(to_update)} updated")
+        return {**existing, **{record.user_id: record for record in to_create + to_update}}
+
+    def _replace_revenue_share_contributions(self, record_payrolls):
+        """
+        Writes the revenue share contribution rows and deduction payee of (payroll record, payroll_data) pairs,
+        replacing whatever the records had, so sending a payroll again never duplicates them.
+        Usernames are resolved in one query and the rows written with one delete and one bulk_create.
+        Errors are raised: it runs inside the send transaction, which must not commit records without their rows.
+        """
+        rows = []  # (payroll record, username, amount, contribution type)
+        payees = {}  # payroll record id -> username, when there's only one recipient
+        for payroll_record, payroll_data in record_payrolls:
             revenue_contributions = payroll_data.get('revenue_sharing_contributions', {})
 
             # Create contribution records for revenue sharing income
-            if revenue_contributions.get('income_contributors'):
-                for contributor in revenue_contributions['income_contributors']:
-                    if contributor['user_name'] != 'All Students Combined':
-                        try:
-                            contributing_user = User.objects.get(username=contributor['user_name'])
-                            RevenueShareContribution.objects.create(
-                                payroll_record=payroll_record,
-                                contributing_user=contributing_user,
-                                amount_contributed=float(contributor['amount']),
-                                contribution_type=contributor['type']
-                            )
-                        except User.DoesNotExist:
-                            print(f"Warning: Contributing user '{contributor['user_name']}' not found")
-                    else:
-                        # Handle student contributions
-                        if contributor.get('student_breakdown'):
-                            total_student_net = sum(float(s['net']) for s in contributor['student_breakdown'])
-                            for student_detail in contributor['student_breakdown']:
-                                try:
-                                    student_user = User.objects.get(username=student_detail['student'])
-                                    if total_student_net > 0:
-                                        student_share = float(contributor['amount']) * (
-                                                float(student_detail['net']) / total_student_net)
-                                    else:
-                                        student_share = 0.0
-
-                                    RevenueShareContribution.objects.create(
-                                        payroll_record=payroll_record,
-                                        contributing_user=student_user,
-                                        amount_contributed=student_share,
-                                        contribution_type='student_share'
-                                    )
-                                except User.DoesNotExist:
-                                    print(f"Warning: Student user '{student_detail['student']}' not found")
+            for contributor in revenue_contributions.get('income_contributors') or []:
+                if contributor['user_name'] != 'All Students Combined':
+                    rows.append((payroll_record, contributor['user_name'], money(contributor['amount']),
+                                 contributor['type']))
+                elif contributor.get('student_breakdown'):
+                    # Handle student contributions, split in cents by each student's share of the students' net,
+                    # so the rows add up to the contributor amount exactly
+                    student_breakdown = contributor['student_breakdown']
+                    student_shares = split_cents(to_cents(contributor['amount']),
+                                                 [to_cents(s['net']) for s in student_breakdown])
+                    for student_detail, student_share in zip(student_breakdown, student_shares):
+                        rows.append((payroll_record, student_detail['student'], from_cents(student_share),
+                                     'student_share'))
 
             # Set revenue_share_deduction_payee if there's only one recipient
-            if revenue_contributions.get('deduction_recipients') and len(
-                    revenue_contributions['deduction_recipients']) == 1:
-                recipient_name = revenue_contributions['deduction_recipients'][0]['user_name']
-                try:
-                    recipient_user = User.objects.get(username=recipient_name)
-                    payroll_record.revenue_share_deduction_payee = recipient_user
-                    payroll_record.save()
-                except User.DoesNotExist:
-                    print(f"Warning: Deduction recipient '{recipient_name}' not found")
-
-        except Exception as e:
-            print(f"Error creating revenue share contributions: {str(e)}")
+            recipients = revenue_contributions.get('deduction_recipients') or []
+            payees[payroll_record.id] = recipients[0]['user_name'] if len(recipients) == 1 else None
+
+        usernames = {row[1] for row in rows} | {name for name in payees.values() if name}
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        for username in usernames - users.keys():
+            print(f"Warning: Revenue sharing user '{username}' not found")
+
+        with transaction.atomic():
+            RevenueShareContribution.objects.filter(payroll_record__in=list(payees)).delete()
+            RevenueShareContribution.objects.bulk_create([
+                RevenueShareContribution(payroll_record=payroll_record, contributing_user=users[username],
+                                         amount_contributed=amount, contribution_type=contribution_type)
+                for payroll_record, username, amount, contribution_type in rows if username in users
+            ])
+
+            # One update per payee for all the records paying them
+            records_by_payee = {}
+            for record_id, username in payees.items():
+                records_by_payee.setdefault(users.get(username) if username else None, []).append(record_id)
+            for payee, record_ids in records_by_payee.items():
+                PayrollRecords.objects.filter(id__in=record_ids).update(revenue_share_deduction_payee=payee)
+
+        for payroll_record, _ in record_payrolls:
+            username = payees[payroll_record.id]
+            payroll_record.revenue_share_deduction_payee = users.get(username) if username else None
 
     def _calculate_revenue_sharing_income_from_students(self, user_profile, period_start, period_end,
                                                         clinic_spreadsheet):
@@ -1240,68 +1486,64 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 payment_detail__polymorphic_ctype__model='student'
             ).select_related('user')
 
-            if not student_user_profiles.exists():
+            compensation_sheet_id = clinic_spreadsheet.compensation_sales_sheet_id
+            if not student_user_profiles.exists() or not compensation_sheet_id:
                 return Decimal('0'), []
 
+            # One read of the compensation sheet, grouped by practitioner, for every student at once
+            df = self._read_sheet_by_date_range(
+                sheet_id=compensation_sheet_id,
+                date_column_name="Invoice Date",
+                start_date=period_start,
+                end_date=period_end
+            )
+            if df.empty:
+                return Decimal('0'), []
+
+            practitioners = df['Practitioner'].map(self._normalize_practitioner_name).str.lower()
+            rows_by_practitioner = dict(tuple(df.groupby(practitioners)))
+
+            student_commission = []
+            for student_profile in student_user_profiles:
+                student_user = student_profile.user
+                student_full_name = f"{student_user.first_name} {student_user.last_name}".strip().lower()
+                if student_full_name in rows_by_practitioner:
+                    student_commission.append((student_user, self._commission_data_from_rows(
+                        compensation_sheet_id, rows_by_practitioner[student_full_name])))
+
+            # One read of the transaction and payment sheets, matched against every student's invoices
+            pos_fee_index = self._build_pos_fee_index(clinic_spreadsheet, [
+                item['invoice_date'] for _, commission_data in student_commission
+                for item in commission_data['invoice_data'] if item['invoice_date']
+            ])
+
             total_student_net = Decimal('0')
             student_details = []
 
             # Calculate net income for each student as if they were commission contractors with 100% rate
-            for student_profile in student_user_profiles:
-                student_user = student_profile.user
+            for student_user, commission_data in student_commission:
+                pos_fees = self._calculate_pos_fees_for_practitioner(
+                    commission_data['invoice_data'], clinic_spreadsheet, pos_fee_index
+                )
 
-                try:
-                    # Get commission data for this student
-                    compensation_sheet_id = clinic_spreadsheet.compensation_sales_sheet_id
-                    if not compensation_sheet_id:
-                        continue
-
-                    commission_data = self._get_commission_data_from_sheet(
-                        compensation_sheet_id, student_user, period_start, period_end
-                    )
-
-                    if not commission_data:
-                        continue
-
-                    # Calculate POS fees
-                    pos_fees = self._calculate_pos_fees_for_practitioner(
-                        commission_data['invoice_data'], clinic_spreadsheet
-                    )
-
-                    # Calculate as if 100% commission rate (students keep 100%, clinic gets 0%)
-                    adjusted_total = Decimal(str(commission_data['adjusted_total']))
-                    tax_gst = Decimal(str(commission_data['tax_gst']))
-                    gross_income = adjusted_total + tax_gst
-                    pos_fees_decimal = Decimal(str(pos_fees))
-
-                    # Student net = gross_income - pos_fees (no commission deduction since rate is 100%)
-                    student_net = gross_income - pos_fees_decimal
-                    total_student_net += student_net
-
-                    student_details.append({
-                        'student': student_user.username,
-                        'gross_income': float(gross_income),
-                        'pos_fees': float(pos_fees_decimal),
-                        'net': float(student_net)
-                    })
-
-                    print(
-                        f"Student calculation: {student_user.username} - Gross: ${gross_income}, POS: ${pos_fees_decimal}, Net: ${student_net}")
-
-                    site_settings = SiteSettings.objects.first()
-                    if not site_settings:
-                        return Response(
-                            {'error': 'Site settings not configured. Please configure tax rates and brackets first.'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    # Create PayrollRecords entry for the student
-                    self._create_payroll_record_for_user(
-                        student_user, period_start, period_end, clinic_spreadsheet, site_settings, payroll_type='STU'
-                    )
-
-                except Exception as student_error:
-                    print(f"Error calculating for student {student_user.username}: {str(student_error)}")
-                    continue
+                # Calculate as if 100% commission rate (students keep 100%, clinic gets 0%)
+                adjusted_total = Decimal(str(commission_data['adjusted_total']))
+                tax_gst = Decimal(str(commission_data['tax_gst']))
+                gross_income = adjusted_total + tax_gst
+                pos_fees_decimal = Decimal(str(pos_fees))
+
+                # Student net = gross_income - pos_fees (no commission deduction since rate is 100%)
+                student_net = gross_income - pos_fees_decimal
+                total_student_net += student_net
+
+                student_details.append({
+                    'student': student_user.username,
+                    'gross_income': float(gross_income),
+                    'pos_fees': float(pos_fees_decimal),
+                    'net': float(student_net)
+                })
+                print(
+                    f"Student calculation: {student_user.username} - Gross: ${gross_income}, POS: ${pos_fees_decimal}, Net: ${student_net}")
 
             # Apply revenue sharing rate to total student net
             total_revenue_income = Decimal('0')
@@ -1314,6 +1556,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
             return total_revenue_income, student_details
 
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             print(f"Error calculating revenue sharing income from students: {str(e)}")
             return Decimal('0'), []
@@ -1326,9 +1570,10 @@ class PayrollViewSet(viewsets.ModelViewSet):
         """
         try:
             # Check if record already exists to avoid duplicate auto-generation
-            if PayrollRecords.objects.filter(user=target_user, period_start=period_start,
-                                             period_end=period_end).exists():
-                return PayrollRecords.objects.get(user=target_user, period_start=period_start, period_end=period_end)
+            existing_record = PayrollRecords.objects.filter(user=target_user, period_start=period_start,
+                                                            period_end=period_end).first()
+            if existing_record:
+                return existing_record
 
             target_user_profile = target_user.userprofile
             payment_detail = target_user_profile.payment_detail
@@ -1350,6 +1595,13 @@ class PayrollViewSet(viewsets.ModelViewSet):
             if not target_payroll_data:
                 return None
 
+            if not self.writes_payroll_records:
+                # Same record, not saved
+                return PayrollRecords(user=target_user, period_start=period_start, period_end=period_end,
+                                      **self._payroll_record_fields(target_user, target_payroll_data,
+                                                                    clinic_spreadsheet.clinic,
+                                                                    f'{payroll_type}-generated payroll record'))
+
             # Use consolidated function to create/update the record in the database
             return self._create_payroll_record(
                 user=target_user,
@@ -1361,13 +1613,15 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 notes=f'{payroll_type}-generated payroll record'
             )
 
+        except GoogleSheetsUnavailable:
+            raise
         except Exception as e:
             traceback.print_exc()
             print(f"Error creating payroll record for {target_user.username}: {str(e)}")
             return None
 
     def _apply_final_adjustments(self, payroll_data, payment_detail, period_days, user_profile, site_settings,
-                                 rent_deduction, revenue_share_deduction, total_revenue_share_income):
+                                 rent_deduction, revenue_share_deduction, total_revenue_share_income, year):
         """
         ## NEW HELPER METHOD ##
         Applies final adjustments for rent and revenue sharing to the calculated payroll data.
@@ -1376,63 +1630,65 @@ class PayrollViewSet(viewsets.ModelViewSet):
         is_employee = isinstance(payment_detail, (HourlyEmployee, CommissionEmployee))
         is_commission = isinstance(payment_detail, (CommissionEmployee, CommissionContractor))  # Add this check
 
+        # Adjustments are summed in whole cents (see money.py)
+        rent_cents = to_cents(rent_deduction)
+        revenue_share_deduction_cents = to_cents(revenue_share_deduction)
+        revenue_share_income_cents = to_cents(total_revenue_share_income)
+
         if is_employee:
-            original_total_earnings = Decimal(str(payroll_data['totals']['total_earnings']))
-            original_total_deductions = Decimal(str(payroll_data['totals']['total_deductions']))
+            original_total_earnings = to_cents(payroll_data['totals']['total_earnings'])
 
             # If there's revenue sharing income, recalculate taxes on the new, higher total
-            if total_revenue_share_income > 0:
-                new_taxable_income = original_total_earnings + total_revenue_share_income
+            if revenue_share_income_cents > 0:
+                new_taxable_income = original_total_earnings + revenue_share_income_cents
                 new_deductions_result = self.calculate_deductions(
-                    total_taxable_income=float(new_taxable_income),
+                    total_taxable_income=from_cents(new_taxable_income),
                     period_days=period_days,
                     user_profile=user_profile,
-                    site_settings=site_settings
+                    site_settings=site_settings,
+                    year=year
                 )
 
                 # Update payroll with new tax calculations
                 payroll_data['deductions'].update(new_deductions_result['deductions'])
-                payroll_data['totals']['total_earnings'] = float(new_taxable_income)
-                payroll_data['earnings']['revenue_share_income'] = float(total_revenue_share_income)
+                payroll_data['totals']['total_earnings'] = cents_to_float(new_taxable_income)
+                payroll_data['earnings']['revenue_share_income'] = cents_to_float(revenue_share_income_cents)
                 payroll_data['breakdown']['cpp_ytd_after'] = new_deductions_result['cpp_ytd_after']
                 payroll_data['breakdown']['ei_ytd_after'] = new_deductions_result['ei_ytd_after']
 
             # Apply final rent and revenue share deductions
-            final_total_deductions = Decimal(
-                str(payroll_data['totals']['total_deductions'])) + rent_deduction + revenue_share_deduction
-            final_net_payment = Decimal(str(payroll_data['totals']['total_earnings'])) - final_total_deductions
+            final_total_deductions = (to_cents(payroll_data['totals']['total_deductions'])
+                                      + rent_cents + revenue_share_deduction_cents)
+            final_net_payment = to_cents(payroll_data['totals']['total_earnings']) - final_total_deductions
 
-            payroll_data['totals']['total_deductions'] = float(final_total_deductions)
-            payroll_data['totals']['net_payment'] = float(final_net_payment)
+            payroll_data['totals']['total_deductions'] = cents_to_float(final_total_deductions)
+            payroll_data['totals']['net_payment'] = cents_to_float(final_net_payment)
 
         else:  # Contractor logic
-            original_net_payment = Decimal(str(payroll_data['totals']['net_payment']))
-            new_net_payment = original_net_payment - rent_deduction - revenue_share_deduction + total_revenue_share_income
+            original_net_payment = to_cents(payroll_data['totals']['net_payment'])
+            new_net_payment = (original_net_payment - rent_cents - revenue_share_deduction_cents
+                               + revenue_share_income_cents)
 
-            payroll_data['totals']['net_payment'] = float(new_net_payment)
-            payroll_data['totals']['total_deductions'] = float(
-                Decimal(str(payroll_data['totals']['total_deductions'])) + rent_deduction + revenue_share_deduction)
+            payroll_data['totals']['net_payment'] = cents_to_float(new_net_payment)
+            payroll_data['totals']['total_deductions'] = cents_to_float(
+                to_cents(payroll_data['totals']['total_deductions']) + rent_cents + revenue_share_deduction_cents)
 
-            if total_revenue_share_income > 0:
-                payroll_data['totals']['total_earnings'] = float(
-                    Decimal(str(payroll_data['totals']['total_earnings'])) + total_revenue_share_income)
-                payroll_data['earnings']['revenue_share_income'] = float(total_revenue_share_income)
+            if revenue_share_income_cents > 0:
+                payroll_data['totals']['total_earnings'] = cents_to_float(
+                    to_cents(payroll_data['totals']['total_earnings']) + revenue_share_income_cents)
+                payroll_data['earnings']['revenue_share_income'] = cents_to_float(revenue_share_income_cents)
 
         # Add deductions to breakdown for display
-        payroll_data['deductions']['rent'] = float(rent_deduction)
-        payroll_data['deductions']['revenue_share_deduction'] = float(revenue_share_deduction)
+        payroll_data['deductions']['rent'] = cents_to_float(rent_cents)
+        payroll_data['deductions']['revenue_share_deduction'] = cents_to_float(revenue_share_deduction_cents)
 
         # UPDATED: Fix total_earnings for commission roles to show gross income
         if is_commission and 'gross_income' in payroll_data.get('earnings', {}):
             # For commission roles, ensure total_earnings shows the full gross income (before commission deduction)
             # This may have been overridden during revenue sharing calculations
-            gross_income = Decimal(str(payroll_data['earnings']['gross_income']))
-            if total_revenue_share_income > 0:
-                # If there's revenue sharing income, add it to gross income for total earnings
-                payroll_data['totals']['total_earnings'] = float(
-                    gross_income + Decimal(str(total_revenue_share_income)))
-            else:
-                payroll_data['totals']['total_earnings'] = float(gross_income)
+            # If there's revenue sharing income, add it to gross income for total earnings
+            payroll_data['totals']['total_earnings'] = cents_to_float(
+                to_cents(payroll_data['earnings']['gross_income']) + max(revenue_share_income_cents, 0))
 
         return payroll_data
 
@@ -1455,67 +1711,23 @@ class PayrollViewSet(viewsets.ModelViewSet):
             if clinic_id:
                 clinic = get_object_or_404(Clinic, id=clinic_id)
 
-            # Update YTD amounts
+            # Sending one payroll is a bulk send of one, sending it again replaces it
             try:
-                user_profile = user.userprofile
-                current_earnings = float(payroll_data.get('totals', {}).get('total_earnings', 0))
-                current_deductions = float(payroll_data.get('totals', {}).get('total_deductions', 0))
-
-                user_profile.ytd_pay += current_earnings
-                user_profile.ytd_deduction += current_deductions
-
-                breakdown = payroll_data.get('breakdown', {})
-                if 'cpp_ytd_after' in breakdown:
-                    user_profile.cpp_contrib = float(breakdown['cpp_ytd_after'])
-                if 'ei_ytd_after' in breakdown:
-                    user_profile.ei_contrib = float(breakdown['ei_ytd_after'])
-
-                user_profile.save()
+                result = self._send_payrolls([(user, payroll_data, clinic)], resend=True)[user.id]
             except Exception as e:
                 return Response(
                     {'error': f'Failed to update YTD amounts: {str(e)}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Send email
-            try:
-                self._send_payroll_email(user, payroll_data)
-            except Exception as e:
-                print(f"Email sending failed: {str(e)}")
-
-            # Create PayrollRecords entry using consolidated function
-            try:
-                period_start = datetime.strptime(payroll_data.get('pay_period_start'), '%Y-%m-%d').date()
-                period_end = datetime.strptime(payroll_data.get('pay_period_end'), '%Y-%m-%d').date()
-
-                payroll_record = self._create_payroll_record(
-                    user=user,
-                    payroll_data=payroll_data,
-                    period_start=period_start,
-                    period_end=period_end,
-                    clinic=clinic,
-                    payroll_type='PAY',
-                    notes=payroll_data.get('notes', '')
-                )
-
-                if not payroll_record:
-                    print("Warning: Failed to create PayrollRecords entry")
-
-                # Handle revenue sharing contributions and deduction payee
-                if payroll_record:
-                    self._create_revenue_share_contributions(payroll_record, payroll_data)
-
-            except Exception as record_error:
-                print(f"Error creating PayrollRecords entry: {str(record_error)}")
-
             return Response({
                 'message': 'Payroll sent successfully',
                 'user_id': user.id,
                 'user_name': f"{user.first_name} {user.last_name}".strip() or user.username,
                 'net_payment': payroll_data.get('totals', {}).get('net_payment', 0),
-                'new_ytd_earnings': user_profile.ytd_pay,
-                'new_ytd_deductions': user_profile.ytd_deduction,
-                'sent_at': timezone.now().isoformat()
+                'new_ytd_earnings': result['new_ytd_earnings'],
+                'new_ytd_deductions': result['new_ytd_deductions'],
+                'sent_at': result['sent_at']
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -1524,13 +1736,181 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _send_payroll_email(self, user, payroll_data):
-        """Send payroll email to user using Django template with commission support"""
+    @action(detail=False, methods=['post'])
+    def send_payrolls(self, request):
+        """
+        Send many payrolls at once: {"payrolls": [payroll data with user_id and clinic_id, ...], "resend": false}.
+        Payrolls already sent for their period are skipped unless resend, so a failed run can simply be sent again.
+        """
+        if not (request.user.is_staff or request.user.is_superuser):
+            return Response(
+                {'error': 'You do not have permission to send payroll'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            payrolls = request.data.get('payrolls', [])
+            users = User.objects.in_bulk([payroll_data.get('user_id') for payroll_data in payrolls])
+            clinics = Clinic.objects.in_bulk([payroll_data.get('clinic_id') for payroll_data in payrolls
+                                              if payroll_data.get('clinic_id')])
+
+            missing = [payroll_data.get('user_id') for payroll_data in payrolls if payroll_data.get('user_id') not in users]
+            if missing:
+                return Response({'error': f'Unknown users: {missing}'}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                results = self._send_payrolls([
+                    (users[payroll_data['user_id']], payroll_data, clinics.get(payroll_data.get('clinic_id')))
+                    for payroll_data in payrolls
+                ], resend=bool(request.data.get('resend', False)))
+            except (ValueError, TypeError) as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                'sent': sum(1 for result in results.values() if result['status'] == 'sent'),
+                'already_sent': sum(1 for result in results.values() if result['status'] == 'already_sent'),
+                'email_failures': sum(1 for result in results.values() if result.get('email_error')),
+                'results': list(results.values()),
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            traceback.print_exc()
+            return Response(
+                {'error': f'Failed to send payrolls: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def _send_payrolls(self, payrolls, resend=False):
+        """
+        Posts and emails payrolls, a list of (user, payroll_data, clinic). Returns {user id: result}.
+        In one transaction the period's PayrollRecords are locked, upserted and marked sent, their revenue share
+        contributions written, and the difference to what was already sent for that period posted to the payroll
+        ledger (ledger.py), so sending a payroll twice never counts it twice, even at the same time.
+        Then every payslip goes out over one mail connection.
+        """
+        if len({user.id for user, _, _ in payrolls}) != len(payrolls):
+            raise ValueError('Each user can only be sent one payroll at a time')
+
+        entries = []
+        for user, payroll_data, clinic in payrolls:
+            period_start = datetime.strptime(payroll_data.get('pay_period_start'), '%Y-%m-%d').date()
+            period_end = datetime.strptime(payroll_data.get('pay_period_end'), '%Y-%m-%d').date()
+            entries.append((user, payroll_data, clinic, period_start, period_end))
+
+        with transaction.atomic():
+            # The period's records stay locked until the send commits, so a concurrent send of the same payroll
+            # waits and then sees it as sent. Two sends creating the same record collide on the unique period.
+            previous = {
+                (record.user_id, record.period_start, record.period_end): record
+                for record in PayrollRecords.objects.select_for_update().filter(
+                    user__in=[entry[0] for entry in entries],
+                    period_start__in={entry[3] for entry in entries},
+                    period_end__in={entry[4] for entry in entries},
+                )
+            }
+
+            # What the ledger already holds for the records being sent again, the records' own amounts can change
+            posted = posted_amounts([record.id for record in previous.values() if record.sent_at is not None])
+            nothing_posted = dict.fromkeys(AMOUNT_FIELDS, 0)
+
+            results, to_send, groups, ytd_changes = {}, [], {}, {}
+            for user, payroll_data, clinic, period_start, period_end in entries:
+                record = previous.get((user.id, period_start, period_end))
+                already_sent = record is not None and record.sent_at is not None
+                if already_sent and not resend:
+                    results[user.id] = {'user_id': user.id, 'status': 'already_sent',
+                                        'payroll_number': record.payroll_number,
+                                        'sent_at': record.sent_at.isoformat()}
+                    continue
+
+                # A resend only posts the difference to what was posted before
+                totals = payroll_data.get('totals', {})
+                deductions = payroll_data.get('deductions', {})
+                already_posted = posted.get(record.id, nothing_posted) if already_sent else nothing_posted
+                ytd_changes[user.id] = (period_end.year, 'adjustment' if already_sent else 'payroll', {
+                    'earnings': to_cents(totals.get('total_earnings', 0)) - to_cents(already_posted['earnings']),
+                    'deductions': to_cents(totals.get('total_deductions', 0)) - to_cents(already_posted['deductions']),
+                    'cpp': to_cents(deductions.get('cpp', 0)) - to_cents(already_posted['cpp']),
+                    'ei': to_cents(deductions.get('ei', 0)) - to_cents(already_posted['ei']),
+                })
+                groups.setdefault((period_start, period_end, clinic), []).append((user, payroll_data))
+                to_send.append((user, payroll_data))
+
+            if not to_send:
+                return results
+
+            sent_at = timezone.now()
+            records = {}
+            for (period_start, period_end, clinic), payroll_rows in groups.items():
+                records.update(self._bulk_upsert_payroll_records(
+                    payroll_rows, period_start, period_end, clinic, 'PAY', notes=None, sent_at=sent_at))
+
+            self._replace_revenue_share_contributions(
+                [(records[user.id], payroll_data) for user, payroll_data in to_send])
+
+            post_entries([
+                PayrollLedgerEntry(user_id=user_id, year=year, payroll_record=records[user_id], entry_type=entry_type,
+                                   **{field: from_cents(cents) for field, cents in amounts.items()})
+                for user_id, (year, entry_type, amounts) in ytd_changes.items()
+            ])
+
+        new_ytd = {
+            (row.user_id, row.year): (row.earnings, row.deductions)
+            for row in PayrollYearToDate.objects.filter(user_id__in=ytd_changes,
+                                                        year__in={year for year, _, _ in ytd_changes.values()})
+        }
+        email_errors = self._deliver_payroll_emails(to_send)
+
+        for user, payroll_data in to_send:
+            ytd_pay, ytd_deduction = new_ytd.get((user.id, ytd_changes[user.id][0]), (0, 0))
+            results[user.id] = {
+                'user_id': user.id,
+                'status': 'sent',
+                'payroll_number': records[user.id].payroll_number,
+                'new_ytd_earnings': float(ytd_pay),
+                'new_ytd_deductions': float(ytd_deduction),
+                'sent_at': sent_at.isoformat(),
+                'email_error': email_errors.get(user.id),
+            }
+        return results
+
+    def _deliver_payroll_emails(self, payrolls):
+        """
+        Renders the payslips of (user, payroll_data) pairs and sends them over one mail connection.
+        Each payslip is its own send_messages call: the backends raise at the first failure of a batch without
+        saying which ones went out, and resending a batch would email payslips twice.
+        Returns {user id: error} for the ones that could not be sent, a failure never stops the others.
+        """
+        from django.core.mail import get_connection
+
+        errors, messages = {}, []
+        for user, payroll_data in payrolls:
+            try:
+                messages.append((user, self._payroll_email_message(user, payroll_data)))
+            except Exception as e:
+                print(f"Error preparing payroll email for {user.username}: {str(e)}")
+                errors[user.id] = str(e)
+
+        if not messages:
+            return errors
+
+        with get_connection(fail_silently=False) as connection:
+            for user, message in messages:
+                try:
+                    connection.send_messages([message])
+                    print(f"Payroll email sent to {user.email}")
+                except Exception as e:
+                    print(f"Error sending payroll email to {user.email}: {str(e)}")
+                    errors[user.id] = str(e)
+        return errors
+
+    def _payroll_email_message(self, user, payroll_data):
+        """Payslip email for user rendered from the Django template with commission support (not sent yet)"""
         try:
             if not user.email:
                 raise ValueError(f"User {user.username} does not have an email address configured")
 
-            from django.core.mail import send_mail
+            from django.core.mail import EmailMultiAlternatives
             from django.template.loader import render_to_string
             from django.conf import settings
 
@@ -1644,19 +2024,17 @@ class PayrollViewSet(viewsets.ModelViewSet):
             # Render HTML template
             html_content = render_to_string('payroll_email.html', context)
 
-            # Send HTML-only email
-            send_mail(
+            # HTML-only email
+            message = EmailMultiAlternatives(
                 subject=subject,
-                message='',  # Empty plain text message
+                body='',  # Empty plain text message
                 from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@example.com'),
-                recipient_list=[user.email],
-                fail_silently=False,
-                html_message=html_content,  # HTML version only
+                to=[user.email],
             )
-
-            print(f"Payroll email sent to {user.email}")
+            message.attach_alternative(html_content, 'text/html')  # HTML version only
+            return message
 
         except Exception as e:
-            print(f"Error sending payroll email: {str(e)}")
+            print(f"Error rendering payroll email: {str(e)}")
             raise e
 
@@ -0,0 +1,96 @@
+import hashlib
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Q
+from registration.models import (UserProfile, HourlyEmployee, HourlyContractor, CommissionEmployee,
+                                 CommissionContractor, Student, ProfitSharing, RevenueSharing, HasRent)
+from ..models import SiteSettings, PayrollRecords, RevenueShareContribution, PayrollYearToDate
+from ..services.google_sheets import get_sheet_versions
+from ..services.sheet_registry import REPORT_TITLES
+
+#THIS FILE CACHES CALCULATED PAYROLL PREVIEWS (generate_payroll) UNDER A KEY MADE OF EVERYTHING THE CALCULATION READS:
+#the user, clinic and period, the site settings, the payment roles, names and payroll records of the period of the
+#user and of everyone their revenue sharing involves, the user's year to date totals and the drive version of each
+#source sheet. Changing any of them gives a new key, so nothing is ever invalidated by hand, and sending or previewing
+#someone else's payroll leaves the key alone
+ROLE_MODELS = [UserProfile, HourlyEmployee, HourlyContractor, CommissionEmployee, CommissionContractor, Student,
+               ProfitSharing, RevenueSharing, HasRent]
+
+
+def _digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def source_sheet_versions(clinic_spreadsheet):
+    """
+    Drive versions of the clinic's source sheets, or None when one could not be read
+    (without a version there is no way to tell the sheet has not changed, so nothing is cached).
+    """
+    sheet_ids = [getattr(clinic_spreadsheet, f'{report_type}_sheet_id') for report_type in REPORT_TITLES]
+    versions = get_sheet_versions(sheet_ids)
+    if any(version is None for version in versions.values()):
+        return None
+    return versions
+
+
+def related_user_ids(user):
+    """
+    The user, the users they take a revenue share of, the users taking one of theirs and,
+    when they share in the students' revenue, every student
+    """
+    user_ids = {user.pk}
+    shares_from_students = False
+    for owner_id, target_id, target_type in RevenueSharing.objects.filter(
+            Q(user_profile__user=user) | Q(target_type='specific_user', target_user=user)
+    ).values_list('user_profile__user_id', 'target_user_id', 'target_type'):
+        user_ids.add(owner_id)
+        if target_id:
+            user_ids.add(target_id)
+        if target_type == 'all_students' and owner_id == user.pk:
+            shares_from_students = True
+
+    if shares_from_students:
+        user_ids.update(UserProfile.objects.filter(
+            payment_detail__polymorphic_ctype__model='student').values_list('user_id', flat=True))
+    return sorted(user_ids)
+
+
+def preview_key(user, clinic, start_date, end_date, sheet_versions):
+    """Cache key of a payroll preview, sheet_versions as returned by source_sheet_versions"""
+    user_ids = related_user_ids(user)
+    site_settings = list(SiteSettings.objects.order_by('pk').values())
+    roles = {
+        model.__name__: list(model.objects.filter(
+            **{'user_id__in' if model is UserProfile else 'user_profile__user_id__in': user_ids}
+        ).order_by('pk').values())
+        for model in ROLE_MODELS
+    }
+    names = list(User.objects.filter(pk__in=user_ids).order_by('pk').values_list('pk', 'first_name', 'last_name'))
+    records = list(PayrollRecords.objects.filter(
+        user_id__in=user_ids, period_start=start_date, period_end=end_date).order_by('pk').values())
+    contributions = list(RevenueShareContribution.objects.filter(
+        payroll_record__user_id__in=user_ids, payroll_record__period_start=start_date,
+        payroll_record__period_end=end_date).order_by('pk').values())
+    year_to_date = list(PayrollYearToDate.objects.filter(user=user, year=end_date.year).values(
+        'earnings', 'deductions', 'cpp', 'ei'))
+
+    return 'payroll-preview:' + _digest({
+        'user': user.pk,
+        'clinic': clinic.pk,
+        'period': [start_date, end_date],
+        'site_settings': _digest(site_settings),
+        'roles': _digest([user_ids, roles, names]),
+        'records': _digest([records, contributions]),
+        'year_to_date': _digest(year_to_date),
+        'sheets': sheet_versions,
+    })
+
+
+def get_preview(key):
+    return cache.get(key)
+
+
+def store_preview(key, payroll_data):
+    cache.set(key, payroll_data, settings.PAYROLL_PREVIEW_CACHE_SECONDS)
@@ -0,0 +1,35 @@
+from registration.models import RevenueSharing
+
+
+class RevenueShareResolver:
+    """
+    Builds the base earnings payroll records of the users a payroll takes a revenue share of,
+    for one clinic and pay period. Base earnings never depend on revenue sharing, so every target only needs
+    its own record (mutual sharing included): it is made at most once per resolver and reused after that.
+    """
+
+    def __init__(self, viewset, clinic_spreadsheet, period_start, period_end, site_settings):
+        self.viewset = viewset  # for its payroll record helpers
+        self.clinic_spreadsheet = clinic_spreadsheet
+        self.period_start = period_start
+        self.period_end = period_end
+        self.site_settings = site_settings
+        self._base_records = {}
+
+    def base_record(self, target_user):
+        """Payroll record of target_user for the period at this clinic, made from their base earnings at most once"""
+        if target_user.id not in self._base_records:
+            self._base_records[target_user.id] = self.viewset._ensure_payroll_record_exists(
+                target_user, self.period_start, self.period_end, self.clinic_spreadsheet, self.site_settings
+            )
+        return self._base_records[target_user.id]
+
+    def resolve(self, user):
+        """Base records of everyone user takes a share of. Returns {target user id: PayrollRecords or None}."""
+        targets = {
+            role.target_user_id: role.target_user
+            for role in RevenueSharing.objects.filter(
+                user_profile__user=user, target_type='specific_user', target_user__isnull=False
+            ).select_related('target_user')
+        }
+        return {target_id: self.base_record(target_user) for target_id, target_user in targets.items()}
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from ..utils import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+#THIS FILE HOLDS THE TIMESHEET OF A CLINIC FOR A RANGE OF DAYS AS ONE DENSE ARRAY: STAFF MEMBERS x DAYS OF PAYABLE MINUTES
+#built once from the hours sheet rows, so totals, daily hours and weekly overtime of every hourly employee and
+#contractor are array lookups instead of filtering the sheet's strings again for each user
+STAFF_COLUMN = 'Staff member'
+MINUTES_COLUMN = 'Payable time (mins)'
+
+
+class TimesheetMatrix:
+    """
+    minutes[row, day] is the payable minutes of staff member `row` on first_day + `day` (int64).
+    staff_rows maps the stripped 'Staff member' name to its row.
+    """
+
+    def __init__(self, first_day, last_day, staff_rows, minutes):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.staff_rows = staff_rows
+        self.minutes = minutes
+
+    @classmethod
+    def from_rows(cls, df, dates, first_day, last_day):
+        """
+        Builds the matrix from timesheet rows and their parsed dates (a datetime Series aligned with df).
+        Rows outside first_day..last_day or without a readable date are left out.
+        """
+        n_days = (last_day - first_day).days + 1
+        if df.empty:
+            return cls(first_day, last_day, {}, np.zeros((0, n_days), dtype='int64'))
+
+        names = df[STAFF_COLUMN].astype(str).str.strip()
+        codes, staff_names = pd.factorize(names)
+        day_offsets = (dates.dt.normalize() - pd.Timestamp(first_day)).dt.days
+        minutes = pd.to_numeric(df[MINUTES_COLUMN], errors='coerce').fillna(0).round().astype('int64')
+
+        keep = (day_offsets >= 0) & (day_offsets < n_days)
+        matrix = np.zeros((len(staff_names), n_days), dtype='int64')
+        np.add.at(matrix, (codes[keep.to_numpy()], day_offsets[keep].astype('int64').to_numpy()), minutes[keep].to_numpy())
+
+        return cls(first_day, last_day, {name: row for row, name in enumerate(staff_names)}, matrix)
+
+    def covers(self, start_date, end_date):
+        return self.first_day <= start_date and end_date <= self.last_day
+
+    def _days(self, start_date, end_date):
+        return slice((start_date - self.first_day).days, (end_date - self.first_day).days + 1)
+
+    def has_staff(self, name):
+        return name in self.staff_rows
+
+    def total_minutes(self, name, start_date, end_date):
+        row = self.staff_rows.get(name)
+        if row is None:
+            return 0
+        return int(self.minutes[row, self._days(start_date, end_date)].sum())
+
+    def daily_minutes(self, name, start_date, end_date):
+        """{date: minutes} of the days name has payable time on"""
+        row = self.staff_rows.get(name)
+        if row is None:
+            return {}
+        days = self._days(start_date, end_date)
+        day_minutes = self.minutes[row, days]
+        return {start_date + timedelta(days=int(offset)): int(day_minutes[offset]) for offset in np.flatnonzero(day_minutes)}
@@ -0,0 +1,46 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+#THIS FILE HOLDS THE API'S JSON RENDERER AND THE OPT-IN COLUMNAR LAYOUT FOR SHEET DATA
+#orjson does the encoding, anything it does not know (Decimal, lazy strings...) goes through DRF's own encoder.
+#gzip for large responses is negotiated by GZipMiddleware (settings.MIDDLEWARE)
+COLUMNAR_LAYOUT = 'columns'
+
+_fallback_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Drop in for DRF's JSONRenderer that encodes with orjson"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=_fallback_encoder.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        )
+
+
+def wants_columnar(request):
+    """Clients opt into the columnar layout with ?layout=columns"""
+    return request.query_params.get('layout') == COLUMNAR_LAYOUT
+
+
+def to_columns(header, rows):
+    """
+    Columnar form of sheet rows: the header once and one array per column, instead of a list per row
+    (or a dict per row repeating every column name). rows can be lists in header order or dicts.
+    """
+    header = list(header)
+    if rows and isinstance(rows[0], dict):
+        columns = [[row.get(column) for row in rows] for column in header]
+    elif rows:
+        columns = [list(column) for column in zip(*rows)]
+    else:
+        columns = [[] for _ in header]
+    return {'header': header, 'columns': columns}
@@ -107,3 +107,16 @@ class SiteSettingsSerializer(serializers.ModelSerializer):
         return value
 
 
+
+class PayrollRecordSerializer(serializers.ModelSerializer):
+    """Read-only row of the payroll history"""
+    user_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    clinic_name = serializers.CharField(source='clinic.name', read_only=True, default=None)
+
+    class Meta:
+        model = PayrollRecords
+        fields = ['id', 'payroll_number', 'user', 'user_name', 'username', 'clinic', 'clinic_name', 'role_type',
+                  'period_start', 'period_end', 'hours_worked', 'total_income', 'total_deductions', 'net_payment',
+                  'cpp_contrib', 'cpp_er', 'ei_contrib', 'ei_er', 'created_at', 'sent_at']
+        read_only_fields = fields
@@ -0,0 +1,93 @@
+from ..utils import lazy_import
+from .sheet_registry import lookup_sheet
+
+pd = lazy_import('pandas')
+
+#THIS FILE DETECTS THE DATE FORMAT OF EACH SHEET'S DATE COLUMNS ONCE AT UPLOAD TIME (STORED ON ClinicSpreadsheet.date_formats)
+#so later reads parse with one explicit format instead of guessing on every call
+DATE_COLUMNS = ('Payment Date', 'Date', 'Invoice Date')
+
+# Tried in order, the first one that reads almost every sampled value wins
+CANDIDATE_FORMATS = [
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%Y/%m/%d',
+    '%m-%d-%Y',
+    '%d-%m-%Y',
+    '%B %d %Y, %I:%M %p',  # Jane daily transactions: "August 02 2025, 11:00 AM"
+    '%Y-%m-%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%B %d, %Y',
+    '%b %d, %Y',
+]
+DETECT_SAMPLE_ROWS = 200
+MIN_MATCH_SHARE = 0.9
+
+
+def detect_date_format(values):
+    """Returns the format that reads the (non blank) values, or None if none of the candidates do"""
+    sample = pd.Series(values).astype(str).str.strip()
+    sample = sample[sample != ''].head(DETECT_SAMPLE_ROWS)
+    if sample.empty:
+        return None
+
+    for date_format in CANDIDATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=date_format, errors='coerce')
+        if parsed.notna().mean() >= MIN_MATCH_SHARE:
+            return date_format
+    return None
+
+
+def remember_date_formats(clinic_spreadsheet, sheet_type, df):
+    """Detects the formats of the date columns in an upload and stores them on the clinic's spreadsheet record"""
+    if clinic_spreadsheet is None:
+        return
+
+    detected = {}
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            date_format = detect_date_format(df[column])
+            if date_format:
+                detected[column] = date_format
+
+    stored = dict(clinic_spreadsheet.date_formats or {})
+    if not detected or stored.get(sheet_type, {}) == {**stored.get(sheet_type, {}), **detected}:
+        return
+
+    stored[sheet_type] = {**stored.get(sheet_type, {}), **detected}
+    clinic_spreadsheet.date_formats = stored
+    clinic_spreadsheet.save(update_fields=['date_formats'])
+    print(f"Stored date formats for {sheet_type}: {stored[sheet_type]}")
+
+
+def get_date_format(clinic_spreadsheet, sheet_type, column):
+    if clinic_spreadsheet is None:
+        return None
+    return (clinic_spreadsheet.date_formats or {}).get(sheet_type, {}).get(column)
+
+
+def sheet_date_formats(sheet_id):
+    """{column: format} stored for a sheet, for code that only knows the sheet id"""
+    clinic_spreadsheet, report_type, schema = lookup_sheet(sheet_id)
+    if clinic_spreadsheet is None:
+        return {}
+    return dict((clinic_spreadsheet.date_formats or {}).get(report_type, {}))
+
+
+def parse_dates(values, date_format=None):
+    """
+    pd.to_datetime with the stored format. Falls back to pandas' own guessing when there is no stored format
+    or it stops matching (google can re-display dates it parsed from an upload in its own format).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    if date_format:
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        non_blank = (pd.Series(values).astype(str).str.strip() != '').sum()
+        if parsed.notna().sum() >= MIN_MATCH_SHARE * non_blank:
+            return parsed
+        print(f"Stored date format {date_format} no longer matches, guessing instead")
+
+    return pd.to_datetime(values, errors='coerce')
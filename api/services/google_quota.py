@@ -0,0 +1,145 @@
+import random
+import time
+from django.conf import settings
+from ..utils import lazy_import
+from .locks import file_lock, read_lock_state, write_lock_state
+
+httplib2 = lazy_import('httplib2')
+google_errors = lazy_import('googleapiclient.errors')
+
+#THIS FILE KEEPS GOOGLE API CALLS UNDER THE PER-MINUTE QUOTA AND RETRIES THE ONES GOOGLE TURNS AWAY
+#A SHARED CIRCUIT BREAKER STOPS EVERY WORKER FROM WAITING ON GOOGLE WHILE IT IS DOWN
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+BURST_SHARE = 0.2  # share of the per-minute quota that can be spent at once, the rest trickles in over the minute
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_MAX_SECONDS = 32
+
+
+class GoogleSheetsUnavailable(Exception):
+    """Google kept refusing a call after every retry. Raised instead of returning empty sheet data."""
+    pass
+
+
+def _get_quota_per_minute(kind):
+    return {
+        'read': settings.GOOGLE_SHEETS_READ_QUOTA_PER_MINUTE,
+        'write': settings.GOOGLE_SHEETS_WRITE_QUOTA_PER_MINUTE,
+    }.get(kind)
+
+
+def acquire_quota(kind):
+    """
+    Blocks until the shared token bucket for kind ('read' or 'write') has a token and takes it.
+    The bucket lives in a lock file so every gunicorn worker draws from the same quota.
+    Any other kind (drive calls) is not limited.
+    """
+    quota = _get_quota_per_minute(kind)
+    if not quota:
+        return
+
+    # Burst plus refill never adds up to more than the quota inside any one minute
+    capacity = max(1.0, quota * BURST_SHARE)
+    refill_per_second = max(quota - capacity, 1.0) / 60
+
+    while True:
+        with file_lock(f'google-quota-{kind}') as lock_file:
+            now = time.time()
+            state = read_lock_state(lock_file)
+            elapsed = max(0.0, now - state.get('updated', now))
+            tokens = min(capacity, state.get('tokens', capacity) + elapsed * refill_per_second)
+
+            if tokens >= 1:
+                write_lock_state(lock_file, {'tokens': tokens - 1, 'updated': now})
+                return
+
+            write_lock_state(lock_file, {'tokens': tokens, 'updated': now})
+            wait_seconds = (1 - tokens) / refill_per_second
+
+        print(f"Google {kind} quota used up, waiting {wait_seconds:.2f}s")
+        time.sleep(wait_seconds)
+
+
+def _circuit_allows_call():
+    """
+    Returns False while the shared circuit is open so callers fail fast instead of waiting on timeouts.
+    Once GOOGLE_CIRCUIT_RESET_SECONDS have passed a single probe call per window is let through (half open).
+    """
+    with file_lock('google-circuit') as lock_file:
+        state = read_lock_state(lock_file)
+        opened_at = state.get('opened_at')
+        if opened_at is None:
+            return True
+
+        now = time.time()
+        reset_seconds = settings.GOOGLE_CIRCUIT_RESET_SECONDS
+        if now - opened_at < reset_seconds or now - state.get('probe_at', 0) < reset_seconds:
+            return False
+
+        state['probe_at'] = now
+        write_lock_state(lock_file, state)
+        return True
+
+
+def _record_call_result(succeeded):
+    """Closes the circuit after any answer from google, opens it after too many failures in a row."""
+    with file_lock('google-circuit') as lock_file:
+        state = read_lock_state(lock_file)
+        if succeeded:
+            if state:
+                if state.get('opened_at') is not None:
+                    print("Google API answered again, closing circuit")
+                write_lock_state(lock_file, {})
+            return
+
+        state['failures'] = state.get('failures', 0) + 1
+        if state['failures'] >= settings.GOOGLE_CIRCUIT_FAILURE_THRESHOLD:
+            if state.get('opened_at') is None:
+                print(f"Google API failed {state['failures']} times in a row, opening circuit")
+            state['opened_at'] = time.time()
+        write_lock_state(lock_file, state)
+
+
+def execute_with_retry(request, kind='read'):
+    """
+    Executes a google API request (or batch) under the shared quota for kind.
+    Rate limits, server errors and dropped connections are retried with exponential backoff and full jitter.
+    Other HTTP errors are raised straight away. Raises GoogleSheetsUnavailable once every attempt has failed,
+    the GOOGLE_API_DEADLINE_SECONDS budget is spent, or the shared circuit is open.
+    """
+    max_attempts = settings.GOOGLE_API_MAX_ATTEMPTS
+    deadline = time.monotonic() + settings.GOOGLE_API_DEADLINE_SECONDS
+    last_error = None
+
+    for attempt in range(max_attempts):
+        if not _circuit_allows_call():
+            raise GoogleSheetsUnavailable("Google API circuit is open after repeated failures, not calling") from last_error
+
+        acquire_quota(kind)
+        try:
+            result = request.execute()
+        except google_errors.HttpError as e:
+            if e.resp.status not in RETRYABLE_STATUS_CODES:
+                # google answered, so it is up even though it refused this call
+                _record_call_result(True)
+                raise
+            last_error = e
+            # being rate limited says nothing about google being down
+            if e.resp.status != 429:
+                _record_call_result(False)
+        except (OSError, httplib2.HttpLib2Error) as e:
+            # timeouts land here as socket.timeout
+            last_error = e
+            _record_call_result(False)
+        else:
+            _record_call_result(True)
+            return result
+
+        if attempt < max_attempts - 1:
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            if time.monotonic() + delay > deadline:
+                print(f"Google API call out of time after {attempt + 1} attempts")
+                break
+            print(f"Google API call failed ({last_error}), retry {attempt + 1}/{max_attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+    raise GoogleSheetsUnavailable(f"Google API call failed after {attempt + 1} attempts: {last_error}") from last_error
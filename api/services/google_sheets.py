@@ -1,23 +1,29 @@
 from ..utils import *
-from clinic_help_desk.settings import *
 import csv
+import threading
 import traceback
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from .google_quota import execute_with_retry, GoogleSheetsUnavailable
+from .date_formats import parse_dates
+from django.conf import settings
+
+pd = lazy_import('pandas')
 
 #THIS FILE IS FOR ALL OPERATIONS REGARDING GOOGLE SHEET AND ITS API
 def create_new_google_sheet(title = "New Sheet"): #title needs to be filled when function is referenced, New Sheet is default name if no title is given
     drive_service = get_google_drive_service_creds()
     spreadsheet_metadata = {
         'name': title,
-        'parents': [SHARED_DRIVE_ID],
+        'parents': [settings.SHARED_DRIVE_ID],
         'mimeType': 'application/vnd.google-apps.spreadsheet'
     }
     #API CALL!!
     try:
-        spreadsheet = drive_service.files().create(
+        spreadsheet = execute_with_retry(drive_service.files().create(
             body=spreadsheet_metadata,
             supportsAllDrives=True
-        ).execute()
+        ), kind=None)
         if spreadsheet:
             sheetID = spreadsheet.get('id')
             print(f"Successfully created spreadsheet: {sheetID}")
@@ -32,10 +38,10 @@ def delete_google_sheet(sheetID):
     drive_service = get_google_drive_service_creds()
 
     try:
-        drive_service.files().delete(
+        execute_with_retry(drive_service.files().delete(
             fileId = sheetID,
             supportsAllDrives = True
-        ).execute()
+        ), kind=None)
 
         return True
     except Exception as e: #debug. check console for print error if any arises
@@ -45,10 +51,10 @@ def delete_google_sheet(sheetID):
 def rename_google_sheet(sheetID, name):
     drive_service = get_google_drive_service_creds()
     try:
-        drive_service.files().delete(
+        execute_with_retry(drive_service.files().delete(
             fileId = sheetID,
             supportsAllDrives = True
-        ).execute()
+        ), kind=None)
 
         return True
     except Exception as e: #debug. check console for print error if any arises
@@ -59,10 +65,10 @@ def rename_google_sheet(sheetID, name):
 def test_drive_connection():
     try:
         drive_service = get_google_drive_service_creds()
-        drive_info = drive_service.drives().get(driveId=SHARED_DRIVE_ID).execute()
+        drive_info = drive_service.drives().get(driveId=settings.SHARED_DRIVE_ID).execute()
         print(f" Connected to: {drive_info['name']}")
         results = drive_service.files().list(
-            q=f"parents in '{SHARED_DRIVE_ID}'",
+            q=f"parents in '{settings.SHARED_DRIVE_ID}'",
             supportsAllDrives=True,
             includeItemsFromAllDrives=True,
             fields="files(id, name, createdTime, owners)"
@@ -87,7 +93,14 @@ def test_drive_connection():
         return False
 
 
-def grant_editor_access(spreadsheet_id, email): #gives editor access to users who created the file in google sheets
+def grant_editor_access(spreadsheet_ids, email): #gives editor access to users who created the file in google sheets
+    """
+    Grants editor access on one spreadsheet ID or a list of them, all in one batch request.
+    Raises the first error if any grant failed.
+    """
+    if isinstance(spreadsheet_ids, str):
+        spreadsheet_ids = [spreadsheet_ids]
+
     drive_service = get_google_drive_service_creds()
 
     permission = {
@@ -96,28 +109,165 @@ def grant_editor_access(spreadsheet_id, email): #gives editor access to users wh
         'emailAddress': email
     }
 
-    drive_service.permissions().create(
-        fileId=spreadsheet_id,
-        body=permission,
-        supportsAllDrives=True
-    ).execute()
+    _, errors = _execute_drive_batch(drive_service, {
+        spreadsheet_id: drive_service.permissions().create(
+            fileId=spreadsheet_id,
+            body=permission,
+            supportsAllDrives=True
+        )
+        for spreadsheet_id in spreadsheet_ids
+    })
+    if errors:
+        raise next(iter(errors.values()))
+
+
+DRIVE_BATCH_LIMIT = 100  # google rejects batches with more calls than this
+
+
+def _execute_drive_batch(drive_service, requests):
+    """
+    Sends drive requests as batch HTTP requests instead of one round-trip each.
+    requests maps a string request ID to an unexecuted drive request.
+    Returns (responses, errors), both dicts keyed by request ID. A batch that fails as a whole
+    reports that error for every request in it.
+    """
+    responses = {}
+    errors = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    items = list(requests.items())
+    for i in range(0, len(items), DRIVE_BATCH_LIMIT):
+        chunk = items[i:i + DRIVE_BATCH_LIMIT]
+        batch = drive_service.new_batch_http_request(callback=on_response)
+        for request_id, request in chunk:
+            batch.add(request, request_id=request_id)
+        #API CALL!!
+        try:
+            execute_with_retry(batch, kind=None)
+        except Exception as e:
+            print(f"Error executing drive batch: {e}")
+            for request_id, _ in chunk:
+                if request_id not in responses:
+                    errors.setdefault(request_id, e)
+
+    return responses, errors
+
+
+def create_google_sheets_batch(titles):
+    """
+    Creates several spreadsheets in the shared drive with one batch request.
+    titles maps a key to the spreadsheet title. Returns key -> sheet ID when every sheet was created.
+    If any creation fails the ones that did get created are deleted again and None is returned,
+    so no orphaned sheets are left in the drive.
+    """
+    try:
+        drive_service = get_google_drive_service_creds()
+        created, errors = _execute_drive_batch(drive_service, {
+            key: drive_service.files().create(
+                body={
+                    'name': title,
+                    'parents': [settings.SHARED_DRIVE_ID],
+                    'mimeType': 'application/vnd.google-apps.spreadsheet'
+                },
+                supportsAllDrives=True,
+                fields='id'
+            )
+            for key, title in titles.items()
+        })
+    except Exception as e:
+        print(f"Error creating spreadsheets: {e}")
+        return None
+
+    sheet_ids = {key: response.get('id') for key, response in created.items()}
+
+    if errors:
+        for key, error in errors.items():
+            print(f"Error creating spreadsheet '{titles[key]}': {error}")
+        if sheet_ids:
+            print(f"Rolling back {len(sheet_ids)} spreadsheets created in the failed batch")
+            delete_google_sheets_batch(sheet_ids.values())
+        return None
+
+    for sheetID in sheet_ids.values():
+        print(f"Successfully created spreadsheet: {sheetID}")
+    return sheet_ids
+
+
+def delete_google_sheets_batch(sheet_ids):
+    """
+    Deletes several spreadsheets with one batch request.
+    Returns the list of sheet IDs that were deleted.
+    """
+    sheet_ids = [sheet_id for sheet_id in sheet_ids if sheet_id]
+    if not sheet_ids:
+        return []
+
+    try:
+        drive_service = get_google_drive_service_creds()
+        deleted, errors = _execute_drive_batch(drive_service, {
+            sheet_id: drive_service.files().delete(
+                fileId=sheet_id,
+                supportsAllDrives=True
+            )
+            for sheet_id in sheet_ids
+        })
+    except Exception as e: #debug. check console for print error if any arises
+        print(f"Error deleting spreadsheets: {e}")
+        return []
+
+    for sheet_id, error in errors.items():
+        print(f"Error deleting spreadsheet {sheet_id}: {error}")
+    return [sheet_id for sheet_id in sheet_ids if sheet_id in deleted]
+
+def get_sheet_version(sheet_id):
+    """
+    Drive's version number of a spreadsheet, it goes up on every change made to the file by anyone.
+    Returns None if it could not be read, callers then treat anything cached for the sheet as out of date.
+    """
+    try:
+        drive_service = get_google_drive_service_creds()
+        result = execute_with_retry(drive_service.files().get(
+            fileId=sheet_id,
+            fields='version',
+            supportsAllDrives=True
+        ), kind=None)
+        return result.get('version')
+    except GoogleSheetsUnavailable:
+        raise
+    except Exception as e:
+        print(f"Error reading version of {sheet_id}: {e}")
+        return None
 
 def read_google_sheets(sheet_id, range_name): #inputs column range from A-Z and row range from 1-100000000.
+    """
+    Returns the sheet values as a list of lists. Errors such as a missing sheet return [],
+    but when google keeps rate limiting or failing GoogleSheetsUnavailable is raised,
+    so callers never mistake an outage for an empty sheet.
+    """
     sheets_service = get_google_sheets_service_creds()
     try:
-        result = sheets_service.spreadsheets().values().get(
+        result = execute_with_retry(sheets_service.spreadsheets().values().get(
             spreadsheetId=sheet_id,
             range=range_name
-        ).execute()
+        ), 'read')
         return result.get('values', [])
+    except GoogleSheetsUnavailable:
+        raise
     except Exception as e:
         print(f"Error reading google sheets: {e}")
         return []
 
 #returns a list of lists that has equal rows and columns since if one row has 3 cells and one row has 4 cells, google's .spreadsheets().values().get() does not return an additional empty cell for the row with 3 cells. this fixes that.
 def padded_google_sheets(sheet_id, range_name):
-    sheet_data = read_google_sheets(sheet_id, range_name)
+    return pad_sheet_values(read_google_sheets(sheet_id, range_name))
 
+#splits raw sheet values into (padded_data, padded_header)
+def pad_sheet_values(sheet_data):
     if sheet_data:
         max_length = max(len(row) for row in sheet_data) #returns the row with the longest length
         padded_header = []
@@ -132,6 +282,25 @@ def padded_google_sheets(sheet_id, range_name):
     else:
         return [], []
 
+def read_google_sheets_or_snapshot(sheet_id, range_name):
+    """
+    For display only pages. Returns (values, stale): the live sheet values with stale False, or when google is
+    unavailable the last values read here with stale True. Raises GoogleSheetsUnavailable if there is no snapshot.
+    Payroll must not use this, it has to fail rather than calculate pay from old data.
+    """
+    cache_key = f"sheet-snapshot:{sheet_id}:{range_name}"
+    try:
+        values = read_google_sheets(sheet_id, range_name)
+    except GoogleSheetsUnavailable:
+        values = cache.get(cache_key)
+        if values is None:
+            raise
+        print(f"Google unavailable, serving last snapshot of {sheet_id} {range_name}")
+        return values, True
+
+    cache.set(cache_key, values, settings.GOOGLE_SHEET_SNAPSHOT_SECONDS)
+    return values, False
+
 def batch_upload_csv(csv_file_path, spreadsheet_id): #for uploading csv
     sheets_service = get_google_sheets_service_creds()
 
@@ -152,37 +321,121 @@ def batch_upload_csv(csv_file_path, spreadsheet_id): #for uploading csv
     }]
 
     body = {'requests': requests}
-    sheets_service.spreadsheets().batchUpdate(
+    execute_with_retry(sheets_service.spreadsheets().batchUpdate(
         spreadsheetId=spreadsheet_id,
         body=body
-    ).execute()
+    ), 'write')
     return True
 
 
 def write_google_sheets(spreadsheet_id, sheet_name, values):
     sheets_service = get_google_sheets_service_creds()
     try:
-        sheets_service.spreadsheets().values().clear(
+        execute_with_retry(sheets_service.spreadsheets().values().clear(
             spreadsheetId=spreadsheet_id,
             range=sheet_name
-        ).execute()
+        ), 'write')
 
         body = {
             "values": values
         }
 
-        result = sheets_service.spreadsheets().values().update(
+        result = execute_with_retry(sheets_service.spreadsheets().values().update(
             spreadsheetId=spreadsheet_id,
             range=f"{sheet_name}!A1",
             valueInputOption="USER_ENTERED",  # Better for parsing dates/numbers
             body=body
-        ).execute()
+        ), 'write')
         return True
 
+    except GoogleSheetsUnavailable:
+        raise
     except Exception as e:
         print(f"Error writing to Google Sheets: {e}")
         return False
 
+def insert_rows_into_sheet(spreadsheet_id, row_groups, sheet_name='Sheet1', grid_id=0):
+    """
+    Inserts rows into the middle of a sheet without rewriting it.
+    row_groups is a list of (position, rows) with positions ascending, position being how many existing data rows
+    (below the header) come before that group. Returns True once every group is written.
+    grid_id is the tab's sheetId, 0 for the first tab of a spreadsheet made by create_new_google_sheet.
+    When filling the inserted rows fails they are deleted again, so the sheet is never left with blank rows.
+    """
+    sheets_service = get_google_sheets_service_creds()
+    inserted = False
+    try:
+        # Insert the blank rows bottom up so the positions above stay valid
+        insert_requests = [{
+            'insertDimension': {
+                'range': {
+                    'sheetId': grid_id,
+                    'dimension': 'ROWS',
+                    'startIndex': position + 1,  # +1 for the header row
+                    'endIndex': position + 1 + len(rows),
+                },
+                'inheritFromBefore': position > 0,
+            }
+        } for position, rows in reversed(row_groups)]
+
+        execute_with_retry(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'requests': insert_requests}
+        ), 'write')
+        inserted = True
+
+        # Then fill them, every group is pushed down by the rows inserted above it
+        data = []
+        inserted_above = 0
+        for position, rows in row_groups:
+            data.append({
+                'range': f"{sheet_name}!A{position + inserted_above + 2}",
+                'values': rows,
+            })
+            inserted_above += len(rows)
+
+        execute_with_retry(sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'valueInputOption': 'USER_ENTERED', 'data': data}
+        ), 'write')
+        return True
+
+    except Exception as e:
+        if inserted:
+            _delete_inserted_rows(sheets_service, spreadsheet_id, row_groups, grid_id)
+        if isinstance(e, GoogleSheetsUnavailable):
+            raise
+        print(f"Error inserting rows into Google Sheets: {e}")
+        return False
+
+
+def _delete_inserted_rows(sheets_service, spreadsheet_id, row_groups, grid_id):
+    """Removes the blank rows insert_rows_into_sheet inserted, after their values could not be written"""
+    delete_requests = []
+    inserted_above = 0
+    for position, rows in row_groups:
+        delete_requests.append({
+            'deleteDimension': {
+                'range': {
+                    'sheetId': grid_id,
+                    'dimension': 'ROWS',
+                    'startIndex': position + inserted_above + 1,
+                    'endIndex': position + inserted_above + 1 + len(rows),
+                }
+            }
+        })
+        inserted_above += len(rows)
+
+    try:
+        # bottom up so the positions above stay valid
+        execute_with_retry(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'requests': list(reversed(delete_requests))}
+        ), 'write')
+        print(f"Deleted the {inserted_above} rows inserted into {spreadsheet_id} after the write failed")
+    except Exception as e:
+        print(f"Error deleting the rows inserted into {spreadsheet_id}, the sheet has blank rows: {e}")
+
 def write_df_to_sheets (spreadsheet_id, range, df):
     try:
         sheets_service = get_google_sheets_service_creds()
@@ -190,10 +443,10 @@ def write_df_to_sheets (spreadsheet_id, range, df):
 
         #  Clear the sheet first to remove any old data.
         #  The range should be just the sheet name to clear everything. (Sheet1 for MOST cases)
-        sheets_api.values().clear(
+        execute_with_retry(sheets_api.values().clear(
             spreadsheetId=spreadsheet_id,
             range=range
-        ).execute()
+        ), 'write')
         print(f"Sheet cleared successfully.")
 
         #  Converts the pandas df to a list of lists acceptable by google sheet's api
@@ -203,16 +456,18 @@ def write_df_to_sheets (spreadsheet_id, range, df):
             "values": sheet_to_write
         }
 
-        result = sheets_api.values().update(
+        result = execute_with_retry(sheets_api.values().update(
             spreadsheetId=spreadsheet_id,
             range=range,  # Specifies the top-left cell to start writing from
             valueInputOption="USER_ENTERED",  # This makes Google Sheets interpret data like dates/numbers correctly
             body=body
-        ).execute()
+        ), 'write')
 
         print("cells updated successfully.")
         return True
 
+    except GoogleSheetsUnavailable:
+        raise
     except Exception as e:
         print(f"Error writing google sheets: {e}")
 
@@ -229,9 +484,13 @@ def colnum_string(n):
     return string
 
 
-def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, sheet_name="Sheet1"):
+def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, sheet_name="Sheet1",
+                             sheets_service=None, date_format=None):
     """
     Efficiently reads a Google Sheet by filtering rows based on a date range in a specified column.
+    Pass sheets_service to reuse an existing authorized session instead of building a new one.
+    date_format is the column's stored format (ClinicSpreadsheet.date_formats), the dates are guessed without it.
+    Raises GoogleSheetsUnavailable rather than returning an empty DataFrame when google keeps failing.
     """
     # --- Step 0: Log Initial Call ---
     print(f"\n[DEBUG] --- Starting read_sheet_by_date_range ---")
@@ -241,12 +500,13 @@ def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, s
     print(f"[DEBUG] Date Range: {start_date} to {end_date}")
 
     try:
-        sheets_service = get_google_sheets_service_creds()
+        if sheets_service is None:
+            sheets_service = get_google_sheets_service_creds()
         spreadsheets_api = sheets_service.spreadsheets()
 
         # --- Step 1: Get header to find the date column index ---
         header_range = f"'{sheet_name}'!1:1"
-        header_result = spreadsheets_api.values().get(spreadsheetId=sheet_id, range=header_range).execute()
+        header_result = execute_with_retry(spreadsheets_api.values().get(spreadsheetId=sheet_id, range=header_range), 'read')
         header = header_result.get('values', [[]])[0]
 
         if not header:
@@ -264,7 +524,7 @@ def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, s
 
         # --- Step 2: Fetch the entire date column for efficient filtering ---
         date_column_range = f"'{sheet_name}'!{date_col_letter}2:{date_col_letter}"
-        date_result = spreadsheets_api.values().get(spreadsheetId=sheet_id, range=date_column_range).execute()
+        date_result = execute_with_retry(spreadsheets_api.values().get(spreadsheetId=sheet_id, range=date_column_range), 'read')
         date_values = date_result.get('values', [])
 
         if not date_values:
@@ -275,7 +535,7 @@ def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, s
         # --- Step 3: Use pandas to identify matching row numbers ---
         df = pd.DataFrame(date_values, columns=['date_str'])
         df['row_num'] = range(2, len(df) + 2)
-        df['date'] = pd.to_datetime(df['date_str'], errors='coerce')
+        df['date'] = parse_dates(df['date_str'], date_format)
 
         parsing_errors = df['date'].isna().sum()
         if parsing_errors > 0:
@@ -314,7 +574,7 @@ def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, s
         ranges_to_fetch = [f"'{sheet_name}'!A{start}:{last_col_letter}{end}" for start, end in row_groups]
         print(f"[DEBUG] Constructed {len(ranges_to_fetch)} ranges for batch fetch: {ranges_to_fetch}")
 
-        batch_get_result = spreadsheets_api.values().batchGet(spreadsheetId=sheet_id, ranges=ranges_to_fetch).execute()
+        batch_get_result = execute_with_retry(spreadsheets_api.values().batchGet(spreadsheetId=sheet_id, ranges=ranges_to_fetch), 'read')
 
         # --- Step 6: Combine results into a single DataFrame ---
         all_data = []
@@ -335,8 +595,47 @@ def read_sheet_by_date_range(sheet_id, date_column_name, start_date, end_date, s
         print(f"[DEBUG] ✅ Success! Returning DataFrame with shape: {final_df.shape}")
         return final_df
 
+    except GoogleSheetsUnavailable:
+        raise
     except Exception as e:
         print(f"[DEBUG] ‼️ FAILED: An unexpected error occurred.")
         print(f"[DEBUG] Error: {e}")
         traceback.print_exc()
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+# Pool for reading independent spreadsheets at the same time. Threads are only started on first use,
+# so gunicorn workers each get their own after forking.
+_sheet_fetch_pool = ThreadPoolExecutor(max_workers=settings.SHEET_FETCH_MAX_WORKERS, thread_name_prefix='sheet-fetch')
+_thread_local = threading.local()
+
+
+def get_thread_sheets_service():
+    """
+    Returns the sheets service owned by the calling thread, building it on first use.
+    httplib2 sessions are not thread safe, so every pool thread keeps its own authorized session.
+    """
+    sheets_service = getattr(_thread_local, 'sheets_service', None)
+    if sheets_service is None:
+        sheets_service = get_google_sheets_service_creds()
+        _thread_local.sheets_service = sheets_service
+    return sheets_service
+
+
+def fetch_sheets_by_date_range(fetch_plan):
+    """
+    Runs read_sheet_by_date_range for several spreadsheets concurrently.
+    fetch_plan maps any key to the keyword arguments for read_sheet_by_date_range.
+    Returns a dict of key -> DataFrame once every read has finished, so the wait is the slowest sheet, not the sum.
+    """
+    def fetch(read_kwargs):
+        return read_sheet_by_date_range(sheets_service=get_thread_sheets_service(), **read_kwargs)
+
+    futures = {key: _sheet_fetch_pool.submit(fetch, read_kwargs) for key, read_kwargs in fetch_plan.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def get_sheet_versions(sheet_ids):
+    """get_sheet_version for several spreadsheets concurrently: {sheet id: version or None}"""
+    futures = {sheet_id: _sheet_fetch_pool.submit(get_sheet_version, sheet_id) for sheet_id in set(sheet_ids) if sheet_id}
+    return {sheet_id: future.result() for sheet_id, future in futures.items()}
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # windows dev machines only run one process, a thread lock is enough there
+    fcntl = None
+
+#THIS FILE HOLDS LOCKS SHARED BY EVERY GUNICORN WORKER ON THE MACHINE
+_fallback_locks = {}
+_fallback_locks_guard = threading.Lock()
+
+
+def _get_fallback_lock(name):
+    with _fallback_locks_guard:
+        return _fallback_locks.setdefault(name, threading.Lock())
+
+
+@contextmanager
+def file_lock(name):
+    """
+    Exclusive advisory lock on SHARED_STATE_DIR/<name>.lock, held for the duration of the with block.
+    Every process and thread that locks the same name waits for the others.
+    Yields the open lock file so small pieces of shared state can be kept in it (see read_lock_state).
+    """
+    os.makedirs(settings.SHARED_STATE_DIR, exist_ok=True)
+    path = os.path.join(settings.SHARED_STATE_DIR, f'{name}.lock')
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    with os.fdopen(fd, 'r+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            fallback_lock = _get_fallback_lock(name)
+            fallback_lock.acquire()
+        try:
+            yield lock_file
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                fallback_lock.release()
+
+
+def read_lock_state(lock_file):
+    """Returns the JSON state stored in a held lock file, or an empty dict"""
+    lock_file.seek(0)
+    content = lock_file.read()
+    try:
+        return json.loads(content) if content else {}
+    except ValueError:
+        return {}
+
+
+def write_lock_state(lock_file, state):
+    """Replaces the JSON state stored in a held lock file"""
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(json.dumps(state))
+    lock_file.flush()
+
+
+class StaleSheetWrite(Exception):
+    """The sheet was written after the fencing token the caller holds was handed out"""
+    pass
+
+
+@contextmanager
+def sheet_write_lock(sheet_id, expected_token=None):
+    """
+    Holds the write lock of one google sheet around a read-merge-write cycle, so writes to the same sheet queue up
+    while other sheets are untouched. Every cycle moves the sheet's fencing token on by one, even if it fails part way.
+    A caller that read the sheet in an earlier request passes the token it got from sheet_write_token then,
+    and StaleSheetWrite is raised if anything wrote to the sheet in between.
+    """
+    with file_lock(f'sheet-{sheet_id}') as lock_file:
+        token = read_lock_state(lock_file).get('token', 0)
+        if expected_token is not None and expected_token != token:
+            raise StaleSheetWrite(f"Sheet {sheet_id} was written after it was read (token {expected_token}, now {token})")
+        try:
+            yield token + 1
+        finally:
+            write_lock_state(lock_file, {'token': token + 1})
+
+
+def sheet_write_token(sheet_id):
+    """Current fencing token of a sheet, taken before reading it for a write that happens in a later request"""
+    with file_lock(f'sheet-{sheet_id}') as lock_file:
+        return read_lock_state(lock_file).get('token', 0)
@@ -0,0 +1,123 @@
+import os
+from django.conf import settings
+from ..utils import lazy_import
+from .date_formats import parse_dates
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+#THIS FILE KEEPS A PERSISTENT INDEX PER GOOGLE SHEET SO UPLOADS CAN BE DEDUPED AND SORTED IN WITHOUT RE-READING THE SHEET'S HISTORY
+#the index holds one 64 bit hash per row plus the sort key of every row in sheet order,
+#and is only trusted while drive's version of the sheet matches the one it was saved at.
+#it is read and written under the sheet's write lock (locks.sheet_write_lock)
+HASH_CHUNK_ROWS = 50000  # rows turned into strings at a time while hashing
+SORT_DATE_COLUMNS = {'daily_transaction': 'Date', 'time_hour': 'Date', 'transaction_report': 'Payment Date'}
+
+
+def row_hashes(df):
+    """
+    64 bit hash of every row of df, comparing cells as strings like the sheet does.
+    Only HASH_CHUNK_ROWS rows are copied to strings at a time, so memory follows the chunk and not the frame.
+    """
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+
+    chunks = []
+    for start in range(0, len(df), HASH_CHUNK_ROWS):
+        chunk = df.iloc[start:start + HASH_CHUNK_ROWS].astype(str)
+        chunks.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+    return np.concatenate(chunks)
+
+
+def sort_keys_for(df, sheet_type, date_format=None):
+    """
+    Sort key of every row, ascending in the order the sheet type is kept in:
+    payment_transaction by Payment biggest first, the dated types newest first with unreadable dates last.
+    Sheet types without a sort column (or a missing column) get all zero keys, so new rows go at the end.
+    date_format is the clinic's stored format for the date column (date_formats.py), if known.
+    """
+    keys = np.zeros(len(df), dtype=np.float64)
+
+    if sheet_type == 'payment_transaction':
+        if 'Payment' in df.columns:
+            keys = -pd.to_numeric(df['Payment'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+    elif sheet_type in SORT_DATE_COLUMNS:
+        date_column = SORT_DATE_COLUMNS[sheet_type]
+        if date_column in df.columns:
+            # without a stored format: transaction reports look like "07-21-2025", the others like "August 02 2025, 11:00 AM"
+            if date_format is None and sheet_type == 'transaction_report':
+                date_format = '%m-%d-%Y'
+            dates = parse_dates(df[date_column], date_format)
+            keys = np.where(dates.isna(), np.inf, -dates.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64))
+
+    return keys
+
+
+class SheetIndex:
+    """Row hashes of one sheet for the given column order, and the sort key of each row in sheet order"""
+
+    def __init__(self, sheet_id, columns, hashes, sort_keys):
+        self.sheet_id = sheet_id
+        self.columns = list(columns)
+        self.hashes = np.unique(hashes)  # sorted, for searchsorted lookups
+        self.sort_keys = np.asarray(sort_keys, dtype=np.float64)
+
+    @classmethod
+    def _path(cls, sheet_id):
+        return os.path.join(settings.SHEET_INDEX_DIR, f'{sheet_id}.npz')
+
+    @classmethod
+    def build(cls, sheet_id, df, sheet_type, date_format=None):
+        """Index of the rows in df (in the order they are written), used when there is no usable saved index"""
+        return cls(sheet_id, df.columns, row_hashes(df), sort_keys_for(df, sheet_type, date_format))
+
+    @classmethod
+    def load(cls, sheet_id, columns, version):
+        """Saved index of the sheet, or None if there is none, it is for another version or other columns"""
+        if version is None:
+            return None
+        try:
+            with np.load(cls._path(sheet_id), allow_pickle=False) as saved:
+                if str(saved['version']) != str(version) or saved['columns'].tolist() != list(columns):
+                    print(f"Sheet index for {sheet_id} is out of date, rebuilding")
+                    return None
+                return cls(sheet_id, columns, saved['hashes'], saved['sort_keys'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading sheet index for {sheet_id}: {e}")
+            return None
+
+    def save(self, version):
+        """Saves the index as matching drive version of the sheet (taken right after our own write)"""
+        if version is None:
+            return
+        os.makedirs(settings.SHEET_INDEX_DIR, exist_ok=True)
+        path = self._path(self.sheet_id)
+        temp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(temp_path, hashes=self.hashes, sort_keys=self.sort_keys,
+                 columns=np.array(self.columns, dtype=str), version=np.array(str(version)))
+        os.replace(temp_path, path)
+
+    def contains(self, hashes):
+        """Boolean mask of which hashes are already in the sheet"""
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return self.hashes[positions] == hashes
+
+    def add(self, hashes):
+        self.hashes = np.union1d(self.hashes, hashes)
+
+    def insert_positions(self, new_sort_keys):
+        """
+        For sort keys of new rows (already sorted), the number of existing rows each one goes after.
+        Rows tied with existing ones go after them.
+        """
+        return np.searchsorted(self.sort_keys, new_sort_keys, side='right')
+
+    def insert_rows(self, positions, new_sort_keys, new_hashes):
+        """Records rows written at the given insert positions"""
+        self.sort_keys = np.insert(self.sort_keys, positions, new_sort_keys)
+        self.add(new_hashes)
@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.db.models import Q
+from ..models import ClinicSpreadsheet, SheetRegistry
+
+#THIS FILE MAPS A GOOGLE SHEET ID BACK TO THE CLINIC SPREADSHEET AND REPORT TYPE THAT OWN IT
+#through the SheetRegistry table (one unique indexed sheet_id) instead of checking all five *_sheet_id columns.
+#entries are kept in the cache too and checked against the clinic spreadsheet, so a sheet id changed by hand
+#is found by the old column scan once and registered again
+REPORT_TITLES = {
+    'compensation_sales': 'Compensation + Sales Report',
+    'daily_transaction': 'Daily Transaction Report',
+    'transaction_report': 'Transaction Report',
+    'payment_transaction': 'Payment Transaction Report',
+    'time_hour': 'Hours Report',
+}
+CACHE_SECONDS = 60 * 60
+
+
+def _cache_key(sheet_id):
+    return f'sheet-registry:{sheet_id}'
+
+
+def register_clinic_sheets(clinic_spreadsheet):
+    """Records every sheet of a clinic spreadsheet, replacing whatever the registry had for it"""
+    sheet_ids = {}
+    for report_type in REPORT_TITLES:
+        sheet_id = getattr(clinic_spreadsheet, f'{report_type}_sheet_id')
+        if sheet_id:
+            sheet_ids[sheet_id] = report_type
+
+    stale = SheetRegistry.objects.filter(clinic_spreadsheet=clinic_spreadsheet).exclude(sheet_id__in=sheet_ids)
+    cache.delete_many([_cache_key(sheet_id) for sheet_id in stale.values_list('sheet_id', flat=True)])
+    stale.delete()
+
+    for sheet_id, report_type in sheet_ids.items():
+        SheetRegistry.objects.update_or_create(
+            sheet_id=sheet_id,
+            defaults={'clinic_spreadsheet': clinic_spreadsheet, 'report_type': report_type}
+        )
+        cache.delete(_cache_key(sheet_id))
+
+
+def _find_by_columns(sheet_id):
+    """The old lookup over all five sheet id columns, only used when the registry has no valid entry"""
+    query = Q()
+    for report_type in REPORT_TITLES:
+        query |= Q(**{f'{report_type}_sheet_id': sheet_id})
+    clinic_spreadsheet = ClinicSpreadsheet.objects.select_related('clinic').filter(query).first()
+    if clinic_spreadsheet:
+        register_clinic_sheets(clinic_spreadsheet)
+    return clinic_spreadsheet
+
+
+def lookup_sheet(sheet_id):
+    """
+    Returns (clinic spreadsheet, report type, schema) for a sheet id, or (None, None, []) if no clinic owns it.
+    Only ids are cached, the clinic spreadsheet is always read fresh since callers update it.
+    """
+    if not sheet_id:
+        return None, None, []
+
+    entry = cache.get(_cache_key(sheet_id))
+    if entry is None:
+        registered = SheetRegistry.objects.filter(sheet_id=sheet_id).values(
+            'clinic_spreadsheet_id', 'report_type', 'schema').first()
+        if registered:
+            entry = (registered['clinic_spreadsheet_id'], registered['report_type'], registered['schema'])
+            cache.set(_cache_key(sheet_id), entry, CACHE_SECONDS)
+
+    if entry is not None:
+        clinic_spreadsheet_id, report_type, schema = entry
+        clinic_spreadsheet = ClinicSpreadsheet.objects.select_related('clinic').filter(id=clinic_spreadsheet_id).first()
+        if clinic_spreadsheet and getattr(clinic_spreadsheet, f'{report_type}_sheet_id') == sheet_id:
+            return clinic_spreadsheet, report_type, schema
+        cache.delete(_cache_key(sheet_id))
+
+    clinic_spreadsheet = _find_by_columns(sheet_id)
+    if clinic_spreadsheet is None:
+        return None, None, []
+    for report_type in REPORT_TITLES:
+        if getattr(clinic_spreadsheet, f'{report_type}_sheet_id') == sheet_id:
+            return clinic_spreadsheet, report_type, []
+    return None, None, []
+
+
+def record_sheet_schema(sheet_id, headers):
+    """Keeps the header row we last wrote to a sheet"""
+    headers = [str(header) for header in headers]
+    if SheetRegistry.objects.filter(sheet_id=sheet_id).update(schema=headers):
+        cache.delete(_cache_key(sheet_id))
@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+import time
+from django.conf import settings
+from ..utils import lazy_import
+
+pd = lazy_import('pandas')
+
+#THIS FILE STAGES PARSED UPLOADS AND MERGE RESULTS BETWEEN REQUESTS OF THE UPLOAD/MERGE FLOW
+#frames are stored once as parquet under the sha256 of their content, the session only keeps the key.
+#anything not used for UPLOAD_STAGING_TTL_SECONDS is swept away, so abandoned uploads do not pile up
+
+
+def _staging_path(key):
+    return os.path.join(settings.UPLOAD_STAGING_DIR, f'{key}.parquet')
+
+
+def content_key(raw_bytes):
+    """sha256 hex digest used as the staging key for raw uploaded bytes"""
+    return hashlib.sha256(raw_bytes).hexdigest()
+
+
+def _arrow_safe(df):
+    # csv columns with blanks come out of fillna('') as a mix of floats and '', parquet needs one type per column.
+    # the merge flow compares everything as str() anyway so those columns are stored as strings
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            df[col] = df[col].astype(str)
+    return df
+
+
+def frame_to_bytes(df):
+    """Parquet bytes of df, used for staged files and for payloads kept in the database"""
+    buffer = io.BytesIO()
+    _arrow_safe(df).to_parquet(buffer, engine='pyarrow', index=False)
+    return buffer.getvalue()
+
+
+def frame_from_bytes(data):
+    return pd.read_parquet(io.BytesIO(bytes(data)), engine='pyarrow')
+
+
+def stage_frame(df, key=None):
+    """
+    Stores df and returns its staging key. key defaults to the sha256 of the stored parquet bytes,
+    so staging the same frame twice keeps one file.
+    """
+    data = frame_to_bytes(df)
+    key = key or content_key(data)
+
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    path = _staging_path(key)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        # write then rename so another worker never reads a half written file
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    sweep_expired()
+    return key
+
+
+def has_frame(key):
+    return bool(key) and os.path.exists(_staging_path(key))
+
+
+def load_frame(key):
+    """Returns the staged frame for key, or None if it was never staged or has expired"""
+    if not has_frame(key):
+        return None
+    path = _staging_path(key)
+    try:
+        df = pd.read_parquet(path, engine='pyarrow')
+        os.utime(path)  # still in use, restart its TTL
+        return df
+    except (OSError, ValueError) as e:
+        print(f"Error loading staged frame {key}: {e}")
+        return None
+
+
+def sweep_expired():
+    """Deletes staged frames that have not been used for UPLOAD_STAGING_TTL_SECONDS"""
+    cutoff = time.time() - settings.UPLOAD_STAGING_TTL_SECONDS
+    try:
+        entries = list(os.scandir(settings.UPLOAD_STAGING_DIR))
+    except FileNotFoundError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                print(f"Removed expired staged upload {entry.name}")
+        except FileNotFoundError:
+            pass  # another worker swept it first
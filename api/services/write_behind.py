@@ -0,0 +1,141 @@
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+from ..models import PendingSheetWrite
+from .locks import file_lock
+from .upload_staging import frame_to_bytes, frame_from_bytes
+from ..utils import lazy_import
+
+pd = lazy_import('pandas')
+
+#THIS FILE HOLDS UPLOADS IN WRITE-BEHIND MODE (SHEET_WRITE_BEHIND) UNTIL THEY ARE PUSHED TO GOOGLE
+#every upload is saved as a PendingSheetWrite row straight away, the flusher then merges all rows pending
+#for a sheet with what is on the sheet and writes it once, instead of one full rewrite per upload
+_flusher_started = False
+_flusher_guard = threading.Lock()
+
+
+def queue_sheet_write(sheet_id, sheet_type, df):
+    """Saves the rows for the flusher and makes sure this process has a flusher running"""
+    PendingSheetWrite.objects.create(
+        sheet_id=sheet_id,
+        sheet_type=sheet_type,
+        payload=frame_to_bytes(df),
+        row_count=len(df),
+    )
+    start_flusher()
+    return 'queued'
+
+
+def flush_pending_sheet_writes(sheet_id=None):
+    """
+    Pushes everything pending (for one sheet or all of them) to google, one write per sheet.
+    Rows that arrive while a sheet is being written wait for the next flush. A failed sheet keeps its rows
+    and is tried again next time. Returns {sheet_id: number of uploads written}.
+    """
+    # Imported here since the views import this module
+    from ..views import SpreadsheetViewSet
+    spreadsheet_view = SpreadsheetViewSet()
+    flushed = {}
+
+    # one flusher at a time across workers, the others would only find the same rows
+    with file_lock('write-behind-flush'):
+        pending = PendingSheetWrite.objects.all()
+        if sheet_id:
+            pending = pending.filter(sheet_id=sheet_id)
+
+        by_sheet = {}
+        for pending_write in pending:
+            by_sheet.setdefault(pending_write.sheet_id, []).append(pending_write)
+
+        for target_sheet_id, pending_writes in by_sheet.items():
+            try:
+                combined_df = pd.concat(
+                    [frame_from_bytes(pending_write.payload) for pending_write in pending_writes],
+                    ignore_index=True
+                ).fillna('')
+                # same dedupe and sort as a direct upload, under the sheet's write lock
+                spreadsheet_view._upload_to_sheet(
+                    target_sheet_id,
+                    combined_df,
+                    sheet_type=pending_writes[0].sheet_type
+                )
+                PendingSheetWrite.objects.filter(id__in=[pending_write.id for pending_write in pending_writes]).delete()
+                flushed[target_sheet_id] = len(pending_writes)
+                print(f"Flushed {len(pending_writes)} pending uploads ({len(combined_df)} rows) to {target_sheet_id}")
+            except Exception as e:
+                print(f"Error flushing pending writes for {target_sheet_id}: {e}")
+                traceback.print_exc()
+                for pending_write in pending_writes:
+                    pending_write.attempts += 1
+                    pending_write.last_error = str(e)
+                    pending_write.save(update_fields=['attempts', 'last_error'])
+
+    return flushed
+
+
+def flush_before_read(sheet_ids):
+    """
+    Flushes what is pending for sheet_ids so reading them sees every upload.
+    Returns the ids of those sheets that still have pending uploads (a failed flush or rows that just arrived).
+    """
+    pending = set(PendingSheetWrite.objects.filter(sheet_id__in=sheet_ids).values_list('sheet_id', flat=True))
+    for sheet_id in sorted(pending):
+        flush_pending_sheet_writes(sheet_id)
+    return sorted(set(PendingSheetWrite.objects.filter(sheet_id__in=pending).values_list('sheet_id', flat=True)))
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(settings.SHEET_WRITE_BEHIND_FLUSH_SECONDS)
+        try:
+            flush_pending_sheet_writes()
+        except Exception as e:
+            print(f"Write-behind flusher error: {e}")
+        finally:
+            connection.close()
+
+
+def start_flusher():
+    """
+    Starts this process's background flusher thread once (gunicorn workers each start their own).
+    Every server process starts it from ApiConfig.ready, so uploads queued before a restart are not left waiting
+    for the next upload. flush_sheet_writes does the same from cron.
+    """
+    global _flusher_started
+    with _flusher_guard:
+        if _flusher_started:
+            return
+        threading.Thread(target=_flusher_loop, name='sheet-write-behind', daemon=True).start()
+        _flusher_started = True
+
+
+def write_queue_status():
+    """Queue depth and lag per sheet for the admin endpoint"""
+    now = timezone.now()
+    sheets = []
+    for row in (PendingSheetWrite.objects.values('sheet_id', 'sheet_type')
+                .annotate(pending_uploads=Count('id'), pending_rows=Sum('row_count'),
+                          oldest=Min('created_at'), attempts=Sum('attempts'))
+                .order_by('oldest')):
+        sheets.append({
+            'sheet_id': row['sheet_id'],
+            'sheet_type': row['sheet_type'],
+            'pending_uploads': row['pending_uploads'],
+            'pending_rows': row['pending_rows'] or 0,
+            'lag_seconds': int((now - row['oldest']).total_seconds()),
+            'failed_attempts': row['attempts'] or 0,
+        })
+
+    return {
+        'enabled': settings.SHEET_WRITE_BEHIND,
+        'flush_interval_seconds': settings.SHEET_WRITE_BEHIND_FLUSH_SECONDS,
+        'pending_uploads': sum(sheet['pending_uploads'] for sheet in sheets),
+        'pending_rows': sum(sheet['pending_rows'] for sheet in sheets),
+        'max_lag_seconds': max((sheet['lag_seconds'] for sheet in sheets), default=0),
+        'sheets': sheets,
+    }
@@ -1,3 +1,234 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from registration.models import CommissionContractor, UserProfile
+from .models import Clinic, PayrollLedgerEntry, PayrollRecords, PayrollYearToDate
+from .payroll_generation.ledger import post_entries, posted_amounts, rebuild_year_to_date, year_to_date
+from .payroll_generation.money import percent_of, series_to_cents, split_cents, to_cents
+from .payroll_generation.payroll_views import PayrollViewSet
 
-# Create your tests here.
+
+def make_payroll_record(user, model=PayrollRecords, **fields):
+    """A PayrollRecords row of user for 2025-03-01..15, zero amounts unless given"""
+    amounts = dict.fromkeys([
+        'subtotal_income', 'hours_worked', 'vacation_pay', 'overtime_pay', 'revenue_share_income', 'gst',
+        'total_income', 'commission_deduction', 'pos_fees', 'provincial_income_tax', 'federal_income_tax',
+        'cpp_contrib', 'cpp_er', 'ei_contrib', 'ei_er', 'rent', 'revenue_share_deduction', 'total_deductions',
+        'net_payment'], 0)
+    amounts.update({'period_start': date(2025, 3, 1), 'period_end': date(2025, 3, 15), **fields})
+    amounts.setdefault('payroll_number', f"PAY-{user.id}-{amounts['period_start']:%Y%m%d}")
+    return model.objects.create(user_id=user.id, email=user.email, role_type='Hourly Contractor', **amounts)
+
+
+class MoneyTests(TestCase):
+
+    def test_to_cents_rounds_half_up(self):
+        self.assertEqual(to_cents(1.005), 101)
+        self.assertEqual(to_cents('0.125'), 13)
+        self.assertEqual(to_cents(Decimal('2.675')), 268)
+        self.assertEqual(to_cents(-1.005), -101)
+
+    def test_to_cents_reads_sheet_text(self):
+        self.assertEqual(to_cents('$1,234.50'), 123450)
+        self.assertEqual(to_cents('(12.00)'), -1200)
+        self.assertEqual(to_cents('($3.50)'), -350)
+
+    def test_to_cents_blank_values_are_zero(self):
+        self.assertEqual(to_cents(None), 0)
+        self.assertEqual(to_cents(float('nan')), 0)
+        self.assertEqual(to_cents(''), 0)
+        self.assertEqual(to_cents('n/a'), 0)
+
+    def test_series_to_cents_matches_to_cents(self):
+        values = ['$1,234.50', '(12.00)', '', None, 'n/a', '0.125', '19.99']
+        self.assertEqual(list(series_to_cents(values)), [to_cents(value) for value in values])
+
+    def test_series_to_cents_absorbs_float_error(self):
+        # 0.29 * 100 and 1.005 * 100 are just under 29 and 100.5 as floats
+        self.assertEqual(list(series_to_cents([0.29, 1.005, -1.005, 0.1 + 0.2])), [29, 101, -101, 30])
+
+    def test_percent_of(self):
+        self.assertEqual(percent_of(10000, 5.95), 595)
+        self.assertEqual(percent_of(1050, 5), 53)
+        self.assertEqual(percent_of(-1050, 5), -53)
+        self.assertEqual(percent_of(0, 12.5), 0)
+
+    def test_split_cents_adds_up_to_the_amount(self):
+        self.assertEqual(split_cents(10000, [1, 1, 1]), [3334, 3333, 3333])
+        self.assertEqual(split_cents(1001, [5000, 2500, 2500]), [501, 250, 250])
+        self.assertEqual(sum(split_cents(9999, [1234, 777, 3])), 9999)
+        self.assertEqual(split_cents(500, [0, 0]), [0, 0])
+
+
+class CommissionPayrollTests(TestCase):
+
+    def test_commission_split_adds_up_to_the_adjusted_total(self):
+        user = User.objects.create(username='practitioner')
+        user_profile = UserProfile.objects.create(user=user)
+        CommissionContractor.objects.create(user_profile=user_profile, commission_rate=Decimal('0.50'))
+        user_profile.refresh_from_db()
+
+        payroll_data = PayrollViewSet()._calculate_commission_payroll(
+            user, user_profile, {'adjusted_total': 100.01, 'tax_gst': 5.00}, 1.25, None,
+            date(2025, 3, 1), date(2025, 3, 15), 15)
+
+        self.assertEqual(payroll_data['earnings']['commission_earned'], 50.01)
+        self.assertEqual(payroll_data['deductions']['commission_deduction'], 50.00)
+        self.assertEqual(payroll_data['totals']['total_deductions'], 56.25)
+        self.assertEqual(payroll_data['totals']['net_payment'], 43.76)
+
+    def test_vacation_pay_is_whole_cents(self):
+        site_settings = SimpleNamespace(vacation_pay_rate=Decimal('4.000'))
+        self.assertEqual(PayrollViewSet()._calculate_vacation_pay_only(5001, site_settings), 200)
+
+
+class PayrollLedgerTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='member', email='member@example.com')
+
+    def test_post_entries_adds_to_year_to_date(self):
+        record = make_payroll_record(self.user)
+        post_entries([
+            PayrollLedgerEntry(user=self.user, year=2025, payroll_record=record, entry_type='payroll',
+                               earnings=Decimal('1000.00'), deductions=Decimal('200.00'), cpp=Decimal('50.00'),
+                               ei=Decimal('16.40')),
+            PayrollLedgerEntry(user=self.user, year=2025, payroll_record=record, entry_type='adjustment',
+                               earnings=Decimal('-100.00'), deductions=Decimal('0'), cpp=Decimal('-5.00'),
+                               ei=Decimal('0')),
+        ])
+
+        ytd = year_to_date(self.user.id, 2025)
+        self.assertEqual((ytd.earnings, ytd.deductions, ytd.cpp, ytd.ei),
+                         (Decimal('900.00'), Decimal('200.00'), Decimal('45.00'), Decimal('16.40')))
+        self.assertEqual(posted_amounts([record.id])[record.id]['earnings'], Decimal('900.00'))
+        self.assertEqual(year_to_date(self.user.id, 2026).earnings, 0)
+
+    def test_rebuild_detects_and_fixes_drifted_totals(self):
+        post_entries([PayrollLedgerEntry(user=self.user, year=2025, entry_type='payroll', earnings=Decimal('500.00'),
+                                         deductions=Decimal('80.00'), cpp=Decimal('20.00'), ei=Decimal('8.00'))])
+        PayrollYearToDate.objects.filter(user=self.user, year=2025).update(earnings=Decimal('999.99'))
+
+        mismatches = rebuild_year_to_date(fix=False)
+        self.assertEqual(mismatches, [(self.user.id, 2025, {'earnings': (Decimal('999.99'), Decimal('500.00'))})])
+        self.assertEqual(year_to_date(self.user.id, 2025).earnings, Decimal('999.99'))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_payroll_ytd', '--check', stdout=StringIO())
+        call_command('rebuild_payroll_ytd', stdout=StringIO())
+        self.assertEqual(year_to_date(self.user.id, 2025).earnings, Decimal('500.00'))
+        call_command('rebuild_payroll_ytd', '--check', stdout=StringIO())
+
+    def test_rebuild_recreates_a_missing_row(self):
+        post_entries([PayrollLedgerEntry(user=self.user, year=2024, entry_type='opening', earnings=Decimal('10.00'),
+                                         deductions=Decimal('0'), cpp=Decimal('0'), ei=Decimal('0'))])
+        PayrollYearToDate.objects.all().delete()
+
+        self.assertEqual(len(rebuild_year_to_date(year=2024)), 1)
+        self.assertEqual(PayrollYearToDate.objects.get(user=self.user, year=2024).earnings, Decimal('10.00'))
+        self.assertEqual(rebuild_year_to_date(), [])
+
+
+class PayrollSendTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='member', email='member@example.com')
+        self.clinic = Clinic.objects.create(name='Clinic')
+
+    def payroll_data(self, earnings, deductions, cpp, ei):
+        return {
+            'user_id': self.user.id,
+            'pay_period_start': '2025-03-01',
+            'pay_period_end': '2025-03-15',
+            'role_type': 'Hourly Contractor',
+            'totals': {'total_earnings': earnings, 'total_deductions': deductions, 'net_payment': earnings - deductions},
+            'deductions': {'cpp': cpp, 'ei': ei},
+        }
+
+    def test_resend_posts_only_the_difference(self):
+        view = PayrollViewSet()
+        view._send_payrolls([(self.user, self.payroll_data(1000, 200, 50, 16.4), self.clinic)])
+        results = view._send_payrolls([(self.user, self.payroll_data(1000, 200, 50, 16.4), self.clinic)])
+        self.assertEqual(results[self.user.id]['status'], 'already_sent')
+
+        results = view._send_payrolls([(self.user, self.payroll_data(1100, 220, 55, 16.4), self.clinic)],
+                                      resend=True)
+        self.assertEqual(results[self.user.id]['status'], 'sent')
+        self.assertEqual(PayrollRecords.objects.filter(user=self.user).count(), 1)
+
+        ytd = PayrollYearToDate.objects.get(user=self.user, year=2025)
+        self.assertEqual((ytd.earnings, ytd.deductions, ytd.cpp, ytd.ei),
+                         (Decimal('1100.00'), Decimal('220.00'), Decimal('55.00'), Decimal('16.40')))
+        adjustment = PayrollLedgerEntry.objects.get(user=self.user, entry_type='adjustment')
+        self.assertEqual((adjustment.earnings, adjustment.deductions, adjustment.cpp, adjustment.ei),
+                         (Decimal('100.00'), Decimal('20.00'), Decimal('5.00'), Decimal('0.00')))
+    def test_sending_a_generated_record_posts_it_once(self):
+        make_payroll_record(self.user, payroll_number='AUTO-1', notes='AUTO-generated payroll record')
+        view = PayrollViewSet()
+        view._send_payrolls([(self.user, self.payroll_data(1000, 200, 50, 16.4), self.clinic)])
+        view._send_payrolls([(self.user, self.payroll_data(1000, 200, 50, 16.4), self.clinic)])
+
+        record = PayrollRecords.objects.get(user=self.user)
+        self.assertIsNotNone(record.sent_at)
+        self.assertEqual(PayrollLedgerEntry.objects.filter(payroll_record=record).count(), 1)
+        self.assertEqual(year_to_date(self.user.id, 2025).earnings, Decimal('1000.00'))
+
+
+class LinkSentPayrollsMigrationTests(TransactionTestCase):
+    """Migration 0037: payrolls sent before the ledger get linked opening entries"""
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([('api', '0036_backfill_payroll_sent_at')])
+        self.apps = self.executor.loader.project_state([('api', '0036_backfill_payroll_sent_at')]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_sent_payrolls_are_linked_without_changing_opening_totals(self):
+        PayrollLedgerEntry = self.apps.get_model('api', 'PayrollLedgerEntry')
+        PayrollYearToDate = self.apps.get_model('api', 'PayrollYearToDate')
+        PayrollRecords = self.apps.get_model('api', 'PayrollRecords')
+        with_opening = User.objects.create(username='with_opening')
+        without_opening = User.objects.create(username='without_opening')
+        sent_at = '2025-03-16T00:00:00Z'
+
+        # with_opening's opening balance of 2025 already counts the payroll sent before the ledger
+        PayrollLedgerEntry.objects.create(user_id=with_opening.id, year=2025, entry_type='opening',
+                                          earnings=Decimal('1000.00'), deductions=Decimal('100.00'),
+                                          cpp=Decimal('40.00'), ei=Decimal('10.00'))
+        PayrollYearToDate.objects.create(user_id=with_opening.id, year=2025, earnings=Decimal('1000.00'),
+                                         deductions=Decimal('100.00'), cpp=Decimal('40.00'), ei=Decimal('10.00'))
+        first = make_payroll_record(with_opening, PayrollRecords, sent_at=sent_at, total_income=Decimal('400.00'),
+                                    total_deductions=Decimal('50.00'), cpp_contrib=Decimal('20.00'),
+                                    ei_contrib=Decimal('5.00'))
+        second = make_payroll_record(without_opening, PayrollRecords, sent_at=sent_at,
+                                     total_income=Decimal('300.00'), total_deductions=Decimal('30.00'),
+                                     cpp_contrib=Decimal('15.00'), ei_contrib=Decimal('4.00'))
+        make_payroll_record(without_opening, PayrollRecords, period_start=date(2025, 4, 1),
+                            period_end=date(2025, 4, 15), total_income=Decimal('999.00'))  # not sent, left alone
+
+        self.executor.loader.build_graph()
+        self.executor.migrate([('api', '0037_link_sent_payrolls_to_ledger')])
+
+        linked = PayrollLedgerEntry.objects.get(payroll_record_id=first.id)
+        self.assertEqual((linked.entry_type, linked.earnings, linked.cpp),
+                         ('opening', Decimal('400.00'), Decimal('20.00')))
+        offset = PayrollLedgerEntry.objects.get(user_id=with_opening.id, payroll_record__isnull=True,
+                                                earnings__lt=0)
+        self.assertEqual((offset.earnings, offset.deductions, offset.cpp, offset.ei),
+                         (Decimal('-400.00'), Decimal('-50.00'), Decimal('-20.00'), Decimal('-5.00')))
+        self.assertEqual(year_to_date(with_opening.id, 2025).earnings, Decimal('1000.00'))
+
+        self.assertEqual(posted_amounts([second.id])[second.id]['earnings'], Decimal('300.00'))
+        self.assertEqual(year_to_date(without_opening.id, 2025).earnings, Decimal('300.00'))
+        self.assertEqual(PayrollLedgerEntry.objects.filter(user_id=without_opening.id).count(), 1)
+        self.assertEqual(rebuild_year_to_date(fix=False), [])
@@ -1,10 +1,50 @@
 import os
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+import functools
+import importlib
+import threading
 from django.conf import settings
 
+
+class _LazyModule:
+    """Stands in for a module until one of its attributes is used, then imports it (once, across threads)"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        with _lazy_import_lock:
+            module = importlib.import_module(self._name)
+        value = getattr(module, attr)
+        setattr(self, attr, value)  # later lookups skip __getattr__
+        return value
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+_lazy_import_lock = threading.RLock()
+
+
+#returns a module that is only imported at first use, for the heavy libraries (pandas, numpy, the google api client)
+#so worker boot and management commands that never touch them do not pay for importing them
+def lazy_import(name):
+    return _LazyModule(name)
+
+
+httplib2 = lazy_import('httplib2')
+google_auth_httplib2 = lazy_import('google_auth_httplib2')
+service_account = lazy_import('google.oauth2.service_account')
+discovery = lazy_import('googleapiclient.discovery')
+google_requests = lazy_import('google.auth.transport.requests')
+
 #THIS FILE IS USED TO GET GOOGLE API CREDENTIAL OBJECTS
+#every http call made with them gives up after GOOGLE_API_TIMEOUT_SECONDS instead of hanging the worker
+def _refresh_request():
+    return functools.partial(google_requests.Request(), timeout=settings.GOOGLE_API_TIMEOUT_SECONDS)
+
+def _authorized_http(creds):
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=settings.GOOGLE_API_TIMEOUT_SECONDS))
+
 #returns sheets api credential object
 def get_google_sheets_service_creds():
     print(f"Service account file path: {settings.GOOGLE_SERVICE_ACCOUNT_KEY}")
@@ -23,14 +63,14 @@ def get_google_sheets_service_creds():
 
     # Force refresh the token
     try:
-        creds.refresh(Request())
+        creds.refresh(_refresh_request())
         print(f"Token valid after refresh: {creds.valid}")
         print("Credentials refreshed successfully")
     except Exception as e:
         print(f"Error refreshing credentials: {e}")
         return None
 
-    return build('sheets', 'v4', credentials=creds)
+    return discovery.build('sheets', 'v4', http=_authorized_http(creds))
 
 #gets google drive service credentials (USED IN CREATING SPREADSHEET)
 def get_google_drive_service_creds():
@@ -43,10 +83,10 @@ def get_google_drive_service_creds():
 
     # Force refresh the token
     try:
-        creds.refresh(Request())
+        creds.refresh(_refresh_request())
         print(f"Token valid after refresh: {creds.valid}")
         print("Credentials refreshed successfully")
     except Exception as e:
         print(f"Error refreshing credentials: {e}")
         return None
-    return build('drive', 'v3', credentials=creds, developerKey=settings.GOOGLE_API_KEY)
+    return discovery.build('drive', 'v3', http=_authorized_http(creds), developerKey=settings.GOOGLE_API_KEY)
@@ -12,8 +12,20 @@ from django.db import transaction
 import re
 from api.serializers import *
 from .services.google_sheets import *
-import pandas as pd
-import tempfile
+import io
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from .utils import lazy_import
+from .services.upload_staging import content_key, stage_frame, load_frame
+from .services.locks import sheet_write_lock, sheet_write_token, StaleSheetWrite
+from .services.write_behind import queue_sheet_write, write_queue_status
+from .services.sheet_index import SheetIndex, SORT_DATE_COLUMNS, row_hashes, sort_keys_for
+from .services.date_formats import get_date_format, parse_dates, remember_date_formats
+from .renderers import to_columns, wants_columnar
+from .services.sheet_registry import REPORT_TITLES, lookup_sheet, record_sheet_schema, register_clinic_sheets
 from django.middleware.csrf import get_token
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -22,6 +34,9 @@ from .models import *
 from collections import defaultdict
 from rest_framework.permissions import AllowAny
 
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
 # Create your views here.
 
 @login_required(login_url='/registration/login_user/') #view for loading the user into the react app
@@ -85,7 +100,7 @@ class ClinicViewSet(viewsets.ViewSet):
         return user.is_staff or user.is_superuser
 
     def _delete_clinic_sheets(self, clinic):
-        """Delete the 5 Google Sheets for a clinic"""
+        """Delete the 5 Google Sheets for a clinic in one batch request"""
         try:
             spreadsheets = clinic.spreadsheets
 
@@ -97,17 +112,13 @@ class ClinicViewSet(viewsets.ViewSet):
                 spreadsheets.time_hour_sheet_id  # Added 5th sheet
             ]
 
-            deleted_count = 0
+            deleted_ids = delete_google_sheets_batch(sheet_ids)
             for sheet_id in sheet_ids:
-                if sheet_id:
-                    if delete_google_sheet(sheet_id):
-                        print(f"Successfully deleted Google Sheet: {sheet_id}")
-                        deleted_count += 1
-                    else:
-                        print(f"Failed to delete Google Sheet: {sheet_id}")
+                if sheet_id and sheet_id not in deleted_ids:
+                    print(f"Failed to delete Google Sheet: {sheet_id}")
 
-            print(f"Successfully deleted {deleted_count} out of {len([id for id in sheet_ids if id])} sheets")
-            return deleted_count
+            print(f"Successfully deleted {len(deleted_ids)} out of {len([id for id in sheet_ids if id])} sheets")
+            return len(deleted_ids)
 
         except ClinicSpreadsheet.DoesNotExist:
             print("No spreadsheets found for clinic")
@@ -117,48 +128,45 @@ class ClinicViewSet(viewsets.ViewSet):
             return 0
 
     def _create_clinic_sheets(self, clinic):
-        """Create the 5 Google Sheets for a clinic"""
+        """
+        Create the 5 Google Sheets for a clinic in one batch request.
+        Either all 5 sheets are created and saved, or none are kept.
+        """
         try:
             # Define sheet titles
             sheet_titles = {
-                'compensation_sales': f"{clinic.name} - Compensation + Sales Report",
-                'daily_transaction': f"{clinic.name} - Daily Transaction Report",
-                'transaction_report': f"{clinic.name} - Transaction Report",
-                'payment_transaction': f"{clinic.name} - Payment Transaction Report",
-                'time_hour': f"{clinic.name} - Hours Report"  # Added 5th sheet
+                sheet_type: f"{clinic.name} - {title}" for sheet_type, title in REPORT_TITLES.items()
             }
 
-            # Create each sheet and collect IDs
-            sheet_ids = {}
-            for sheet_type, title in sheet_titles.items():
-                sheet_id = create_new_google_sheet(title)
-                if sheet_id:
-                    sheet_ids[f"{sheet_type}_sheet_id"] = sheet_id
-                    print(f"Created {sheet_type} sheet: {sheet_id}")
-                else:
-                    print(f"Failed to create {sheet_type} sheet")
-                    # If any sheet fails, we might want to clean up or handle differently
+            # Create every sheet in one batch, failed batches are rolled back by the helper
+            sheet_ids = create_google_sheets_batch(sheet_titles)
+            if not sheet_ids:
+                print(f"Failed to create sheets for clinic {clinic.name}, no sheets were kept")
+                return None
 
             # Create or update ClinicSpreadsheet record
             spreadsheet_data = {
-                'compensation_sales_sheet_id': sheet_ids.get('compensation_sales_sheet_id'),
-                'daily_transaction_sheet_id': sheet_ids.get('daily_transaction_sheet_id'),
-                'transaction_report_sheet_id': sheet_ids.get('transaction_report_sheet_id'),
-                'payment_transaction_sheet_id': sheet_ids.get('payment_transaction_sheet_id'),
-                'time_hour_sheet_id': sheet_ids.get('time_hour_sheet_id')  # Added 5th sheet
+                f"{sheet_type}_sheet_id": sheet_id for sheet_type, sheet_id in sheet_ids.items()
             }
 
-            clinic_spreadsheet, created = ClinicSpreadsheet.objects.get_or_create(
-                clinic=clinic,
-                defaults=spreadsheet_data
-            )
+            try:
+                clinic_spreadsheet, created = ClinicSpreadsheet.objects.get_or_create(
+                    clinic=clinic,
+                    defaults=spreadsheet_data
+                )
 
-            if not created:
-                # Update existing record
-                for field, value in spreadsheet_data.items():
-                    if value:  # Only update if we got a valid sheet ID
+                if not created:
+                    # Update existing record
+                    for field, value in spreadsheet_data.items():
                         setattr(clinic_spreadsheet, field, value)
-                clinic_spreadsheet.save()
+                    clinic_spreadsheet.save()
+
+                # Sheet id -> clinic and report type, for the ownership lookups of every sheet request
+                register_clinic_sheets(clinic_spreadsheet)
+            except Exception:
+                # The sheets exist in the drive but nothing points at them, remove them again
+                delete_google_sheets_batch(sheet_ids.values())
+                raise
 
             return clinic_spreadsheet
 
@@ -331,14 +339,15 @@ class DashboardViewSet(viewsets.ViewSet):
 
             print(f"Date range: {start_date} to {end_date}")  # Debug
 
-            # Read transaction data from Google Sheet
-            sheet_data = read_google_sheets(clinic_spreadsheet.daily_transaction_sheet_id, "A:D")
+            # Read transaction data from Google Sheet, falling back to the last snapshot while google is down
+            sheet_data, is_stale = read_google_sheets_or_snapshot(clinic_spreadsheet.daily_transaction_sheet_id, "A:D")
 
             if not sheet_data or len(sheet_data) < 2:
                 print("No sheet data found")  # Debug
                 return Response({
                     'weeklyReport': [],
-                    'monthlyReport': []
+                    'monthlyReport': [],
+                    'stale': is_stale
                 })
 
             print(f"Sheet data rows: {len(sheet_data)}")  # Debug
@@ -352,8 +361,8 @@ class DashboardViewSet(viewsets.ViewSet):
             print(f"DataFrame shape before cleaning: {df.shape}")  # Debug
 
             # Clean and filter data
-            # Handle different possible date formats
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce', infer_datetime_format=True)
+            # Dates in the format detected when the sheet was uploaded (guessed if there is none stored)
+            df['Date'] = parse_dates(df['Date'], get_date_format(clinic_spreadsheet, 'daily_transaction', 'Date'))
             df['Total'] = pd.to_numeric(df['Total'], errors='coerce').fillna(0)
 
             print(f"DataFrame shape after date conversion: {df.shape}")  # Debug
@@ -385,6 +394,7 @@ class DashboardViewSet(viewsets.ViewSet):
                 return Response({
                     'weeklyReport': [],
                     'monthlyReport': [],
+                    'stale': is_stale,
                     'debug': {
                         'total_rows_from_sheet': len(data_rows),
                         'date_range': f"{start_date} to {end_date}",
@@ -511,6 +521,7 @@ class DashboardViewSet(viewsets.ViewSet):
             return Response({
                 'weeklyReport': weekly_report,
                 'monthlyReport': monthly_report,
+                'stale': is_stale,
                 'debug': {
                     'transaction_rows_processed': len(df),
                     'payroll_records_found': len(payroll_records),
@@ -520,6 +531,11 @@ class DashboardViewSet(viewsets.ViewSet):
                 }
             })
 
+        except GoogleSheetsUnavailable as e:
+            return Response(
+                {'error': f'Google Sheets is unavailable right now, please try again shortly: {str(e)}'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             print(f"Error in income_report: {str(e)}")  # Debug
             import traceback
@@ -925,6 +941,12 @@ class MemberViewSet(viewsets.ViewSet):
             )
 
 
+# Uploads to different sheets run side by side in here, one sheet per task
+_sheet_upload_pool = ThreadPoolExecutor(max_workers=settings.SHEET_FETCH_MAX_WORKERS, thread_name_prefix='sheet-upload')
+MAX_ZIP_MEMBER_BYTES = 50 * 1024 * 1024
+MAX_INSERT_GROUPS = 200  # past this many separate insert points an upload rewrites the sheet instead
+
+
 class SpreadsheetViewSet(viewsets.ViewSet):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -941,69 +963,42 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         Returns the ClinicSpreadsheet object if found, None otherwise
         """
         try:
-            # Check all five possible sheet ID fields
-            clinic_spreadsheet = ClinicSpreadsheet.objects.filter(
-                models.Q(compensation_sales_sheet_id=sheet_id) |
-                models.Q(daily_transaction_sheet_id=sheet_id) |
-                models.Q(transaction_report_sheet_id=sheet_id) |
-                models.Q(payment_transaction_sheet_id=sheet_id) |
-                models.Q(time_hour_sheet_id=sheet_id)  # Added 5th sheet
-            ).first()
-
+            # One indexed lookup in the sheet registry (cached) instead of checking all five sheet ID fields
+            clinic_spreadsheet, report_type, schema = lookup_sheet(sheet_id)
             return clinic_spreadsheet
         except Exception as e:
             print(f"Error finding clinic spreadsheet: {e}")
             return None
 
-    def _get_sheet_info(self, clinic_spreadsheet, sheet_id):
+    def _get_sheet_info(self, clinic_spreadsheet, report_type):
         """
-        Get sheet information based on which field matches the sheet_id
+        Get sheet information from the report type lookup_sheet found the sheet registered as
         """
-        if clinic_spreadsheet.compensation_sales_sheet_id == sheet_id:
-            return {
-                'name': f"{clinic_spreadsheet.clinic.name} - Compensation + Sales Report",
-                'type': 'compensation_sales'
-            }
-        elif clinic_spreadsheet.daily_transaction_sheet_id == sheet_id:
-            return {
-                'name': f"{clinic_spreadsheet.clinic.name} - Daily Transaction Report",
-                'type': 'daily_transaction'
-            }
-        elif clinic_spreadsheet.transaction_report_sheet_id == sheet_id:
+        if clinic_spreadsheet is not None and report_type in REPORT_TITLES:
             return {
-                'name': f"{clinic_spreadsheet.clinic.name} - Transaction Report",
-                'type': 'transaction_report'
-            }
-        elif clinic_spreadsheet.payment_transaction_sheet_id == sheet_id:
-            return {
-                'name': f"{clinic_spreadsheet.clinic.name} - Payment Transaction Report",
-                'type': 'payment_transaction'
-            }
-        elif clinic_spreadsheet.time_hour_sheet_id == sheet_id:  # Added 5th sheet
-            return {
-                'name': f"{clinic_spreadsheet.clinic.name} - Hours Report",
-                'type': 'time_hour'
+                'name': f"{clinic_spreadsheet.clinic.name} - {REPORT_TITLES[report_type]}",
+                'type': report_type
             }
         return {'name': 'Unknown Sheet', 'type': 'unknown'}
 
-    def _clean_csv_file(self, file_path):
+    def _clean_csv_file(self, raw_bytes):
         """
         General CSV cleaning function that handles:
         - Extra header lines (like Jane Payments)
         - Empty lines
         - Malformed first lines
         - Encoding issues
-        Returns cleaned dataframe
+        Takes the raw bytes of the upload, returns cleaned dataframe
         """
         try:
             # First, try reading normally with UTF-8
-            df = pd.read_csv(file_path, encoding='utf-8').fillna('')
+            df = pd.read_csv(io.BytesIO(raw_bytes), encoding='utf-8').fillna('')
             if not df.empty and len(df.columns) > 3:  # Reasonable number of columns
                 return df
         except UnicodeDecodeError:
             # Try with latin1 encoding
             try:
-                df = pd.read_csv(file_path, encoding='latin1').fillna('')
+                df = pd.read_csv(io.BytesIO(raw_bytes), encoding='latin1').fillna('')
                 if not df.empty and len(df.columns) > 3:
                     return df
             except:
@@ -1012,12 +1007,7 @@ class SpreadsheetViewSet(viewsets.ViewSet):
             pass
 
         # If normal reading failed, try cleaning the file
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-        except UnicodeDecodeError:
-            with open(file_path, 'r', encoding='latin1', errors='ignore') as f:
-                lines = f.readlines()
+        lines = raw_bytes.decode('utf-8', errors='ignore').splitlines()
 
         # Remove empty lines and find the best header line
         non_empty_lines = [line.strip() for line in lines if line.strip()]
@@ -1035,22 +1025,27 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         # Use the cleaned lines from header onwards
         cleaned_lines = non_empty_lines[header_line_index:]
 
-        # Write to temp file and read as dataframe
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8',
-                                         newline='') as temp_file:
-            temp_file.write('\n'.join(cleaned_lines))
-            cleaned_path = temp_file.name
+        return pd.read_csv(io.StringIO('\n'.join(cleaned_lines))).fillna('')
 
-        try:
-            df = pd.read_csv(cleaned_path, encoding='utf-8').fillna('')
-            return df
-        except UnicodeDecodeError:
-            df = pd.read_csv(cleaned_path, encoding='latin1').fillna('')
-            return df
-        finally:
-            if os.path.exists(cleaned_path):
-                os.remove(cleaned_path)
+    def _read_uploaded_csv(self, uploaded_file):
+        """
+        Returns (staging key, cleaned dataframe) for an uploaded csv.
+        The key is the sha256 of the file, so a file that was already parsed and staged is not parsed again.
+        """
+        raw_bytes = b''.join(uploaded_file.chunks())
+        staging_key = content_key(raw_bytes)
+
+        df = load_frame(staging_key)
+        if df is None:
+            df = self._clean_csv_file(raw_bytes)
+        return staging_key, df
+
+    def _clear_merge_session(self, request):
+        """Drops the merge flow keys from the session"""
+        session_keys = ['staged_merge_key', 'staged_diff_key', 'staged_upload_key', 'uploaded_merge_column',
+                        'stored_merge_column', 'target_sheet_id', 'merge_base_token']
+        for key in session_keys:
+            request.session.pop(key, None)
 
     def _detect_csv_type(self, df):
         """
@@ -1099,37 +1094,15 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         except:
             return None
 
-    def _sort_dataframe_by_type(self, df, sheet_type):
+    def _sort_dataframe_by_type(self, df, sheet_type, date_format=None):
         """
         Sort dataframe based on sheet type requirements
         """
         try:
-            if sheet_type == 'payment_transaction':
-                # Sort by Payment column (integer) from biggest to smallest
-                if 'Payment' in df.columns:
-                    # Convert to numeric, treating non-numeric as 0
-                    df['_payment_sort'] = pd.to_numeric(df['Payment'], errors='coerce').fillna(0)
-                    df = df.sort_values('_payment_sort', ascending=False).drop('_payment_sort', axis=1)
-
-            elif sheet_type == 'daily_transaction':
-                # Sort by Date column from most recent to oldest
-                # Format: "August 02 2025, 11:00 AM"
-                if 'Date' in df.columns:
-                    df['_date_sort'] = pd.to_datetime(df['Date'], errors='coerce')
-                    df = df.sort_values('_date_sort', ascending=False, na_position='last').drop('_date_sort', axis=1)
-
-            elif sheet_type == 'transaction_report':
-                # Sort by Payment Date column from most recent to oldest
-                # Format: "07-21-2025"
-                if 'Payment Date' in df.columns:
-                    df['_date_sort'] = pd.to_datetime(df['Payment Date'], format='%m-%d-%Y', errors='coerce')
-                    df = df.sort_values('_date_sort', ascending=False, na_position='last').drop('_date_sort', axis=1)
-
-            elif sheet_type == 'time_hour':  # Added hours report sorting
-                # Sort by Date column from most recent to oldest
-                if 'Date' in df.columns:
-                    df['_date_sort'] = pd.to_datetime(df['Date'], errors='coerce')
-                    df = df.sort_values('_date_sort', ascending=False, na_position='last').drop('_date_sort', axis=1)
+            if sheet_type in ('payment_transaction', 'daily_transaction', 'transaction_report', 'time_hour'):
+                # Payment biggest first, or Date / Payment Date newest first (see sort_keys_for).
+                # The same keys are kept in the sheet index so later uploads can be sorted into place
+                df = df.take(np.argsort(sort_keys_for(df, sheet_type, date_format), kind='stable'))
 
             elif sheet_type == 'compensation_sales':
                 # Keep existing merge column sorting logic
@@ -1148,46 +1121,80 @@ class SpreadsheetViewSet(viewsets.ViewSet):
 
     def _upload_to_sheet(self, sheet_id, df, require_merge_column=False, sheet_type=None):
         """
-        Upload dataframe to Google Sheet, handling merge column logic, sorting, and duplicate prevention
+        Upload dataframe to Google Sheet, handling merge column logic, sorting, and duplicate prevention.
+        Uploads to the same sheet wait for each other, uploads to different sheets do not.
         """
-        clinic_spreadsheet = self._get_clinic_spreadsheet_by_sheet_id(sheet_id)
-        existing_data, existing_headers = padded_google_sheets(sheet_id, 'A1:Z5')
-        is_first_upload = not existing_data and not existing_headers
-
-        if require_merge_column:
-            # This is compensation_sales type - use existing merge logic
-            merge_column = self.detect_merge_column(df)
-            if not merge_column:
-                raise ValueError('This sheet type requires a column with format #####-P## or #####-C##')
-
-            if is_first_upload:
-                # Store merge column and sort data
-                clinic_spreadsheet.merge_column = merge_column
-                clinic_spreadsheet.save()
-                # Sort the dataframe
-                df = self._sort_dataframe_by_type(df, sheet_type)
-            else:
-                # For subsequent uploads, merge logic will be handled elsewhere
-                # Don't sort here as merge_dataframes_by_key handles its own sorting
-                pass
-        else:
-            # For non-merge based sheet types, handle duplicates with existing data
-            if not is_first_upload:
-                # Merge with existing data and remove duplicates
-                df = self._merge_with_existing_data(sheet_id, df, sheet_type)
+        # Everything from reading the sheet to writing it back happens under the sheet's write lock
+        with sheet_write_lock(sheet_id):
+            clinic_spreadsheet = self._get_clinic_spreadsheet_by_sheet_id(sheet_id)
+            existing_data, existing_headers = padded_google_sheets(sheet_id, 'A1:Z5')
+            is_first_upload = not existing_data and not existing_headers
+            sheet_index = None
+
+            # Detected once here so later reads of the sheet parse its dates with one known format
+            remember_date_formats(clinic_spreadsheet, sheet_type, df)
+            date_format = get_date_format(clinic_spreadsheet, sheet_type, SORT_DATE_COLUMNS.get(sheet_type))
+
+            if require_merge_column:
+                # This is compensation_sales type - use existing merge logic
+                merge_column = self.detect_merge_column(df)
+                if not merge_column:
+                    raise ValueError('This sheet type requires a column with format #####-P## or #####-C##')
+
+                if is_first_upload:
+                    # Store merge column and sort data
+                    clinic_spreadsheet.merge_column = merge_column
+                    clinic_spreadsheet.save()
+                    # Sort the dataframe
+                    df = self._sort_dataframe_by_type(df, sheet_type)
+                else:
+                    # Callers only get here for an empty sheet and merge otherwise, so another upload
+                    # filled it in the meantime. Writing now would overwrite that upload instead of merging
+                    raise StaleSheetWrite('The sheet was filled by another upload, upload again to merge')
             else:
-                # First upload - just remove duplicates within the new data and sort
-                df = self._remove_duplicate_rows(df, sheet_type)
-                df = self._sort_dataframe_by_type(df, sheet_type)
+                # For non-merge based sheet types, handle duplicates with existing data
+                if not is_first_upload:
+                    # Sheet unchanged since our last upload: insert only the new rows where they sort to
+                    if self._insert_into_sorted_sheet(sheet_id, df, sheet_type, existing_headers, date_format):
+                        return 'data_updated'
+
+                    # Merge with existing data and remove duplicates
+                    df, sheet_index = self._merge_with_existing_data(sheet_id, df, sheet_type, date_format)
+                else:
+                    # First upload - just remove duplicates within the new data and sort
+                    df = self._remove_duplicate_rows(df, sheet_type)
+                    df = self._sort_dataframe_by_type(df, sheet_type, date_format)
+                    sheet_index = SheetIndex.build(sheet_id, df, sheet_type, date_format)
+
+            # Ensure data is clean before uploading
+            df = df.fillna('').replace([float('inf'), float('-inf')], '')
 
-        # Ensure data is clean before uploading
-        df = df.fillna('').replace([float('inf'), float('-inf')], '')
+            # Upload data
+            data_to_upload = [df.columns.tolist()] + df.values.tolist()
+            written = write_google_sheets(sheet_id, 'Sheet1', data_to_upload)
+            if written:
+                record_sheet_schema(sheet_id, data_to_upload[0])
 
-        # Upload data
-        data_to_upload = [df.columns.tolist()] + df.values.tolist()
-        write_google_sheets(sheet_id, 'Sheet1', data_to_upload)
+            # The row hashes now match the sheet as of the version our write produced
+            if written and sheet_index is not None:
+                sheet_index.save(get_sheet_version(sheet_id))
 
-        return 'first_upload' if is_first_upload else 'data_updated'
+            return 'first_upload' if is_first_upload else 'data_updated'
+
+    def _write_or_queue(self, sheet_id, df, sheet_type):
+        """
+        Uploads straight away, or in write-behind mode saves the rows for the flusher and returns 'queued'.
+        Compensation/sales uploads always go straight through since they are merged by key.
+        """
+        if settings.SHEET_WRITE_BEHIND and sheet_type != 'compensation_sales':
+            return queue_sheet_write(sheet_id, sheet_type, df)
+
+        return self._upload_to_sheet(
+            sheet_id,
+            df,
+            require_merge_column=(sheet_type == 'compensation_sales'),
+            sheet_type=sheet_type
+        )
 
     def detect_merge_column(self, df):
         """
@@ -1339,6 +1346,69 @@ class SpreadsheetViewSet(viewsets.ViewSet):
             print(f"Error in merge_dataframes_by_key: {str(e)}")
             raise e
 
+    def _diff_merge_result(self, existing_df, merged_df, merge_col):
+        """
+        Compares the merged sheet with the sheet as it is now, row by row on the merge key.
+        Returns only the inserted and updated rows (merged values, in merged order) plus
+        '_change' ('inserted'/'updated') and '_changed_columns' (json list of the cells that differ)
+        """
+        merged = merged_df.astype(str)
+        merged_keys = merged[merge_col].str.strip() if merge_col in merged.columns else pd.Series('', index=merged.index)
+
+        if existing_df.empty or merge_col not in existing_df.columns:
+            is_new = np.ones(len(merged), dtype=bool)
+            cell_changed = np.zeros(merged.shape, dtype=bool)
+        else:
+            existing = existing_df.astype(str)
+            existing.index = existing[merge_col].str.strip()
+            # merge_dataframes_by_key keeps the last row of a repeated key
+            existing = existing[existing.index != '']
+            existing = existing[~existing.index.duplicated(keep='last')]
+
+            is_new = ~merged_keys.isin(existing.index).to_numpy()
+            aligned = existing.reindex(index=merged_keys.to_numpy(), columns=merged.columns).fillna('')
+            cell_changed = (merged.to_numpy() != aligned.to_numpy()) & ~is_new[:, None]
+
+        is_updated = cell_changed.any(axis=1)
+        keep = is_new | is_updated
+        columns = merged.columns.tolist()
+
+        diff_df = merged[keep].copy()
+        diff_df['_change'] = np.where(is_new[keep], 'inserted', 'updated')
+        diff_df['_changed_columns'] = [
+            json.dumps([columns[i] for i in np.flatnonzero(row)]) for row in cell_changed[keep]
+        ]
+        return diff_df.reset_index(drop=True)
+
+    def _preview_rows(self, df, request):
+        """First rows of an upload for the response, as dicts per row or in the columnar layout"""
+        preview_df = df.head(5).fillna('')
+        if wants_columnar(request):
+            return to_columns(preview_df.columns, preview_df.values.tolist())
+        return preview_df.to_dict(orient='records')
+
+    def _merge_preview_page(self, diff_df, request):
+        """Slices one page of a merge diff for the response, page and page_size come from the query string"""
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', 50)), 1), 500)
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            page_size, page = 50, 1
+
+        total_pages = max((len(diff_df) + page_size - 1) // page_size, 1)
+        page = min(page, total_pages)
+        rows = diff_df.iloc[(page - 1) * page_size:page * page_size].to_dict(orient='records')
+        for row in rows:
+            row['_changed_columns'] = json.loads(row['_changed_columns'])
+
+        return {
+            'changed_rows': to_columns(diff_df.columns, rows) if wants_columnar(request) else rows,
+            'changed_count': len(diff_df),
+            'page': page,
+            'page_size': page_size,
+            'total_pages': total_pages,
+        }
+
     # DEFAULT GET: for retrieving a whole spreadsheet from google sheets for display in the frontend
     def retrieve(self, request, pk=None):
         sheet_id = pk
@@ -1351,24 +1421,33 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Find the clinic spreadsheet that owns this sheet
-        clinic_spreadsheet = self._get_clinic_spreadsheet_by_sheet_id(sheet_id)
+        # Find the clinic spreadsheet that owns this sheet and what it is, in one registry lookup
+        try:
+            clinic_spreadsheet, report_type, schema = lookup_sheet(sheet_id)
+        except Exception as e:
+            print(f"Error finding clinic spreadsheet: {e}")
+            clinic_spreadsheet = report_type = None
         if not clinic_spreadsheet:
             return Response(
                 {'error': f'Sheet with ID {sheet_id} not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        sheet_info = self._get_sheet_info(clinic_spreadsheet, sheet_id)
+        sheet_info = self._get_sheet_info(clinic_spreadsheet, report_type)
 
         try:
-            # Fetch fresh data from Google Sheets
-            sheet_data, sheet_header = padded_google_sheets(sheet_id, 'Sheet1')
+            # Fetch fresh data from Google Sheets, or the last snapshot (flagged stale) while google is down
+            sheet_values, is_stale = read_google_sheets_or_snapshot(sheet_id, 'Sheet1')
+            sheet_data, sheet_header = pad_sheet_values(sheet_values)
+            if wants_columnar(request):
+                # ?layout=columns: the header once plus one array per column
+                sheet_data = to_columns(sheet_header, sheet_data)
 
             return Response({
                 'success': True,
                 'sheet_data': sheet_data,
                 'sheet_header': sheet_header,
+                'stale': is_stale,
                 'sheet_name': sheet_info['name'],
                 'sheet_type': sheet_info['type'],
                 'clinic_name': clinic_spreadsheet.clinic.name,
@@ -1378,6 +1457,11 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                 'merge_column': getattr(clinic_spreadsheet, 'merge_column', None)
             }, status=status.HTTP_200_OK)
 
+        except GoogleSheetsUnavailable as e:
+            return Response(
+                {'error': f'Google Sheets is unavailable right now, please try again shortly: {str(e)}'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             return Response(
                 {'error': f'Failed to fetch sheet data: {str(e)}'},
@@ -1412,16 +1496,9 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         if not clinic_id or not uploaded_file:
             return Response({'error': 'clinic_id and file are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        temp_file_path = None
         try:
-            # Save uploaded file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
-
             # Clean and read CSV using general cleaning method
-            df = self._clean_csv_file(temp_file_path)
+            staging_key, df = self._read_uploaded_csv(uploaded_file)
 
             # Detect type
             sheet_type, subtype = self._detect_csv_type(df)
@@ -1450,9 +1527,9 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                             'error': 'Compensation/Sales data requires merge column format #####-P## or #####-C##'
                         }, status=status.HTTP_400_BAD_REQUEST)
 
-                    # Store for merge process
+                    # Stage the parsed upload for the merge process
                     request.session.update({
-                        'temp_file_path': temp_file_path,
+                        'staged_upload_key': stage_frame(df, staging_key),
                         'uploaded_merge_column': merge_column,
                         'stored_merge_column': clinic_spreadsheet.merge_column,
                         'target_sheet_id': target_sheet_id
@@ -1464,16 +1541,11 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                         'sheet_type': sheet_type,
                         'target_sheet_id': target_sheet_id,
                         'headers': df.columns.tolist(),
-                        'preview_data': df.head(5).fillna('').to_dict(orient='records'),
+                        'preview_data': self._preview_rows(df, request),
                     })
 
             # Direct upload for other types or first upload
-            action = self._upload_to_sheet(
-                target_sheet_id,
-                df,
-                require_merge_column=(sheet_type == 'compensation_sales'),
-                sheet_type=sheet_type
-            )
+            action = self._write_or_queue(target_sheet_id, df, sheet_type)
 
             return Response({
                 'success': True,
@@ -1483,13 +1555,149 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                 'message': f'Successfully uploaded {sheet_type} data'
             })
 
+        except StaleSheetWrite as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _iter_uploaded_csvs(self, uploaded_files):
+        """Yields (file name, raw bytes) for every csv uploaded directly or inside a zip"""
+        for uploaded_file in uploaded_files:
+            if not uploaded_file.name.lower().endswith('.zip'):
+                yield uploaded_file.name, b''.join(uploaded_file.chunks())
+                continue
+
+            with zipfile.ZipFile(uploaded_file) as archive:
+                for member in archive.infolist():
+                    name = member.filename
+                    if member.is_dir() or not name.lower().endswith('.csv') or name.startswith('__MACOSX/'):
+                        continue
+                    if member.file_size > MAX_ZIP_MEMBER_BYTES:
+                        raise ValueError(f'{name} in {uploaded_file.name} is too large')
+                    yield name, archive.read(member)
+
+    def _upload_sheet_group(self, target_sheet_id, sheet_type, df):
+        """
+        Runs on the upload pool. Uploads one sheet's combined files and returns its action,
+        compensation/sales data that has to be merged is left for the merge preview.
+        """
+        try:
+            if sheet_type == 'compensation_sales':
+                existing_data, _ = padded_google_sheets(target_sheet_id, 'A1:Z5')
+                if existing_data:
+                    return 'merge_required'
+
+            return self._write_or_queue(target_sheet_id, df, sheet_type)
         finally:
-            # Clean up temp file if not stored in session
-            if temp_file_path and 'temp_file_path' not in request.session:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+            # pool threads keep their own db connection, do not leave it open between uploads
+            connection.close()
+
+    @action(detail=False, methods=['POST'])
+    def detect_and_upload_many(self, request):
+        """
+        Upload several CSVs (or zips of them) at once. Each file is detected like detect_and_upload,
+        files going to the same sheet are combined, and different sheets are uploaded in parallel.
+        """
+        if not self._has_access(request.user):
+            return Response({'error': 'No permission'}, status=status.HTTP_403_FORBIDDEN)
+
+        clinic_id = request.data.get('clinic_id')
+        uploaded_files = request.FILES.getlist('files')
+
+        if not clinic_id or not uploaded_files:
+            return Response({'error': 'clinic_id and files are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Detect every file and group them by the sheet they belong to
+            groups = {}
+            file_errors = []
+            for file_name, raw_bytes in self._iter_uploaded_csvs(uploaded_files):
+                try:
+                    df = self._clean_csv_file(raw_bytes)
+                except Exception as e:
+                    file_errors.append({'file': file_name, 'error': str(e)})
+                    continue
+
+                sheet_type, subtype = self._detect_csv_type(df)
+                if not sheet_type:
+                    file_errors.append({'file': file_name, 'error': 'Could not detect CSV type from headers'})
+                    continue
+
+                target_sheet_id = self._get_target_sheet_id(clinic_id, sheet_type)
+                if not target_sheet_id:
+                    file_errors.append({'file': file_name, 'error': f'No {sheet_type} sheet configured for this clinic'})
+                    continue
+
+                group = groups.setdefault(target_sheet_id, {'sheet_type': sheet_type, 'files': [], 'frames': []})
+                group['files'].append(file_name)
+                group['frames'].append(df)
+
+            futures = {}
+            for target_sheet_id, group in groups.items():
+                group['df'] = pd.concat(group['frames'], ignore_index=True).fillna('')
+                futures[target_sheet_id] = _sheet_upload_pool.submit(
+                    self._upload_sheet_group, target_sheet_id, group['sheet_type'], group['df']
+                )
+
+            results = []
+            for target_sheet_id, future in futures.items():
+                group = groups[target_sheet_id]
+                result = {
+                    'files': group['files'],
+                    'sheet_type': group['sheet_type'],
+                    'target_sheet_id': target_sheet_id,
+                }
+                try:
+                    result['action'] = future.result()
+                except Exception as e:
+                    result['action'] = 'failed'
+                    result['error'] = str(e)
+                results.append(result)
+
+            # A compensation/sales merge continues in the normal merge preview
+            merge_result = next((result for result in results if result['action'] == 'merge_required'), None)
+            if merge_result:
+                df = groups[merge_result['target_sheet_id']]['df']
+                merge_column = self.detect_merge_column(df)
+                if not merge_column:
+                    merge_result['action'] = 'failed'
+                    merge_result['error'] = 'Compensation/Sales data requires merge column format #####-P## or #####-C##'
+                    merge_result = None
+                else:
+                    clinic_spreadsheet = self._get_clinic_spreadsheet_by_sheet_id(merge_result['target_sheet_id'])
+                    request.session.update({
+                        'staged_upload_key': stage_frame(df),
+                        'uploaded_merge_column': merge_column,
+                        'stored_merge_column': clinic_spreadsheet.merge_column,
+                        'target_sheet_id': merge_result['target_sheet_id']
+                    })
+
+            uploaded = [result for result in results if result['action'] in ('first_upload', 'data_updated', 'queued')]
+            summary = merge_result or (uploaded[0] if uploaded else None)
+
+            return Response({
+                'success': not file_errors and all(result['action'] != 'failed' for result in results),
+                'action': summary['action'] if summary else 'failed',
+                'target_sheet_id': summary['target_sheet_id'] if summary else None,
+                'results': results,
+                'file_errors': file_errors,
+            })
+
+        except zipfile.BadZipFile as e:
+            return Response({'error': f'Invalid zip file: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['GET'])
+    def write_queue(self, request):
+        """Staff view of the write-behind queue: pending uploads, rows and lag per sheet"""
+        if not self._has_access(request.user):
+            return Response({'error': 'No permission'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            return Response(write_queue_status())
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=False, methods=['POST'])
     def cleanup_temp_files(self, request):
@@ -1497,17 +1705,8 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         Clean up temporary files from session
         """
         try:
-            session_files = ['merged_data_path', 'temp_file_path']
-            for file_key in session_files:
-                file_path = request.session.get(file_key)
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-
-            # Clear all session data
-            session_keys = ['merged_data_path', 'temp_file_path', 'uploaded_merge_column',
-                            'stored_merge_column', 'target_sheet_id']
-            for key in session_keys:
-                request.session.pop(key, None)
+            # Staged frames can be shared by identical uploads, so they are left for the staging TTL sweep
+            self._clear_merge_session(request)
 
             return Response({'success': True})
         except Exception as e:
@@ -1536,15 +1735,10 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         if not uploaded_file:
             return Response({'error': 'no file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        temp_file_path = ''
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
-
             # Use general CSV cleaning method
-            uploaded_df = self._clean_csv_file(temp_file_path)
+            staging_key, uploaded_df = self._read_uploaded_csv(uploaded_file)
+            remember_date_formats(clinic_spreadsheet, 'compensation_sales', uploaded_df)
 
             # Get existing sheet data
             sheet_data, sheet_headers = padded_google_sheets(pk, 'A1:Z5')
@@ -1559,18 +1753,23 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                         'error': 'No column with required format (#####-P## or #####-C##) found'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-                # Store merge column in ClinicSpreadsheet model
-                clinic_spreadsheet.merge_column = merge_column
-                clinic_spreadsheet.save()
+                with sheet_write_lock(pk):
+                    # Another upload may have filled the sheet since it was read above
+                    if any(padded_google_sheets(pk, 'A1:Z5')):
+                        raise StaleSheetWrite('The sheet was filled by another upload, upload again to merge')
 
-                # Sort by the merge column before uploading (compensation/sales data)
-                uploaded_df = self._sort_dataframe_by_type(uploaded_df, 'compensation_sales')
+                    # Store merge column in ClinicSpreadsheet model
+                    clinic_spreadsheet.merge_column = merge_column
+                    clinic_spreadsheet.save()
 
-                # Ensure data is clean before uploading
-                uploaded_df = uploaded_df.fillna('').replace([float('inf'), float('-inf')], '')
+                    # Sort by the merge column before uploading (compensation/sales data)
+                    uploaded_df = self._sort_dataframe_by_type(uploaded_df, 'compensation_sales')
 
-                data_to_upload = [uploaded_df.columns.tolist()] + uploaded_df.values.tolist()
-                write_google_sheets(pk, 'Sheet1', data_to_upload)
+                    # Ensure data is clean before uploading
+                    uploaded_df = uploaded_df.fillna('').replace([float('inf'), float('-inf')], '')
+
+                    data_to_upload = [uploaded_df.columns.tolist()] + uploaded_df.values.tolist()
+                    write_google_sheets(pk, 'Sheet1', data_to_upload)
 
                 return Response({
                     'status': 'first_upload_complete',
@@ -1595,20 +1794,25 @@ class SpreadsheetViewSet(viewsets.ViewSet):
                         'error': 'No column with required format found in uploaded file'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-                request.session['temp_file_path'] = temp_file_path
+                request.session['staged_upload_key'] = stage_frame(uploaded_df, staging_key)
                 request.session['uploaded_merge_column'] = uploaded_merge_column
                 request.session['stored_merge_column'] = stored_merge_column
 
+                if wants_columnar(request):
+                    sheet_data = to_columns(sheet_headers, sheet_data)
+
                 return Response({
                     'success': True,
                     'headers': uploaded_df.columns.tolist(),
-                    'body': uploaded_df.head(5).fillna('').to_dict(orient='records'),
+                    'body': self._preview_rows(uploaded_df, request),
                     'sheet_data': sheet_data,
                     'sheet_headers': sheet_headers,
                     'uploaded_merge_column': uploaded_merge_column,
                     'stored_merge_column': stored_merge_column,
                 }, status=status.HTTP_200_OK)
 
+        except StaleSheetWrite as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1626,22 +1830,25 @@ class SpreadsheetViewSet(viewsets.ViewSet):
             session_data = {
                 'uploaded_merge_column': request.session.get('uploaded_merge_column'),
                 'stored_merge_column': request.session.get('stored_merge_column'),
-                'temp_file_path': request.session.get('temp_file_path')
+                'staged_upload_key': request.session.get('staged_upload_key')
             }
 
             if not all(session_data.values()):
                 return Response({'error': 'Missing merge data'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if not os.path.exists(session_data['temp_file_path']):
+            # Parsed once at upload time
+            uploaded_df = load_frame(session_data['staged_upload_key'])
+            if uploaded_df is None:
                 return Response({'error': 'Upload file not found'}, status=status.HTTP_400_BAD_REQUEST)
+            remember_date_formats(self._get_clinic_spreadsheet_by_sheet_id(sheet_id), 'compensation_sales', uploaded_df)
+
+            # Fencing token from before the read, confirm refuses to write if the sheet changed after it
+            request.session['merge_base_token'] = sheet_write_token(sheet_id)
 
             # Get existing data and merge
             existing_data, existing_headers = padded_google_sheets(sheet_id, 'Sheet1')
             existing_df = pd.DataFrame(existing_data, columns=existing_headers).fillna('') if existing_data else pd.DataFrame()
 
-            # Use general CSV cleaning method
-            uploaded_df = self._clean_csv_file(session_data['temp_file_path'])
-
             merged_df = self.merge_dataframes_by_key(
                 existing_df, uploaded_df,
                 session_data['stored_merge_column'],
@@ -1649,26 +1856,41 @@ class SpreadsheetViewSet(viewsets.ViewSet):
             )
 
             # merge_dataframes_by_key already handles sorting for compensation_sales
-            # Ensure data is clean for storage
-            merged_df = merged_df.fillna('').replace([float('inf'), float('-inf')], '')
+            # Ensure data is clean for storage, the merge writes cells as str() so infinities show up as text too
+            merged_df = merged_df.fillna('').replace([float('inf'), float('-inf'), 'inf', '-inf'], '')
 
-            # Store merged data with robust encoding
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv', mode='w+', encoding='utf-8',
-                                             newline='') as temp_file:
-                merged_df.fillna('').replace([float('inf'), float('-inf')], '').to_csv(temp_file, index=False,
-                                                                                       encoding='utf-8')
-                request.session['merged_data_path'] = temp_file.name
+            # The full merge stays staged until confirm, only the rows it changes go to the browser
+            diff_df = self._diff_merge_result(existing_df, merged_df, session_data['stored_merge_column'])
+            request.session['staged_merge_key'] = stage_frame(merged_df)
+            request.session['staged_diff_key'] = stage_frame(diff_df)
 
+            page = self._merge_preview_page(diff_df, request)
             return Response({
                 'success': True,
                 'merged_headers': merged_df.columns.tolist(),
-                'merged_data': merged_df.fillna('').to_dict(orient='records'),
+                'inserted_count': int((diff_df['_change'] == 'inserted').sum()),
+                'updated_count': int((diff_df['_change'] == 'updated').sum()),
+                'unchanged_count': len(merged_df) - len(diff_df),
+                'total_rows': len(merged_df),
+                **page,
                 'merge_strategy': 'Key-based merge with update/insert logic'
             })
 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['GET'])
+    def merge_preview(self, request, pk=None):
+        """Another page of the rows the staged merge inserts or updates (?page=&page_size=)"""
+        if not self._has_access(request.user):
+            return Response({'error': 'No permission'}, status=status.HTTP_403_FORBIDDEN)
+
+        diff_df = load_frame(request.session.get('staged_diff_key'))
+        if diff_df is None:
+            return Response({'error': 'No merge data found'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'success': True, **self._merge_preview_page(diff_df, request)})
+
     @action(detail=True, methods=['POST'])
     def confirm_merge_sheets(self, request, pk=None):
         # Simplified permission check
@@ -1677,55 +1899,32 @@ class SpreadsheetViewSet(viewsets.ViewSet):
 
         # Use target_sheet_id from session or fallback to URL
         sheet_id = request.session.get('target_sheet_id', pk)
-        merged_data_path = request.session.get('merged_data_path')
 
-        if not merged_data_path or not os.path.exists(merged_data_path):
+        # Staged by merge_sheets already cleaned and as strings
+        merged_df = load_frame(request.session.get('staged_merge_key'))
+        if merged_df is None:
             return Response({'error': 'No merge data found'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Read merged data with encoding fallback
-            try:
-                merged_df = pd.read_csv(merged_data_path, encoding='utf-8').fillna('')
-            except UnicodeDecodeError:
-                # Fallback to latin1 if utf-8 fails
-                merged_df = pd.read_csv(merged_data_path, encoding='latin1').fillna('')
-
-            # Clean any remaining problematic characters thoroughly
-            merged_df = merged_df.fillna('').replace([float('inf'), float('-inf'), 'inf', '-inf'], '')
-
-            # Ensure all data is string type to avoid upload issues
-            for col in merged_df.columns:
-                merged_df[col] = merged_df[col].astype(str).replace('nan', '')
-
-            write_df_to_sheets(sheet_id, 'Sheet1', merged_df)
+            with sheet_write_lock(sheet_id, expected_token=request.session.get('merge_base_token')):
+                write_df_to_sheets(sheet_id, 'Sheet1', merged_df)
 
             return Response({'success': True})
+        except StaleSheetWrite as e:
+            return Response(
+                {'error': f'The sheet changed after this merge was previewed, please upload the file again. {str(e)}'},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         finally:
             # Clean up all session data
-            session_keys = ['merged_data_path', 'temp_file_path', 'uploaded_merge_column',
-                            'stored_merge_column', 'target_sheet_id']
-            for key in session_keys:
-                file_path = request.session.get(key)
-                if key.endswith('_path') and file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                request.session.pop(key, None)
+            self._clear_merge_session(request)
 
     @action(detail=True, methods=['POST'])
     def delete_session_storage(self, request, pk=None):
         try:
-            session_files = ['merged_data_path', 'temp_file_path']
-            for file_key in session_files:
-                file_path = request.session.get(file_key)
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-
-            # Clean up all session data
-            session_keys = ['merged_data_path', 'temp_file_path', 'uploaded_merge_column',
-                            'stored_merge_column', 'target_sheet_id']
-            for key in session_keys:
-                request.session.pop(key, None)
+            self._clear_merge_session(request)
 
             return Response({'success': True})
         except Exception as e:
@@ -1735,68 +1934,145 @@ class SpreadsheetViewSet(viewsets.ViewSet):
         """
         Remove completely duplicate rows from dataframe.
         For different sheet types, we may want different duplicate detection logic.
+        Rows are compared by 64 bit hashes of their cells as strings instead of a full string copy of the frame.
         """
         try:
             if df.empty:
                 return df
 
-            # Convert all columns to string to ensure consistent comparison
-            df_str = df.astype(str).fillna('')
-
-            # For most sheet types, remove rows that are completely identical
-            if sheet_type in ['daily_transaction', 'transaction_report', 'payment_transaction', 'time_hour']:
-                # Remove completely duplicate rows
-                original_count = len(df_str)
-                df_deduped = df_str.drop_duplicates(keep='first')
-                removed_count = original_count - len(df_deduped)
-
-                if removed_count > 0:
-                    print(f"Removed {removed_count} duplicate rows from {sheet_type} data")
-
-                return df_deduped
-
             # For compensation_sales, duplicates should be handled by merge logic
-            elif sheet_type == 'compensation_sales':
+            if sheet_type == 'compensation_sales':
                 return df
 
-            else:
-                # Default: remove complete duplicates
-                return df_str.drop_duplicates(keep='first')
+            # For every other sheet type, remove rows that are completely identical
+            original_count = len(df)
+            df_deduped = df.take(np.flatnonzero(~pd.Series(row_hashes(df)).duplicated(keep='first').to_numpy()))
+            removed_count = original_count - len(df_deduped)
+
+            if removed_count > 0:
+                print(f"Removed {removed_count} duplicate rows from {sheet_type} data")
+
+            return df_deduped
 
         except Exception as e:
             print(f"Error removing duplicates: {e}")
             return df
 
-    def _merge_with_existing_data(self, sheet_id, new_df, sheet_type):
+    def _insert_into_sorted_sheet(self, sheet_id, new_df, sheet_type, existing_headers, date_format=None):
+        """
+        Fast path for non-merge sheet types. When the sheet is still as our last upload left it (same drive version
+        as its saved SheetIndex), only the upload is deduped and sorted, and its rows are inserted where their
+        sort keys fall in the existing sorted run instead of re-reading, re-sorting and rewriting the whole sheet.
+        Returns True when the upload was handled, False when the full merge has to run instead.
+        """
+        try:
+            if any(col not in existing_headers for col in new_df.columns):
+                return False  # new columns need the full rewrite
+
+            sheet_index = SheetIndex.load(sheet_id, existing_headers, get_sheet_version(sheet_id))
+            if sheet_index is None:
+                return False
+
+            new_df = self._remove_duplicate_rows(new_df.reindex(columns=existing_headers, fill_value=''), sheet_type)
+            new_hashes = row_hashes(new_df)
+            is_new_row = ~sheet_index.contains(new_hashes)
+            if not is_new_row.all():
+                print(f"Skipped {int((~is_new_row).sum())} rows already in {sheet_type} sheet")
+            if not is_new_row.any():
+                return True  # nothing new, the sheet stays as it is
+
+            # Sort just the new rows, then find where each one lands among the existing ones
+            new_df = new_df.take(np.flatnonzero(is_new_row)).fillna('').replace([float('inf'), float('-inf')], '')
+            new_hashes = new_hashes[is_new_row]
+            new_sort_keys = sort_keys_for(new_df, sheet_type, date_format)
+            order = np.argsort(new_sort_keys, kind='stable')
+            new_df, new_hashes, new_sort_keys = new_df.take(order), new_hashes[order], new_sort_keys[order]
+            positions = sheet_index.insert_positions(new_sort_keys)
+
+            # Rows landing in the same gap are inserted together
+            rows = new_df.values.tolist()
+            row_groups = []
+            for position, row in zip(positions.tolist(), rows):
+                if row_groups and row_groups[-1][0] == position:
+                    row_groups[-1][1].append(row)
+                else:
+                    row_groups.append((position, [row]))
+
+            if len(row_groups) > MAX_INSERT_GROUPS:
+                return False  # rows scattered all over the sheet, one rewrite is cheaper
+
+            if not insert_rows_into_sheet(sheet_id, row_groups):
+                return False
+
+            sheet_index.insert_rows(positions, new_sort_keys, new_hashes)
+            sheet_index.save(get_sheet_version(sheet_id))
+            print(f"Inserted {len(rows)} rows into {sheet_type} sheet in {len(row_groups)} places")
+            return True
+
+        except GoogleSheetsUnavailable:
+            raise
+        except Exception as e:
+            print(f"Error inserting into sorted sheet, falling back to full merge: {e}")
+            return False
+
+    def _merge_with_existing_data(self, sheet_id, new_df, sheet_type, date_format=None):
         """
         For non-merge based sheet types, combine new data with existing data
         and remove duplicates intelligently.
+        Returns (combined dataframe, SheetIndex of its rows). New rows are checked against the sheet's saved
+        row hash index, which is only rebuilt from the sheet when the sheet changed outside of our uploads,
+        and then the sheet's own rows are deduped too.
         """
         try:
+            # Version from before the read, so an edit made after it leaves the saved index out of date
+            version = get_sheet_version(sheet_id)
+
             # Get existing data
             existing_data, existing_headers = padded_google_sheets(sheet_id, 'Sheet1')
 
             if not existing_data or not existing_headers:
                 # No existing data, just remove duplicates from new data
-                return self._remove_duplicate_rows(new_df, sheet_type)
-
-            # Create existing dataframe
-            existing_df = pd.DataFrame(existing_data, columns=existing_headers).fillna('')
+                deduplicated_df = self._remove_duplicate_rows(new_df, sheet_type)
+                sorted_df = self._sort_dataframe_by_type(deduplicated_df, sheet_type, date_format)
+                return sorted_df, SheetIndex.build(sheet_id, sorted_df, sheet_type, date_format)
+
+            # Create existing dataframe, with any new columns the upload brings added on the right
+            columns = list(existing_headers) + [col for col in new_df.columns if col not in existing_headers]
+            existing_df = pd.DataFrame(existing_data, columns=existing_headers).fillna('').reindex(columns=columns, fill_value='')
+
+            sheet_index = SheetIndex.load(sheet_id, columns, version)
+            if sheet_index is None:
+                # The sheet changed outside of our uploads: blank rows (e.g. left by an insert whose values
+                # could not be written) are dropped before the index is rebuilt
+                is_blank = (existing_df.astype(str).apply(lambda col: col.str.strip()) == '').all(axis=1)
+                if is_blank.any():
+                    print(f"Dropped {int(is_blank.sum())} blank rows from {sheet_type} sheet")
+                    existing_df = existing_df[~is_blank].reset_index(drop=True)
+                # Edits outside of our uploads can duplicate rows too, a saved index only covers deduped sheets
+                existing_df = self._remove_duplicate_rows(existing_df, sheet_type).reset_index(drop=True)
+                sheet_index = SheetIndex.build(sheet_id, existing_df, sheet_type, date_format)
+
+            # Remove duplicates within the upload, then the rows the sheet already has
+            new_df = self._remove_duplicate_rows(new_df.reindex(columns=columns, fill_value=''), sheet_type)
+            new_hashes = row_hashes(new_df)
+            is_new_row = ~sheet_index.contains(new_hashes)
+            if not is_new_row.all():
+                print(f"Skipped {int((~is_new_row).sum())} rows already in {sheet_type} sheet")
+            new_df = new_df.take(np.flatnonzero(is_new_row))
+            sheet_index.add(new_hashes[is_new_row])
 
             # Combine dataframes
             combined_df = pd.concat([existing_df, new_df], ignore_index=True)
 
-            # Remove duplicates
-            deduplicated_df = self._remove_duplicate_rows(combined_df, sheet_type)
-
-            # Sort the final result
-            sorted_df = self._sort_dataframe_by_type(deduplicated_df, sheet_type)
+            # Sort the final result, the sheet may not be in order after edits made outside of uploads
+            sorted_df = self._sort_dataframe_by_type(combined_df, sheet_type, date_format)
+            sheet_index.sort_keys = sort_keys_for(sorted_df, sheet_type, date_format)
 
-            return sorted_df
+            return sorted_df, sheet_index
 
         except Exception as e:
             print(f"Error merging with existing data: {e}")
             # If merge fails, just return the new data with duplicates removed
-            return self._remove_duplicate_rows(new_df, sheet_type)
+            return self._remove_duplicate_rows(new_df, sheet_type), None
 
 
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -22,6 +23,32 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 GOOGLE_SERVICE_ACCOUNT_KEY = os.getenv("GOOGLE_SERVICE_ACCOUNT_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 SHARED_DRIVE_ID = '0AItIf3a1ARFYUk9PVA'
+SHEET_FETCH_MAX_WORKERS = int(os.getenv('SHEET_FETCH_MAX_WORKERS', 4))  # concurrent google sheet reads per worker
+# Sheets API per-minute quotas for the service account, shared by every gunicorn worker
+GOOGLE_SHEETS_READ_QUOTA_PER_MINUTE = int(os.getenv('GOOGLE_SHEETS_READ_QUOTA_PER_MINUTE', 60))
+GOOGLE_SHEETS_WRITE_QUOTA_PER_MINUTE = int(os.getenv('GOOGLE_SHEETS_WRITE_QUOTA_PER_MINUTE', 60))
+GOOGLE_API_MAX_ATTEMPTS = int(os.getenv('GOOGLE_API_MAX_ATTEMPTS', 5))
+GOOGLE_API_TIMEOUT_SECONDS = int(os.getenv('GOOGLE_API_TIMEOUT_SECONDS', 20))  # per http call
+GOOGLE_API_DEADLINE_SECONDS = int(os.getenv('GOOGLE_API_DEADLINE_SECONDS', 60))  # per api call, retries included
+# Circuit breaker: after this many failed google calls in a row every worker fails fast for the reset window
+GOOGLE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('GOOGLE_CIRCUIT_FAILURE_THRESHOLD', 5))
+GOOGLE_CIRCUIT_RESET_SECONDS = int(os.getenv('GOOGLE_CIRCUIT_RESET_SECONDS', 30))
+GOOGLE_SHEET_SNAPSHOT_SECONDS = int(os.getenv('GOOGLE_SHEET_SNAPSHOT_SECONDS', 60 * 60 * 24))  # stale fallback age
+# Lock files and other state shared between worker processes on this machine
+SHARED_STATE_DIR = os.getenv('SHARED_STATE_DIR', os.path.join(tempfile.gettempdir(), 'clinic_help_desk'))
+# Parsed uploads and merge results waiting for the next step of the upload flow
+UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', os.path.join(SHARED_STATE_DIR, 'upload_staging'))
+UPLOAD_STAGING_TTL_SECONDS = int(os.getenv('UPLOAD_STAGING_TTL_SECONDS', 60 * 60 * 6))
+# Write-behind: uploads are saved locally and answered at once, a background flusher combines everything
+# pending for a sheet into one google write every SHEET_WRITE_BEHIND_FLUSH_SECONDS
+SHEET_WRITE_BEHIND = os.getenv('SHEET_WRITE_BEHIND', 'False') == 'True'
+SHEET_WRITE_BEHIND_FLUSH_SECONDS = int(os.getenv('SHEET_WRITE_BEHIND_FLUSH_SECONDS', 120))
+# Per-sheet row hash indexes used to dedupe uploads without re-reading the sheet's history
+SHEET_INDEX_DIR = os.getenv('SHEET_INDEX_DIR', os.path.join(SHARED_STATE_DIR, 'sheet_index'))
+# Calculated payroll previews, keyed by every input and the drive version of each source sheet
+PAYROLL_PREVIEW_CACHE_SECONDS = int(os.getenv('PAYROLL_PREVIEW_CACHE_SECONDS', 60 * 60 * 6))
+# A Monday bi-weekly pay periods are counted from (see api/payroll_generation/pay_periods.py)
+PAY_PERIOD_BIWEEKLY_ANCHOR = os.getenv('PAY_PERIOD_BIWEEKLY_ANCHOR', '2025-01-06')
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -55,6 +82,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.gzip.GZipMiddleware',  # compresses responses for clients that accept gzip
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -100,6 +128,15 @@ DATABASES = {
 }
 
 
+# Cache shared by every gunicorn worker on the droplet (sheet snapshots and similar)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(SHARED_STATE_DIR, 'cache'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -173,6 +210,10 @@ CORS_ALLOWED_ORIGINS = [
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',  # orjson, same output as DRF's JSONRenderer
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Change this for production
     ],
@@ -26,7 +26,7 @@ export default function ConfirmMergeForm({ table, onMergeSuccess, targetSheetId
 
     return (
         <div className="mt-6 pb-24">
-            <h3 className="text-lg font-semibold mb-4">Preview of Merged Data</h3>
+            <h3 className="text-lg font-semibold mb-4">Rows Added or Changed by the Merge</h3>
             <TanstackTable table={table}/>
 
             {/* This is the container for the sticky button */}
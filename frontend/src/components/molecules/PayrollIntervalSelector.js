@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 
 export default function PayrollIntervalSelector({
   paymentFrequency,
+  biweeklyAnchor,
   onIntervalSelect,
   selectedInterval,
   className = ""
@@ -12,7 +13,7 @@ export default function PayrollIntervalSelector({
     if (paymentFrequency) {
       generatePayrollIntervals();
     }
-  }, [paymentFrequency]);
+  }, [paymentFrequency, biweeklyAnchor]);
 
   const generatePayrollIntervals = () => {
     const today = new Date();
@@ -76,16 +77,24 @@ export default function PayrollIntervalSelector({
     const intervals = [];
     const currentDate = new Date(today);
 
+    // Bi-weekly periods are counted from a fixed Monday, the server's PAY_PERIOD_BIWEEKLY_ANCHOR (YYYY-MM-DD),
+    // so a period is the same two weeks whatever day it is picked on (and matches overnight draft payrolls)
+    if (!biweeklyAnchor) {
+      return intervals;
+    }
+    const [anchorYear, anchorMonth, anchorDay] = biweeklyAnchor.split('-').map(Number);
+    const anchor = new Date(anchorYear, anchorMonth - 1, anchorDay);
+    const msPerDay = 24 * 60 * 60 * 1000;
+    const today0 = new Date(currentDate.getFullYear(), currentDate.getMonth(), currentDate.getDate());
+    const daysSinceAnchor = Math.round((today0 - anchor) / msPerDay);
+    const currentPeriodStart = new Date(today0);
+    currentPeriodStart.setDate(today0.getDate() - (((daysSinceAnchor % 14) + 14) % 14));
+
     // Go back 24 weeks (12 bi-weekly periods)
     for (let biWeeksBack = 0; biWeeksBack < 12; biWeeksBack++) {
-      const targetDate = new Date(currentDate);
-      targetDate.setDate(currentDate.getDate() - (biWeeksBack * 14));
-
-      // Find Monday of the target bi-week period
-      const monday = new Date(targetDate);
-      const dayOfWeek = targetDate.getDay();
-      const daysToMonday = dayOfWeek === 0 ? 6 : dayOfWeek - 1;
-      monday.setDate(targetDate.getDate() - daysToMonday);
+      // Monday of the target bi-week period
+      const monday = new Date(currentPeriodStart);
+      monday.setDate(currentPeriodStart.getDate() - (biWeeksBack * 14));
 
       // Find Sunday 2 weeks later
       const sunday = new Date(monday);
@@ -3,39 +3,61 @@ import api from '../../utils/axiosConfig';
 import {useParams} from "react-router-dom";
 
 export default function UploadForm({ onUploadSuccess, clinicId }) {
-    const [selectedFile, setSelectedFile] = useState(null);
-    const [status, setStatus] = useState('Please select a CSV file');
+    const [selectedFiles, setSelectedFiles] = useState([]);
+    const [status, setStatus] = useState('Please select CSV files or a zip of them');
     const [uploading, setUploading] = useState(false);
 
     const handleFileChange = (event) => {
-        const file = event.target.files[0];
-        if (file?.name.toLowerCase().endsWith('.csv')) {
-            setSelectedFile(file);
-            setStatus('File ready to upload');
+        const files = Array.from(event.target.files);
+        const allSupported = files.length > 0 && files.every(file => /\.(csv|zip)$/i.test(file.name));
+        if (allSupported) {
+            setSelectedFiles(files);
+            setStatus(files.length === 1 ? 'File ready to upload' : `${files.length} files ready to upload`);
         } else {
-            setSelectedFile(null);
-            setStatus('Please select a CSV file');
+            setSelectedFiles([]);
+            setStatus('Please select CSV files or a zip of them');
         }
     };
 
+    // One csv keeps the single file endpoint, several files or a zip go up in one batch
+    const isSingleCsv = selectedFiles.length === 1 && selectedFiles[0].name.toLowerCase().endsWith('.csv');
+
+    const batchStatus = (data) => {
+        const failed = [
+            ...data.file_errors.map(fileError => `${fileError.file}: ${fileError.error}`),
+            ...data.results
+                .filter(result => result.action === 'failed')
+                .map(result => `${result.files.join(', ')}: ${result.error}`),
+        ];
+        return failed.length ? `⚠️ Some files were not uploaded. ${failed.join(' | ')}` : '✅ Upload successful!';
+    };
+
     const handleUpload = async (event) => {
         event.preventDefault();
-        if (!selectedFile) return;
+        if (!selectedFiles.length) return;
 
         setUploading(true);
-        setStatus('Detecting file type and uploading...');
+        setStatus('Detecting file types and uploading...');
 
         const formData = new FormData();
-        formData.append('file', selectedFile);
+        if (isSingleCsv) {
+            formData.append('file', selectedFiles[0]);
+        } else {
+            selectedFiles.forEach(file => formData.append('files', file));
+        }
         formData.append('clinic_id', clinicId);
 
         try {
-            const response = await api.post('/api/spreadsheets/detect_and_upload/', formData, {
+            const endpoint = isSingleCsv ? '/api/spreadsheets/detect_and_upload/' : '/api/spreadsheets/detect_and_upload_many/';
+            const response = await api.post(endpoint, formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
 
-            setStatus('✅ Upload successful!');
-            setTimeout(() => onUploadSuccess(response.data), 1000);
+            setStatus(isSingleCsv ? '✅ Upload successful!' : batchStatus(response.data));
+            // Stay on the form when some files failed so the message can be read, unless a merge is waiting
+            if (isSingleCsv || response.data.success || response.data.action === 'merge_required') {
+                setTimeout(() => onUploadSuccess(response.data), 1000);
+            }
 
         } catch (error) {
             const errorMsg = error.response?.data?.error || 'Upload failed';
@@ -50,12 +72,13 @@ export default function UploadForm({ onUploadSuccess, clinicId }) {
             <form onSubmit={handleUpload}>
                 <div className="mb-6">
                     <label className="block text-sm font-medium text-gray-700 mb-2">
-                        Select CSV File
+                        Select CSV Files
                     </label>
                     <input
                         type="file"
                         onChange={handleFileChange}
-                        accept=".csv"
+                        accept=".csv,.zip"
+                        multiple
                         className="block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-lg file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100 border border-gray-300 rounded-lg p-3"
                         disabled={uploading}
                     />
@@ -75,7 +98,7 @@ export default function UploadForm({ onUploadSuccess, clinicId }) {
                 <button
                     type="submit"
                     className="w-full bg-blue-500 hover:bg-blue-600 text-white font-bold py-3 px-4 rounded-lg transition-colors disabled:bg-gray-400"
-                    disabled={!selectedFile || uploading}
+                    disabled={!selectedFiles.length || uploading}
                 >
                     {uploading ? 'Processing...' : 'Upload & Auto-Detect'}
                 </button>
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useCallback } from 'react';
 import TanstackTable from "../atoms/TanstackTable";
 import ConfirmMergeForm from "../molecules/ConfirmMergeForm";
 import UploadForm from "../molecules/UploadForm";
@@ -22,7 +22,7 @@ function StepOne({ onUploadSuccess, clinicId }) {
     );
 }
 
-function StepTwo({ table, finalMergeSuccess, targetSheetId }) {
+function StepTwo({ table, finalMergeSuccess, targetSheetId, mergeSummary, onPageChange }) {
     return (
         <div className="w-full max-w-7xl mx-auto">
             <h1 className="text-2xl font-bold text-gray-800 mb-2">Step 2: Verify merged data</h1>
@@ -32,11 +32,34 @@ function StepTwo({ table, finalMergeSuccess, targetSheetId }) {
                     <br />• Sheet Type: Compensation/Sales Data
                     <br />• Action: Update existing data with new entries
                     <br />• Strategy: Key-based merge with update/insert logic
+                    <br />• New rows: {mergeSummary.inserted_count}, updated rows: {mergeSummary.updated_count}, unchanged rows: {mergeSummary.unchanged_count}
                 </p>
             </div>
             <p className="text-sm text-gray-600 mb-4">
-                This is a preview of the merged data. If it looks correct, press "Confirm & Save".
+                Only the rows this upload adds or changes are shown, changed cells are highlighted.
+                If it looks correct, press "Confirm & Save".
             </p>
+            {mergeSummary.total_pages > 1 && (
+                <div className="flex items-center gap-4 mb-4 text-sm text-gray-700">
+                    <button
+                        type="button"
+                        className="px-3 py-1 border rounded disabled:text-gray-400"
+                        onClick={() => onPageChange(mergeSummary.page - 1)}
+                        disabled={mergeSummary.page <= 1}
+                    >
+                        Previous
+                    </button>
+                    <span>Page {mergeSummary.page} of {mergeSummary.total_pages}</span>
+                    <button
+                        type="button"
+                        className="px-3 py-1 border rounded disabled:text-gray-400"
+                        onClick={() => onPageChange(mergeSummary.page + 1)}
+                        disabled={mergeSummary.page >= mergeSummary.total_pages}
+                    >
+                        Next
+                    </button>
+                </div>
+            )}
             <ConfirmMergeForm
                 table={table}
                 onMergeSuccess={finalMergeSuccess}
@@ -56,6 +79,7 @@ export default function MultiStepForm() {
     const [mergedColumns, setMergedColumns] = useState([]);
     const [mergedData, setMergedData] = useState([]);
     const [targetSheetId, setTargetSheetId] = useState(null);
+    const [mergeSummary, setMergeSummary] = useState({});
 
     const navigate = useNavigate();
 
@@ -63,8 +87,8 @@ export default function MultiStepForm() {
     const handleUploadSuccess = async (apiData) => {
         const { action, target_sheet_id, sheet_type } = apiData;
 
-        if (action === 'first_upload' || action === 'data_updated') {
-            // Direct upload successful - redirect to the target sheet
+        if (action === 'first_upload' || action === 'data_updated' || action === 'queued') {
+            // Direct upload successful (or queued for the write-behind flusher) - redirect to the target sheet
             navigate(`/chd-app/${clinic_id}/spreadsheet/${target_sheet_id}`);
             return;
         }
@@ -76,8 +100,9 @@ export default function MultiStepForm() {
             try {
                 const mergeResponse = await api.post(`/api/spreadsheets/${target_sheet_id}/merge_sheets/`);
 
-                setMergedData(mergeResponse.data.merged_data);
-                setMergedColumns(mergeResponse.data.merged_headers);
+                setMergedData(mergeResponse.data.changed_rows);
+                setMergedColumns(['_change', ...mergeResponse.data.merged_headers]);
+                setMergeSummary(mergeResponse.data);
                 setCurrentStep(2);
 
             } catch (error) {
@@ -87,9 +112,29 @@ export default function MultiStepForm() {
         }
     };
 
+    // Pages through the staged merge diff
+    const handlePageChange = async (page) => {
+        try {
+            const previewResponse = await api.get(`/api/spreadsheets/${targetSheetId}/merge_preview/`, {
+                params: { page, page_size: mergeSummary.page_size }
+            });
+            setMergedData(previewResponse.data.changed_rows);
+            setMergeSummary(prev => ({ ...prev, ...previewResponse.data }));
+        } catch (error) {
+            console.error('Loading merge preview failed:', error);
+            alert(`Loading preview failed: ${error.response?.data?.error || 'Unknown error'}`);
+        }
+    };
+
+    const highlightChangedCell = useCallback(
+        (row, header) => (row._changed_columns || []).includes(header),
+        []
+    );
+
     const mergedTable = useDictTable({
         rawColumns: mergedColumns,
-        rawData: mergedData
+        rawData: mergedData,
+        highlightCell: highlightChangedCell
     });
 
     const finalMergeSuccess = () => {
@@ -107,6 +152,8 @@ export default function MultiStepForm() {
                         table={mergedTable}
                         finalMergeSuccess={finalMergeSuccess}
                         targetSheetId={targetSheetId}
+                        mergeSummary={mergeSummary}
+                        onPageChange={handlePageChange}
                     />
                 );
             default:
@@ -6,7 +6,8 @@ import {
 } from '@tanstack/react-table';
 
 //INFO: function for columns from pandas dataframe's df.columns.to_list and data from df.to_dict to make a tanstack table object
-export function useDictTable({ rawColumns = [], rawData = [] }) {
+//highlightCell(row, header) is optional, cells it returns true for are highlighted (used by the merge preview)
+export function useDictTable({ rawColumns = [], rawData = [], highlightCell = null }) {
   const [sorting, setSorting] = useState([]);
 
   // Improvement: Wrapped in useMemo for performance
@@ -14,8 +15,13 @@ export function useDictTable({ rawColumns = [], rawData = [] }) {
     return rawColumns.map(header => ({
       header: header,
       accessorKey: header,
+      ...(highlightCell && {
+        cell: info => highlightCell(info.row.original, header)
+          ? <span className="bg-yellow-200 px-1 rounded">{info.getValue()}</span>
+          : info.getValue(),
+      }),
     }));
-  }, [rawColumns]);
+  }, [rawColumns, highlightCell]);
 
   const data = useMemo(() => rawData, [rawData]);
 
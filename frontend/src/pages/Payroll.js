@@ -193,6 +193,7 @@ export default function Payroll() {
 
         <PayrollIntervalSelector
           paymentFrequency={user?.payment_frequency}
+          biweeklyAnchor={user?.biweekly_anchor}
           onIntervalSelect={setSelectedInterval}
           selectedInterval={selectedInterval}
           className="mb-6"
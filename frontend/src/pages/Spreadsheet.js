@@ -40,8 +40,11 @@ export default function SpreadsheetComponent() {
         const fetchData = async () => {
             try {
                 setLoading(true);
-                const response = await axios.get(`/api/spreadsheets/${sheet_id}/`);
-                setSheetData(response.data);
+                // Columnar layout: the header once plus one array per column, turned back into rows here
+                const response = await axios.get(`/api/spreadsheets/${sheet_id}/`, { params: { layout: 'columns' } });
+                const { columns } = response.data.sheet_data;
+                const rows = (columns[0] ?? []).map((_, i) => columns.map(column => column[i]));
+                setSheetData({ ...response.data, sheet_data: rows });
             } catch (err) {
                 if (err.response?.status === 404) {
                     setError('Sheet not found');
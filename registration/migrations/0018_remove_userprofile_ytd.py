@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+def restore_userprofile_ytd(apps, schema_editor):
+    """Writes each user's latest year to date totals from the payroll ledger back onto the re-added columns"""
+    UserProfile = apps.get_model('registration', 'UserProfile')
+    PayrollYearToDate = apps.get_model('api', 'PayrollYearToDate')
+
+    latest = {}
+    for totals in PayrollYearToDate.objects.order_by('user_id', 'year'):
+        latest[totals.user_id] = totals
+
+    profiles = []
+    for user_profile in UserProfile.objects.filter(user_id__in=latest):
+        totals = latest[user_profile.user_id]
+        user_profile.ytd_pay = totals.earnings
+        user_profile.ytd_deduction = totals.deductions
+        user_profile.cpp_contrib = totals.cpp
+        user_profile.ei_contrib = totals.ei
+        user_profile.contrib_year = totals.year
+        profiles.append(user_profile)
+    UserProfile.objects.bulk_update(
+        profiles, ['ytd_pay', 'ytd_deduction', 'cpp_contrib', 'ei_contrib', 'contrib_year'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0017_userprofile_money_decimal'),
+        # the totals are carried over to the payroll ledger before the columns go
+        ('api', '0033_seed_payroll_ledger'),
+    ]
+
+    operations = [
+        # reversed last, once the columns are back
+        migrations.RunPython(migrations.RunPython.noop, restore_userprofile_ytd),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='ytd_pay',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='ytd_deduction',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='cpp_contrib',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='ei_contrib',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='contrib_year',
+        ),
+    ]